@@ -0,0 +1,4 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+"""Benchmarky pipeline: syntetická komunita (synth) + měření kroků (runner, `ecb bench`)."""
@@ -0,0 +1,210 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+`ecb bench` – změř hot-path funkce pipeline nad syntetickou komunitou.
+
+Fáze (v pořadí, každá bere výstup předchozí – stejně jako pipeline):
+  step1_read_wide   _read_wide + _wide_to_long (O i D)
+  local_pairing     sharing_lib.local_pairing (krok 2)
+  sharing           share_pool_degree_limited (krok 3, engine --engine)
+  batt_local        simulate_local_battery_sweep (krok 4)
+  batt_central      simulate_central_battery_sweep (krok 5)
+  step6_excel       build_s3 + _profiles + zápis jednoho sešitu (--excel_mode standard|fast)
+
+Každý běh se připíše do JSON historie (--history) s časem, propustností
+(řádků/s) a špičkou paměti (RSS vzorkované na pozadí: absolutně a nárůst během fáze)
+a porovná se s posledním během se stejnými parametry.
+"""
+from __future__ import annotations
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .synth import FREQS, SynthSpec, generate
+from ..utils.profiling import PeakSampler, rss_mb
+
+STAGES = ("step1_read_wide", "local_pairing", "sharing", "batt_local", "batt_central", "step6_excel")
+
+@contextmanager
+def _measure(rec: dict, memory: bool):
+    sampler = PeakSampler() if memory and rss_mb() is not None else None
+    if sampler:
+        sampler.start()
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec["seconds"] = round(time.perf_counter() - t0, 4)
+        if sampler:
+            sampler.stop()
+            rec["peak_rss_mb"] = round(sampler.peak, 1)
+            rec["peak_delta_mb"] = round(sampler.peak - sampler.base, 1)
+        rows = rec.get("rows") or 0
+        rec["rows_per_s"] = round(rows / rec["seconds"], 1) if rec["seconds"] > 0 else None
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_bench(spec: SynthSpec, *, workdir: Path, stages=STAGES, engine: str = "numpy",
+              max_recipients: int = 5, memory: bool = True, excel_mode: str = "standard") -> dict:
+    from ..pipeline.step1_wide_to_long import _read_wide, _wide_to_long
+    from ..utils.sharing_lib import local_pairing
+    from ..pipeline.step3_sharing import share_pool_degree_limited
+    from ..pipeline.step4_batt_local import simulate_local_battery_sweep
+    from ..pipeline.step5_batt_central import simulate_central_battery_sweep
+    from ..pipeline.step6_excel_scenarios import build_s3, _write_workbook
+
+    t0 = time.perf_counter()
+    data = generate(workdir, spec)
+    print(f"[OK] synth: {spec.sites} site, {data['periods']} kroků ({spec.freq}), "
+          f"{data['values']:,} hodnot → {workdir} ({time.perf_counter() - t0:.1f} s)")
+
+    results: List[dict] = []
+    ctx: Dict[str, object] = {}
+
+    def stage(name: str, fn: Callable[[dict], None]):
+        rec = {"stage": name}
+        with _measure(rec, memory):
+            fn(rec)
+        results.append(rec)
+        mem = f", RSS peak {rec['peak_rss_mb']} MB (+{rec['peak_delta_mb']})" if "peak_rss_mb" in rec else ""
+        print(f"[OK] bench {name}: {rec['seconds']:.3f} s ({rec['rows']:,} řádků{mem})")
+
+    def s_read(rec):
+        longs = []
+        for key in ("o_wide", "d_wide"):
+            body, ean_to_site, _, _ = _read_wide(data[key], sep=";", site_row_file=2, kwp_row_file=3)
+            longs.append(_wide_to_long(body, ean_to_site))
+        ctx["o_long"], ctx["d_long"] = longs
+        rec["rows"] = data["values"]
+
+    def s_pairing(rec):
+        ctx["eano"], ctx["eand"], ctx["local_self"] = local_pairing(ctx["o_long"], ctx["d_long"], freq="h")
+        rec["rows"] = len(ctx["o_long"]) + len(ctx["d_long"])
+
+    def s_sharing(rec):
+        _, _, _, ctx["by_hour"], ctx["alloc"] = share_pool_degree_limited(
+            ctx["eano"], ctx["eand"], max_recipients_per_from=max_recipients, engine=engine)
+        rec["rows"] = len(ctx["eano"]) + len(ctx["eand"])
+        rec["engine"] = engine
+
+    def s_batt_local(rec):
+        sens = simulate_local_battery_sweep(ctx["eano"], ctx["eand"], caps=[0.0, 5.0, 10.0, 15.0])
+        rec["rows"] = len(ctx["eano"]) * 4
+        rec["out_rows"] = len(sens)
+
+    def s_batt_central(rec):
+        caps = [0.0, 50.0, 100.0, 200.0]
+        simulate_central_battery_sweep(ctx["by_hour"], caps=caps)
+        rec["rows"] = len(ctx["by_hour"]) * len(caps)
+
+    def s_excel(rec):
+        s3 = build_s3(ctx["by_hour"], ctx["alloc"], ctx["o_long"], ctx["d_long"], ctx["local_self"], 2200.0, 1800.0, 1200.0)
+        _write_workbook(workdir / "bench_s3.xlsx", "S3 Sharing", s3, excel_mode == "fast",
+                        {"allocations": ctx["alloc"]})
+        rec["rows"] = len(s3)
+        rec["excel_mode"] = excel_mode
+
+    # fáze závisí na předchozích výstupech → vynechaná fáze se počítá bez měření
+    deps = [("step1_read_wide", s_read), ("local_pairing", s_pairing), ("sharing", s_sharing),
+            ("batt_local", s_batt_local), ("batt_central", s_batt_central), ("step6_excel", s_excel)]
+    last = max((i for i, (n, _) in enumerate(deps) if n in stages), default=-1)
+    for name, fn in deps[:last + 1]:
+        if name in stages:
+            stage(name, fn)
+        elif name in ("step1_read_wide", "local_pairing", "sharing"):
+            fn({})
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": _git_rev(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "params": {"sites": spec.sites, "freq": spec.freq, "years": spec.years, "days": spec.days,
+                   "seed": spec.seed, "engine": engine, "max_recipients": max_recipients,
+                   "excel_mode": excel_mode},
+        "data": {k: data[k] for k in ("periods", "eans_o", "eans_d", "values")},
+        "stages": results,
+    }
+
+def load_history(path: Path) -> List[dict]:
+    if not path.exists():
+        return []
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except ValueError:
+        print(f"[i] bench: historie {path} není čitelný JSON – začínám novou")
+        return []
+
+def compare(prev: dict, cur: dict) -> List[str]:
+    """Řádky s relativní změnou času proti předchozímu běhu (stejné parametry)."""
+    before = {s["stage"]: s for s in prev.get("stages", [])}
+    lines = []
+    for s in cur["stages"]:
+        p = before.get(s["stage"])
+        if not p or not p.get("seconds"):
+            continue
+        d = (s["seconds"] - p["seconds"]) / p["seconds"] * 100.0
+        lines.append(f"  {s['stage']:<16} {p['seconds']:>9.3f} s → {s['seconds']:>9.3f} s  ({d:+.1f} %)")
+    return lines
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark kroků pipeline nad syntetickou komunitou")
+    ap.add_argument("--sites", type=int, default=50, help="počet site (typ. 10–2000)")
+    ap.add_argument("--freq", choices=sorted(FREQS), default="1h")
+    ap.add_argument("--years", type=float, default=1.0, help="horizont v letech (typ. 1–3)")
+    ap.add_argument("--days", type=int, default=None, help="horizont ve dnech (přebije --years)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--engine", choices=["numpy", "pandas"], default="numpy", help="engine kroku 3")
+    ap.add_argument("--max_recipients", type=int, default=5)
+    ap.add_argument("--excel_mode", choices=["standard", "fast"], default="standard", help="zápis sešitu (krok 6)")
+    ap.add_argument("--stages", default=",".join(STAGES), help=f"čárkou oddělené fáze ({','.join(STAGES)})")
+    ap.add_argument("--workdir", default="", help="adresář pro syntetická data (default dočasný)")
+    ap.add_argument("--history", default="bench_history.json", help="JSON historie běhů ('' = nezapisovat)")
+    ap.add_argument("--no-memory", dest="memory", action="store_false", help="bez vzorkování paměti")
+    args = ap.parse_args()
+
+    stages = tuple(s.strip() for s in args.stages.split(",") if s.strip())
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"Neznámé fáze {unknown} (povoleno: {','.join(STAGES)})")
+    spec = SynthSpec(sites=args.sites, freq=args.freq, years=args.years, days=args.days, seed=args.seed)
+
+    with tempfile.TemporaryDirectory(prefix="ecb_bench_") as tmp:
+        workdir = Path(args.workdir) if args.workdir else Path(tmp)
+        result = run_bench(spec, workdir=workdir, stages=stages, engine=args.engine,
+                           max_recipients=args.max_recipients, memory=args.memory, excel_mode=args.excel_mode)
+
+    if args.history:
+        hist_path = Path(args.history)
+        history = load_history(hist_path)
+        prev = next((r for r in reversed(history) if r.get("params") == result["params"]), None)
+        if prev:
+            print(f"[i] bench: proti {prev.get('timestamp')} ({prev.get('git') or '?'}):")
+            print("\n".join(compare(prev, result)))
+        history.append(result)
+        hist_path.write_text(json.dumps(history, indent=1, ensure_ascii=False), encoding="utf-8")
+        print(f"[OK] bench historie → {hist_path} ({len(history)} běhů)")
+    else:
+        json.dump(result, sys.stdout, indent=1, ensure_ascii=False)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Syntetická energetická komunita ve formátu vstupů kroku 1 (wide O/D CSV).
+
+    datetime;EAN…        ← 1. řádek: EANy
+    site;Site 0000;…     ← 2. řádek: site (--site_row_file 2)
+    kwp;…;12,5;…         ← 3. řádek: kWp (jen D, --kwp_row_file 3)
+    01.03.2024 00:00;0,917;…
+
+Spotřeba (O): denní dvojvrchol (ráno/večer), víkendy nižší, zima vyšší, šum, měřítko
+site lognormálně. Výroba (D): kWp × sluneční křivka (délka dne podle ročního období)
+× denní oblačnost. Zápis po blocích řádků → paměť nezávisí na horizontu.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+
+FREQS = {"15min": 0.25, "1h": 1.0}
+
+@dataclass(frozen=True)
+class SynthSpec:
+    sites: int = 50
+    freq: str = "1h"            # "15min" | "1h"
+    years: float = 1.0
+    days: int | None = None     # přebije years (rychlé smoke běhy)
+    pv_share: float = 0.6       # podíl site s FVE
+    seed: int = 0
+    start: str = "2024-01-01"
+
+    @property
+    def periods(self) -> int:
+        days = self.days if self.days is not None else int(round(365 * self.years))
+        return int(days * 24 / FREQS[self.freq])
+
+def _eans(spec: SynthSpec, rng: np.random.Generator) -> Tuple[List[tuple], List[tuple]]:
+    """(EAN, site, kWp) pro O a D; některé site mají víc odběrných EANů."""
+    eans_o, eans_d = [], []
+    for i in range(spec.sites):
+        site = f"Site {i:04d}"
+        for j in range(1 + int(rng.random() < 0.25)):
+            eans_o.append((f"85918240{i:05d}{j}", site, None))
+        if rng.random() < spec.pv_share:
+            eans_d.append((f"85918250{i:05d}0", site, round(float(rng.uniform(5, 150)), 1)))
+    return eans_o, eans_d
+
+def _load_shape(t: pd.DatetimeIndex) -> np.ndarray:
+    h = t.hour.values + t.minute.values / 60.0
+    daily = 0.6 + 0.5 * np.exp(-((h - 7.5) / 1.8) ** 2) + 0.8 * np.exp(-((h - 19.0) / 2.5) ** 2)
+    weekly = np.where(t.dayofweek.values >= 5, 0.8, 1.0)
+    seasonal = 1.0 + 0.3 * np.cos(2 * np.pi * (t.dayofyear.values - 15) / 365.25)
+    return daily * weekly * seasonal
+
+def _pv_shape(t: pd.DatetimeIndex) -> np.ndarray:
+    h = t.hour.values + t.minute.values / 60.0
+    doy = t.dayofyear.values
+    half_day = 6.0 + 2.5 * np.cos(2 * np.pi * (doy - 172) / 365.25)   # ~8–16 h dne (střední Evropa)
+    x = (h - 12.5) / half_day
+    return np.clip(np.cos(np.clip(x, -1, 1) * np.pi / 2), 0.0, None) ** 1.5
+
+def _fmt_block(t: pd.DatetimeIndex, values: np.ndarray, eans: List[tuple]) -> pd.DataFrame:
+    df = pd.DataFrame(values, columns=[e for e, _, _ in eans])
+    df.insert(0, "datetime", t.strftime("%d.%m.%Y %H:%M"))
+    return df
+
+def _write_header(path: Path, eans: List[tuple], with_kwp: bool) -> None:
+    rows = [";".join(["datetime"] + [e for e, _, _ in eans]), ";".join(["site"] + [s for _, s, _ in eans])]
+    kwp = [f"{k:.1f}".replace(".", ",") if (with_kwp and k is not None) else "" for _, _, k in eans]
+    rows.append(";".join(["kwp"] + kwp))
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+def generate(outdir: str | Path, spec: SynthSpec = SynthSpec(), *, block_days: int = 30) -> dict:
+    """Zapiš o_wide.csv a d_wide.csv; vrací popis (cesty, počty)."""
+    out = Path(outdir)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(spec.seed)
+    eans_o, eans_d = _eans(spec, rng)
+    step_h = FREQS[spec.freq]
+    times = pd.date_range(spec.start, periods=spec.periods, freq="15min" if spec.freq == "15min" else "h")
+
+    scale_o = rng.lognormal(mean=np.log(8.0), sigma=0.8, size=len(eans_o)) * step_h   # kWh za krok při tvaru 1.0
+    kwp_d = np.array([k for _, _, k in eans_d], dtype=float)
+    yield_d = 0.85 * step_h                                                             # kWh/kWp za krok při plném slunci
+
+    p_o, p_d = out / "o_wide.csv", out / "d_wide.csv"
+    _write_header(p_o, eans_o, with_kwp=False)
+    _write_header(p_d, eans_d, with_kwp=True)
+    block = max(1, int(block_days * 24 / step_h))
+    for i in range(0, len(times), block):
+        t = times[i:i + block]
+        load = _load_shape(t)[:, None] * scale_o[None, :] * rng.gamma(8.0, 1 / 8.0, (len(t), len(eans_o)))
+        days = (t.normalize() - t[0].normalize()).days.values
+        clouds = rng.beta(2.0, 1.2, (int(days.max()) + 1, max(len(eans_d), 1)))[days]
+        pv = _pv_shape(t)[:, None] * kwp_d[None, :] * yield_d * clouds[:, :len(eans_d)]
+        for path, vals, eans in ((p_o, load, eans_o), (p_d, pv, eans_d)):
+            _fmt_block(t, np.round(vals, 3), eans).to_csv(
+                path, sep=";", decimal=",", float_format="%.3f", header=False, index=False, mode="a")
+    return {
+        "o_wide": str(p_o), "d_wide": str(p_d), "sites": spec.sites, "freq": spec.freq,
+        "periods": len(times), "eans_o": len(eans_o), "eans_d": len(eans_d),
+        "values": len(times) * (len(eans_o) + len(eans_d)),
+    }
@@ -1,7 +1,10 @@
 ﻿# SPDX-License-Identifier: AGPL-3.0-or-later
+import os
 import sys
 import click
-from .utils.config import load_yaml, kv_to_argv
+from .utils.config import load_yaml, kv_to_argv, pop_env_keys
+from .utils.cache import parse_argv, run_cached
+from .utils.profiling import profile_step
 
 def _forward_to(module_main, extra_args, passthrough_args):
     old_argv = sys.argv[:]
@@ -19,10 +22,58 @@ def _forward_to(module_main, extra_args, passthrough_args):
     default=None,
     help="YAML s defaulty: sekce 'global' + sekce podle kroku (step1, step2, ...).",
 )
+@click.option(
+    "--store-format",
+    type=click.Choice(["csv", "parquet"]),
+    default=None,
+    help="Formát mezivýsledků (přebíjí ECB_STORE_FORMAT i config global.store_format).",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Cache kroků podle obsahu vstupů a parametrů (přebíjí ECB_CACHE_DIR i config global.cache_dir).",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Časy fází load/compute/write, paměť a hot funkce → <outdir>/profile.json (ECB_PROFILE=1).",
+)
+@click.option(
+    "--profile-funcs",
+    default=None,
+    help="Čárkou oddělené hot funkce pro cProfile, nebo 'all' (ECB_PROFILE_FUNCS; implikuje --profile).",
+)
+@click.option(
+    "--compact",
+    type=click.Choice(["0", "1", "float32"]),
+    default=None,
+    help="Long tabulky se site/ean jako category, float32 i hodnoty (přebíjí ECB_COMPACT i config global.compact).",
+)
 @click.pass_context
-def main(ctx, config):
+def main(ctx, config, store_format, cache_dir, profile, profile_funcs, compact):
     ctx.ensure_object(dict)
     ctx.obj["config_path"] = config
+    ctx.obj["store_format"] = store_format
+    ctx.obj["cache_dir"] = cache_dir
+    ctx.obj["profile"] = profile or bool(profile_funcs)
+    ctx.obj["profile_funcs"] = profile_funcs
+    ctx.obj["compact"] = compact
+
+def _apply_env(ctx, *sections):
+    # klíče, které nejsou CLI parametry kroků, ale nastavení prostředí (např. store_format)
+    os.environ.update(pop_env_keys(*sections))
+    if ctx.obj.get("store_format"):
+        os.environ["ECB_STORE_FORMAT"] = ctx.obj["store_format"]
+    if ctx.obj.get("cache_dir"):
+        os.environ["ECB_CACHE_DIR"] = ctx.obj["cache_dir"]
+    if ctx.obj.get("profile"):
+        os.environ["ECB_PROFILE"] = "1"
+    if ctx.obj.get("profile_funcs"):
+        os.environ["ECB_PROFILE_FUNCS"] = ctx.obj["profile_funcs"]
+    if ctx.obj.get("compact"):
+        os.environ["ECB_COMPACT"] = ctx.obj["compact"]
 
 def _subcmd(name, module_path):
     @main.command(name, context_settings=dict(ignore_unknown_options=True, allow_interspersed_args=False))
@@ -30,11 +81,25 @@ def _subcmd(name, module_path):
     @click.pass_context
     def _runner(ctx, args):
         cfg = load_yaml(ctx.obj.get("config_path"))
+        _apply_env(ctx, cfg.get("global"), cfg.get(name))
         extra = kv_to_argv(cfg.get("global"), cfg.get(name))
         mod = __import__(module_path, fromlist=["main"])
-        _forward_to(mod.main, extra, args)
+        argv = list(extra) + list(args)
+        with profile_step(name, parse_argv(argv).get("outdir", ".")):
+            run_cached(name, argv, lambda: _forward_to(mod.main, extra, args))
     return _runner
 
+@main.command("run-all", context_settings=dict(ignore_unknown_options=True, allow_interspersed_args=False))
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+@click.pass_context
+def run_all_cmd(ctx, args):
+    """Celá pipeline v jednom procesu (tabulky mezi kroky v paměti)."""
+    cfg = load_yaml(ctx.obj.get("config_path"))
+    _apply_env(ctx, cfg.get("global"))
+    from .pipeline import run_all
+    extra = ["--config", ctx.obj["config_path"]] if ctx.obj.get("config_path") else []
+    _forward_to(run_all.main, extra, args)
+
 _subcmd("step1", "ec_balance.pipeline.step1_wide_to_long")
 _subcmd("step2", "ec_balance.pipeline.step2_local_pv")
 _subcmd("step3", "ec_balance.pipeline.step3_sharing")
@@ -45,6 +110,8 @@ _subcmd("step5a", "ec_balance.pipeline.step5a_batt_central_byhour")
 _subcmd("step6", "ec_balance.pipeline.step6_excel_scenarios")
 _subcmd("check", "ec_balance.utils.check")
 _subcmd("doctor", "ec_balance.utils.doctor")
+_subcmd("export-csv", "ec_balance.utils.store")
+_subcmd("bench", "ec_balance.bench.runner")
 
 if __name__ == "__main__":
     main()
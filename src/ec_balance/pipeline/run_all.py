@@ -0,0 +1,224 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+run-all – celá pipeline (step1 → step6) v jednom procesu.
+
+Kroky běží přes své main() (stejné parametry jako samostatné `ecb stepX`), ale tabulky
+si předávají v paměti přes registr artefaktů (utils.artifacts) – žádné opakované
+čtení/parsování CSV mezi kroky. Zápis mezivýsledků na disk je volitelný (--no-persist).
+
+Parametry kroků: config sekce `global` + sekce kroku; cesty mezi kroky (csv/ean_o_long.csv,
+csv/eano_after_pv.csv, …) se doplní z `outdir` automaticky, explicitní hodnoty v configu vyhrávají.
+Krok bez vstupů nebo povinných parametrů (např. step1 bez eano_wide, step5a bez central_site)
+se přeskočí s [i] hláškou. S ECB_CACHE_DIR jdou kroky přes utils.cache (jen s persist).
+--incremental: kroky INCREMENTAL_STEPS zpracují jen nové období (utils.incremental), reporty celé.
+global.layout wide|both: krok 1 zapíše typované wide tabulky a krok 2 z nich páruje bez melt.
+--partition year|month: kroky 2–3 po kalendářních oddílech v procesech, baterie 4a/5a po stejných
+oknech se sladěním SoC (utils.partition); --workers = počet procesů/vláken (0 = počet CPU).
+"""
+from __future__ import annotations
+import argparse
+import functools
+import importlib
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from ..utils.artifacts import ArtifactRegistry, use_registry
+from ..utils.cache import run_cached
+from ..utils.profiling import profile_step
+from ..utils.config import load_yaml, kv_to_argv, pop_env_keys
+from ..utils.store import exists
+from ..utils.incremental import producer_batch, save_state
+from ..utils.partition import PARTITIONS, PARTITION_STEPS, merge_partitions, run_partitions, split_long
+
+PRICES = ("price_commodity_mwh", "price_distribution_mwh", "price_feed_in_mwh")
+ETAS = ("eta_c", "eta_d")
+
+@dataclass(frozen=True)
+class StepSpec:
+    name: str
+    module: str
+    defaults: Callable[[Path], Dict[str, str]]  # odvozené parametry z outdir
+    inputs: tuple = ()      # parametry = vstupní tabulky (musí existovat v registru/na disku)
+    required: tuple = ()    # parametry bez defaultu (jinak krok přeskočit)
+    shared: tuple = ()      # klíče ze sekce `global`, které krok přijímá
+    wide_inputs: tuple = () # vstupy místo `inputs` při layout wide/both (krok 1 zapisuje wide tabulky)
+
+def _csv(out: Path, name: str) -> str:
+    return str(out / "csv" / f"{name}.csv")
+
+STEPS: List[StepSpec] = [
+    StepSpec("step1", "ec_balance.pipeline.step1_wide_to_long",
+             lambda o: {"outdir": str(o)}, required=("eano_wide", "eand_wide"), shared=("layout",)),
+    StepSpec("step2", "ec_balance.pipeline.step2_local_pv",
+             lambda o: {"outdir": str(o), "eano_long_csv": _csv(o, "ean_o_long"), "eand_long_csv": _csv(o, "ean_d_long"),
+                        "eano_wide_csv": _csv(o, "ean_o_wide"), "eand_wide_csv": _csv(o, "ean_d_wide")},
+             inputs=("eano_long_csv", "eand_long_csv"), shared=("layout",),
+             wide_inputs=("eano_wide_csv", "eand_wide_csv")),
+    StepSpec("step3", "ec_balance.pipeline.step3_sharing",
+             lambda o: {"outdir": str(o), "eano_after_pv_csv": _csv(o, "eano_after_pv"),
+                        "eand_after_pv_csv": _csv(o, "eand_after_pv"), "local_selfcons_csv": _csv(o, "local_selfcons")},
+             inputs=("eano_after_pv_csv", "eand_after_pv_csv", "local_selfcons_csv"), shared=PRICES),
+    StepSpec("step4", "ec_balance.pipeline.step4_batt_local",
+             lambda o: {"outdir": str(o), "eano_after_pv_csv": _csv(o, "eano_after_pv"),
+                        "eand_after_pv_csv": _csv(o, "eand_after_pv"), "kwp_csv": _csv(o, "kwp_by_site")},
+             inputs=("eano_after_pv_csv", "eand_after_pv_csv"), shared=PRICES + ETAS),
+    StepSpec("step4a", "ec_balance.pipeline.step4a_batt_local_byhour",
+             lambda o: {"outdir": str(o / "csv"), "eano_after_pv_csv": _csv(o, "eano_after_pv"),
+                        "eand_after_pv_csv": _csv(o, "eand_after_pv"), "kwp_csv": _csv(o, "kwp_by_site")},
+             inputs=("eano_after_pv_csv", "eand_after_pv_csv"), shared=ETAS),
+    StepSpec("step5a", "ec_balance.pipeline.step5a_batt_central_byhour",
+             lambda o: {"outdir": str(o / "csv"), "eano_after_pv_csv": _csv(o, "eano_after_pv"),
+                        "eand_after_pv_csv": _csv(o, "eand_after_pv")},
+             inputs=("eano_after_pv_csv", "eand_after_pv_csv"), required=("central_site", "cap_kwh"), shared=ETAS),
+    StepSpec("step5", "ec_balance.pipeline.step5_batt_central",
+             lambda o: {"outdir": str(o), "by_hour_csv": _csv(o, "by_hour_after"), "kwp_csv": _csv(o, "kwp_by_site")},
+             inputs=("by_hour_csv",), shared=ETAS),
+    StepSpec("step4b-econ", "ec_balance.pipeline.step4b_batt_econ",
+             lambda o: {"outdir": str(o)}, shared=PRICES),
+    StepSpec("step6", "ec_balance.pipeline.step6_excel_scenarios",
+             lambda o: {"csv_dir": str(o / "csv"), "outdir": str(o / "xlsx"),
+                        "by_hour_bat_local_csv": _csv(o, "by_hour_after_bat_local"),
+                        "by_hour_bat_central_csv": _csv(o, "by_hour_after_bat_central")},
+             inputs=("csv_dir",), shared=PRICES + ETAS),
+]
+STEP_NAMES = [s.name for s in STEPS]
+INCREMENTAL_STEPS = ("step1", "step2", "step3", "step4", "step4a", "step5a", "step5")
+
+def _step_args(spec: StepSpec, cfg: dict, outdir: Path) -> Dict[str, object]:
+    g = cfg.get("global") or {}
+    args: Dict[str, object] = dict(spec.defaults(outdir))
+    args.update({k: g[k] for k in spec.shared if g.get(k) is not None})
+    own = {k: v for k, v in (cfg.get(spec.name) or {}).items() if v is not None}
+    args.update(own)
+    if spec.wide_inputs:
+        # odvozené cesty vstupů, které layout nečte, nepředávat – neexistující soubor by šel do klíče
+        # cache jako absolutní cesta a krok by se mezi outdir/workspace nesdílel
+        for k in set(spec.inputs + spec.wide_inputs) - set(_layout_inputs(spec, args)) - set(own):
+            args.pop(k, None)
+    return args
+
+def _layout_inputs(spec: StepSpec, args: Dict[str, object]) -> tuple:
+    return spec.wide_inputs if spec.wide_inputs and args.get("layout") in ("wide", "both") else spec.inputs
+
+def _skip_reason(spec: StepSpec, args: Dict[str, object]) -> Optional[str]:
+    missing = [k for k in spec.required if args.get(k) in (None, "")]
+    if missing:
+        return f"chybí parametry {missing}"
+    inputs = _layout_inputs(spec, args)
+    for k in inputs:
+        p = str(args.get(k) or "")
+        if not p or not (Path(p).is_dir() or exists(p)):
+            return f"chybí vstup --{k} {p}"
+    return None
+
+def _call_main(module: str, argv: List[str]) -> None:
+    mod = importlib.import_module(module)
+    old_argv = sys.argv[:]
+    try:
+        sys.argv = [f"ecb {module.rsplit('.', 1)[-1]}"] + argv
+        mod.main()
+    finally:
+        sys.argv = old_argv
+
+def _run_partition(cfg: dict, steps: List[str], root: Path) -> None:
+    """Kroky 2–3 nad jedním oddílem (v procesu z utils.partition.run_partitions)."""
+    cfg = dict(cfg)
+    for spec in STEPS:  # cesty mezi kroky z oddílu, ne z configu celého běhu
+        if spec.name in steps and isinstance(cfg.get(spec.name), dict):
+            cfg[spec.name] = {k: v for k, v in cfg[spec.name].items() if k not in spec.inputs + ("outdir",)}
+    run_all(cfg, steps=steps, outdir=str(root))
+
+def _partitioned(cfg: dict, out: Path, steps: List[str], by: str, workers: int) -> None:
+    roots = split_long(out / "csv", by)
+    print(f"[i] run-all: {', '.join(steps)} po oddílech ({by}): {len(roots)} × {[r.name for r in roots][:4]}...")
+    run_partitions(functools.partial(_run_partition, cfg, steps), roots, workers=workers)
+    merged = merge_partitions(roots, out / "csv")
+    for step, producer in (("step2", "step1"), ("step3", "step2")):
+        if step in steps:  # stav jako po plném běhu → --incremental může navázat
+            save_state(out / "csv", step, batch=producer_batch(out / "csv", producer), delta=None)
+    print(f"[OK] run-all: sloučeno {len(merged)} tabulek z {len(roots)} oddílů")
+
+def run_all(cfg: dict, *, steps: Optional[List[str]] = None, persist: bool = True,
+            outdir: Optional[str] = None, incremental: bool = False,
+            partition: str = "none", workers: int = 0) -> ArtifactRegistry:
+    """Spusť vybrané kroky v pořadí pipeline; vrací registr s artefakty (DataFrame v paměti)."""
+    cfg = {k: (dict(v) if isinstance(v, dict) else v) for k, v in (cfg or {}).items()}
+    pop_env_keys(cfg.get("global"))  # prostředí nastavuje volající (cli); tady jen nepředávat krokům
+    out = Path(outdir or (cfg.get("global") or {}).get("outdir") or "./out")
+    wanted = steps or STEP_NAMES
+    unknown = [s for s in wanted if s not in STEP_NAMES]
+    if unknown:
+        raise ValueError(f"Neznámé kroky {unknown} (povoleno: {STEP_NAMES})")
+    if incremental and not persist:
+        raise ValueError("--incremental připisuje k tabulkám na disku – nejde s --no-persist")
+    if partition not in PARTITIONS:
+        raise ValueError(f"Neznámé dělení '{partition}' (povoleno: {PARTITIONS})")
+    if partition != "none" and (incremental or not persist):
+        raise ValueError("--partition předává oddíly procesům přes disk – nejde s --incremental ani --no-persist")
+    if partition != "none" and (cfg.get("global") or {}).get("layout") == "wide":
+        raise ValueError("--partition dělí long tabulky kroku 1 – s layout wide použij layout both")
+    part_steps = [s for s in PARTITION_STEPS if s in wanted] if partition != "none" else []
+
+    reg = ArtifactRegistry(persist=persist)
+    t_all = time.perf_counter()
+    with use_registry(reg):
+        for spec in STEPS:
+            if spec.name not in wanted:
+                continue
+            if spec.name in part_steps:
+                reason = _skip_reason(spec, _step_args(spec, cfg, out)) if spec.name == part_steps[0] else None
+                if reason:
+                    print(f"[i] run-all: {'+'.join(part_steps)} přeskočen ({reason})")
+                    part_steps = []
+                elif spec.name == part_steps[0]:
+                    t0 = time.perf_counter()
+                    _partitioned(cfg, out, part_steps, partition, workers)
+                    print(f"[OK] run-all: {'+'.join(part_steps)} {time.perf_counter() - t0:.2f} s")
+                continue
+            pop_env_keys(cfg.get(spec.name))
+            args = _step_args(spec, cfg, out)
+            if partition != "none" and spec.name in ("step4a", "step5a"):
+                args.setdefault("window", partition)
+                args.setdefault("workers", workers)
+            reason = _skip_reason(spec, args)
+            if reason:
+                print(f"[i] run-all: {spec.name} přeskočen ({reason})")
+                continue
+            reg.current_step = spec.name
+            t0 = time.perf_counter()
+            argv = kv_to_argv(None, args) + (["--incremental"] if incremental and spec.name in INCREMENTAL_STEPS else [])
+            with profile_step(spec.name, out):  # všechny kroky do <out>/profile.json
+                run_cached(spec.name, argv, lambda: _call_main(spec.module, argv))
+            print(f"[OK] run-all: {spec.name} {time.perf_counter() - t0:.2f} s")
+        reg.current_step = None
+    where = "disk + paměť" if persist else "jen paměť"
+    print(f"[OK] run-all hotovo: {len(reg)} artefaktů ({where}), {time.perf_counter() - t_all:.2f} s")
+    return reg
+
+def main():
+    ap = argparse.ArgumentParser(description="Celá pipeline v jednom procesu (tabulky mezi kroky v paměti)")
+    ap.add_argument("--config", default=None, help="YAML config (global + sekce kroků)")
+    ap.add_argument("--outdir", default=None, help="Přebije global.outdir")
+    ap.add_argument("--steps", default="", help=f"Čárkou oddělené kroky (default vše: {','.join(STEP_NAMES)})")
+    ap.add_argument("--no-persist", dest="persist", action="store_false",
+                    help="Mezivýsledky nezapisovat na disk (jen výstupy step6)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Nové období: připsat k existujícím výsledkům místo přepočtu celé historie")
+    ap.add_argument("--partition", choices=PARTITIONS, default="none",
+                    help="Kroky 2–3 po kalendářních oddílech v procesech, baterie po stejných oknech")
+    ap.add_argument("--workers", type=int, default=0, help="Procesy/vlákna pro --partition (0 = počet CPU)")
+    args = ap.parse_args()
+
+    cfg = load_yaml(args.config)
+    steps = [s.strip() for s in args.steps.split(",") if s.strip()] or None
+    run_all(cfg, steps=steps, persist=args.persist, outdir=args.outdir, incremental=args.incremental,
+            partition=args.partition, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,27 @@
 Krok 1 – wide → long (fix datetime, site_map, kwp_by_site)
 - Explicitní řádky: --site_row_file 2, --kwp_row_file 3 (1-based v SOUBORU).
 - Pokud oba zadáš, autodetekce se NEpoužije.
+- --chunksize N: streaming po N řádcích wide souboru (hlavička/site/kWp se čtou jednou).
+- --incremental: wide soubory s novým obdobím se připíší k existujícím long tabulkám
+  (řádky do posledního už načteného času se zahodí), nová část jde i do csv/incremental/
+  pro navazující kroky s --incremental (viz utils.incremental).
+- --layout wide|both: místo/vedle long tabulek typované wide tabulky csv/ean_o_wide.csv, ean_d_wide.csv
+  (datetime + sloupec na EAN, kWh) – krok 2 --layout wide z nich páruje bez melt.
+- csv/time_grid.csv: společná časová mřížka (rozsah, --grid_freq, --tz) pro navazující kroky (utils.timegrid).
+- Dialekt wide CSV (desetinná čárka, tisíce, formát času) se zjistí jednou a uloží do csv/wide_dialect.json
+  (utils.dialect, --redetect); --csv_engine pyarrow = čtení přes pyarrow.
+- Více dodávek: --eano_wide/--eand_wide jako glob nebo seznam (a,b,...) – souběžné čtení (--workers),
+  sjednocené hlavičky, v překryvu platí poslední dodávka (utils.ingest).
+- ECB_COMPACT=1|float32: long tabulky bez melt, site/ean jako category (viz utils.compact).
 - Výstupy: csv/ean_o_long.csv, csv/ean_d_long.csv, csv/site_map.csv, csv/kwp_by_site.csv (z EAN_D)
 """
 
 import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, List, Optional
 import numpy as np
 import pandas as pd
 
@@ -23,7 +38,14 @@ def _detect_sep(sample_path: str) -> str:
         return ","
     # víc středníků než čárek => ; jinak ,
     return ";" if head.count(";") > head.count(",") else ","
-from ..utils.sharing_lib import safe_to_csv
+from ..utils.sharing_lib import LAYOUTS, safe_to_csv, safe_appender, safe_append, csv_target
+from ..utils.profiling import profiled
+from ..utils.incremental import load_state, save_state
+from ..utils.store import exists, persisting, read_table
+from ..utils.compact import compact_long, compact_on, long_from_wide, value_dtype
+from ..utils.timegrid import GRID, grid_meta, merge_meta
+from ..utils.dialect import ENGINES, Dialect, header_key, parse_numbers, parse_times, read_body, resolve
+from ..utils.ingest import expand_inputs, latest_wins, merge_headers
 
 def _is_numberlike(x) -> bool:
     try:
@@ -50,15 +72,11 @@ def _auto_detect_rows(df_head: pd.DataFrame) -> Tuple[Optional[int], Optional[in
             kwp_idx = i
     return site_idx, kwp_idx
 
-def _read_wide(path: str, sep: str | None = None, site_row_file: Optional[int] = None, kwp_row_file: Optional[int] = None
-) -> Tuple[pd.DataFrame, Dict[str, str], Dict[str, float], int]:
-    """Načti wide a vrať (df_data, ean->site, ean->kwp, first_data_row_1based)."""
-    if sep in (None, '', 'auto'):
-        sep = _detect_sep(path)
-    df = pd.read_csv(path, sep=sep)
-    if df.empty:
-        raise ValueError(f"Soubor je prázdný: {path}")
+HEAD_ROWS = 200  # streaming: kolik řádků pod hlavičkou stačí na site/kWp řádky a začátek dat
 
+def _header_maps(df: pd.DataFrame, site_row_file: Optional[int] = None, kwp_row_file: Optional[int] = None
+) -> Tuple[Dict[str, str], Dict[str, float], int]:
+    """Z hlavičkové části wide DF vrať (ean->site, ean->kwp, data_idx = index první datové řádky)."""
     def file_row_to_idx(n: Optional[int]) -> Optional[int]:
         # Header je 'řádek 1' souboru; první řádek POD ním má index 0.
         return None if n is None else max(0, int(n) - 2)
@@ -71,7 +89,7 @@ def _read_wide(path: str, sep: str | None = None, site_row_file: Optional[int] =
         if site_idx is None: site_idx = auto_site
         if kwp_idx  is None: kwp_idx  = auto_kwp
 
-    # 2) Najdi první datovou řádku ve FULL df (první validní datetime v 1. sloupci)
+    # 2) Najdi první datovou řádku (první validní datetime v 1. sloupci)
     data_idx = None
     for i in range(len(df)):
         ts = pd.to_datetime(df.iloc[i, 0], errors="coerce", dayfirst=True)
@@ -104,19 +122,96 @@ def _read_wide(path: str, sep: str | None = None, site_row_file: Optional[int] =
             except Exception:
                 pass  # OK, některé můžou chybět
 
-    # 4) Datová část
-    body = df.iloc[data_idx:, :].reset_index(drop=True).copy()
-    body.rename(columns={time_col: "datetime"}, inplace=True)
-    body["datetime"] = pd.to_datetime(body["datetime"], errors="coerce", dayfirst=True)
+    return ean_to_site, ean_to_kwp, data_idx
 
+def _typed_body(body: pd.DataFrame, d: Dialect) -> pd.DataFrame:
+    """Datová část: čas podle dialektu, hodnoty jako float (textové sloupce převede po buňkách)."""
+    body = body.rename(columns={body.columns[0]: "datetime"})
+    body["datetime"] = parse_times(body["datetime"], d)
+    for c in body.columns[1:]:
+        if not pd.api.types.is_numeric_dtype(body[c].dtype):
+            body[c] = parse_numbers(body[c], d)
+    return body
+
+@profiled(phase_name="load")
+def _read_wide(path: str, sep: str | None = None, site_row_file: Optional[int] = None, kwp_row_file: Optional[int] = None,
+               *, csvdir: Optional[Path] = None, engine: str = "c", redetect: bool = False,
+               dialect: Optional[Dialect] = None
+) -> Tuple[pd.DataFrame, Dict[str, str], Dict[str, float], int]:
+    """Načti wide a vrať (df_data, ean->site, ean->kwp, first_data_row_1based); dialekt viz utils.dialect."""
+    sep, ean_to_site, ean_to_kwp, data_idx, names = _read_wide_head(path, sep, site_row_file, kwp_row_file)
+    d = dialect or resolve(path, sep, csvdir, redetect)
+    body = _typed_body(read_body(path, d, names, data_idx + 1, engine=engine), d)
     return body, ean_to_site, ean_to_kwp, data_idx + 1  # jako 1-based "file row"
 
+def _read_wide_head(path: str, sep: str | None = None, site_row_file: Optional[int] = None,
+                    kwp_row_file: Optional[int] = None) -> Tuple[str, Dict[str, str], Dict[str, float], int, List[str]]:
+    """Přečti jen hlavičku + HEAD_ROWS řádků. Vrací (sep, ean->site, ean->kwp, data_idx, sloupce)."""
+    if sep in (None, '', 'auto'):
+        sep = _detect_sep(path)
+    head = pd.read_csv(path, sep=sep, nrows=HEAD_ROWS)
+    if head.empty:
+        raise ValueError(f"Soubor je prázdný: {path}")
+    ean_to_site, ean_to_kwp, data_idx = _header_maps(head, site_row_file, kwp_row_file)
+    return sep, ean_to_site, ean_to_kwp, data_idx, list(head.columns)
+
+def _iter_wide_chunks(path: str, d: Dialect, names: List[str], data_idx: int, chunksize: int):
+    """Datová část wide souboru po `chunksize` řádcích (hlavičkové řádky nad daty se přeskočí)."""
+    for chunk in read_body(path, d, names, data_idx + 1, chunksize=chunksize):
+        yield _typed_body(chunk, d)
+
+def _stream_wide_to_long(path: str, name: str, outroot: Path, *, sep: str | None, site_row_file: Optional[int],
+                         kwp_row_file: Optional[int], units: str, chunksize: int, csvdir: Optional[Path] = None,
+                         redetect: bool = False
+) -> Tuple[Dict[str, str], Dict[str, float], int, np.ndarray]:
+    """wide → long po částech s omezenou pamětí; zapisuje rovnou <name>. Vrací (ean->site, ean->kwp, file row, časy)."""
+    sep, ean_to_site, ean_to_kwp, data_idx, names = _read_wide_head(path, sep, site_row_file, kwp_row_file)
+    d = resolve(path, sep, csvdir, redetect)
+    last_dt = None
+    times = []
+    with safe_appender(outroot, name) as w:
+        for body in _iter_wide_chunks(path, d, names, data_idx, chunksize):
+            long = _wide_to_long(body, ean_to_site, units=units)
+            if long.empty:
+                continue
+            if last_dt is not None and long["datetime"].iloc[0] < last_dt:
+                print(f"[WARN] {name}: řádky ve wide souboru nejsou chronologicky – výstup není globálně seřazený.")
+            last_dt = long["datetime"].iloc[-1]
+            times.append(long["datetime"].unique())
+            w.append(long)
+    print(f"[OK] {name}: {w.path} ({w.rows} řádků, chunksize={chunksize})" + ("" if persisting() else " (jen v paměti)"))
+    return ean_to_site, ean_to_kwp, data_idx + 1, np.concatenate(times) if times else np.array([], "datetime64[ns]")
+
+def _parse_values(s: pd.Series) -> pd.Series:
+    # už typované sloupce beze změny, text s desetinnou čárkou; neplatné (ohlášené) = 0 jako prázdné
+    return parse_numbers(s, Dialect()).fillna(0.0)
+
+def _wide_values(df_wide: pd.DataFrame, scale: float) -> np.ndarray:
+    """Hodnoty EAN sloupců jako matice řádky × sloupce (desetinná čárka, neplatné = 0), × scale."""
+    pos = [i for i, c in enumerate(df_wide.columns) if c != "datetime"]
+    if not pos:
+        return np.empty((len(df_wide), 0))
+    return np.column_stack([_parse_values(df_wide.iloc[:, i]).to_numpy() * scale for i in pos])
+
+def _typed_wide(df_wide: pd.DataFrame, units: str = "kwh") -> pd.DataFrame:
+    """Wide tabulka [datetime, <EAN>...] v kWh (stejný převod jako _wide_to_long), řádky podle času."""
+    value_cols = [c for c in df_wide.columns if c != "datetime"]
+    values = _wide_values(df_wide, 1000.0 if units.lower() == "mwh" else 1.0).astype(value_dtype(), copy=False)
+    df = pd.DataFrame(values, columns=value_cols)
+    df.insert(0, "datetime", df_wide["datetime"].to_numpy())
+    return df.dropna(subset=["datetime"]).sort_values("datetime", kind="stable").reset_index(drop=True)
+
 def _wide_to_long(df_wide: pd.DataFrame, ean_to_site: Dict[str, str], units: str = "kwh") -> pd.DataFrame:
     value_cols = [c for c in df_wide.columns if c != "datetime"]
+    scale = 1000.0 if units.lower() == "mwh" else 1.0
+    if compact_on():  # bez melt: hodnoty po sloupcích, site/ean jako category
+        sites = [ean_to_site.get(c) if pd.notna(ean_to_site.get(c)) else c for c in value_cols]
+        df = long_from_wide(df_wide["datetime"], value_cols, sites, _wide_values(df_wide, scale))
+        return df.dropna(subset=["datetime"]).sort_values(["datetime", "site", "ean"]).reset_index(drop=True)
     df = df_wide.melt(id_vars=["datetime"], value_vars=value_cols, var_name="ean", value_name="value")
     df["site"] = df["ean"].map(ean_to_site).fillna(df["ean"])
-    df["value"] = pd.to_numeric(df["value"].astype(str).str.replace(",", "."), errors="coerce").fillna(0.0)
-    df["value_kwh"] = df["value"] * (1000.0 if units.lower() == "mwh" else 1.0)
+    df["value"] = _parse_values(df["value"])
+    df["value_kwh"] = df["value"] * scale
     return df[["datetime", "site", "ean", "value_kwh"]].dropna(subset=["datetime"]).sort_values(
         ["datetime", "site", "ean"]
     ).reset_index(drop=True)
@@ -125,29 +220,167 @@ def _build_kwp_by_site(ean_to_site: Dict[str, str], ean_to_kwp: Dict[str, float]
     rows = [{"site": ean_to_site.get(e, e), "ean": e, "kwp": ean_to_kwp.get(e, np.nan)} for e in ean_to_site]
     return pd.DataFrame(rows).groupby("site", as_index=False)["kwp"].sum(min_count=1)
 
+def _ingest_file(path: str, dialect: Dialect, units: str, read_kw: dict):
+    """Jedna dodávka (v procesu poolu): wide → long + její hlavičkové mapy."""
+    body, ean_to_site, ean_to_kwp, _ = _read_wide(path, dialect=dialect, **read_kw)
+    return _wide_to_long(body, ean_to_site, units=units), ean_to_site, ean_to_kwp
+
+def _read_many(paths: List[str], name: str, *, units: str, workers: int, csvdir: Path, redetect: bool,
+               sep: str | None, engine: str, **rows_kw) -> Tuple[pd.DataFrame, Dict[str, str], Dict[str, float]]:
+    """
+    Více dodávek jednoho druhu (utils.ingest): dialekty se zjistí tady (jednou na hlavičku),
+    soubory se parsují souběžně v procesech, pak sjednocení hlaviček a „poslední dodávka vyhrává“.
+    """
+    dialects, seen = [], set()
+    for p in paths:
+        p_sep = _detect_sep(p) if sep in (None, '', 'auto') else sep
+        key = header_key(p)
+        dialects.append(resolve(p, p_sep, csvdir, redetect and key not in seen))
+        seen.add(key)
+    read_kw = dict(sep=sep, engine=engine, **rows_kw)
+    n = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    if n > 1:
+        with ProcessPoolExecutor(n) as ex:
+            parts = list(ex.map(_ingest_file, paths, dialects, repeat(units), repeat(read_kw)))
+    else:
+        parts = [_ingest_file(p, d, units, read_kw) for p, d in zip(paths, dialects)]
+
+    ean_to_site, conflicts = merge_headers([x[1] for x in parts])
+    ean_to_kwp, _ = merge_headers([x[2] for x in parts])
+    long, replaced = latest_wins([x[0] for x in parts])
+    if conflicts:
+        print(f"[WARN] {name}: {len(conflicts)} EAN má v dodávkách jiný site (např. {conflicts[0]}) – platí poslední")
+        ean = long["ean"].astype(object)
+        long["site"] = ean.map(ean_to_site).fillna(ean)
+    long = compact_long(long.sort_values(["datetime", "site", "ean"], kind="stable").reset_index(drop=True))
+    print(f"[i] {name}: {len(paths)} souborů ({n} procesů), překryv {replaced} řádků nahrazen pozdější dodávkou")
+    return long, ean_to_site, ean_to_kwp
+
+def _last_datetime(*paths: Path) -> Optional[pd.Timestamp]:
+    """Poslední čas v existujících long tabulkách (vodoznak, když ho stav kroku ještě nemá)."""
+    last = [pd.to_datetime(read_table(p, usecols=["datetime"])["datetime"], errors="coerce").max()
+            for p in paths if exists(p)]
+    last = [t for t in last if pd.notna(t)]
+    return max(last) if last else None
+
+def _merge_keyed(new: pd.DataFrame, path: Path, key: str) -> pd.DataFrame:
+    """Existující tabulka + řádky `new` s dosud neznámým klíčem (site_map, kwp_by_site)."""
+    if not exists(path):
+        return new
+    old = read_table(path)
+    return pd.concat([old, new[~new[key].astype(str).isin(old[key].astype(str))]], ignore_index=True)
+
+def _write_grid(outroot: Path, *times, freq: str, tz: str, incremental: bool = False) -> None:
+    """time_grid z časů v datech (utils.timegrid); inkrementálně prodlouží existující mřížku."""
+    meta = grid_meta(*times, freq=freq, tz=tz)
+    path = csv_target(outroot) / f"{GRID}.csv"
+    if incremental and exists(path):
+        meta = merge_meta(read_table(path), meta)
+    safe_to_csv(meta, outroot, name=GRID)
+    m = meta.iloc[0]
+    tz = f" ({m['tz']})" if isinstance(m["tz"], str) and m["tz"] else ""
+    print(f"[OK] {GRID}: {m['start']} – {m['end']} po {m['freq']}{tz}, {m['slots']} časů, bez dat {m['missing']}")
+
+def _ingest_incremental(ean_o_long: pd.DataFrame, ean_d_long: pd.DataFrame, outroot: Path, **grid_kw) -> Optional[int]:
+    """Připiš nová data za vodoznakem; vrací číslo dávky (None = nic nového)."""
+    csvdir = csv_target(outroot)
+    state = load_state(csvdir, "step1")
+    wm = pd.Timestamp(state["watermark"]) if state.get("watermark") else \
+        _last_datetime(csvdir / "ean_o_long.csv", csvdir / "ean_d_long.csv")
+    if wm is not None:
+        ean_o_long = ean_o_long[ean_o_long["datetime"] > wm]
+        ean_d_long = ean_d_long[ean_d_long["datetime"] > wm]
+    if ean_o_long.empty and ean_d_long.empty:
+        print(f"[i] step1: žádná data po {wm} – nic nového")
+        return None
+    batch = int(state.get("batch", 0)) + 1
+    _write_grid(outroot, ean_o_long["datetime"], ean_d_long["datetime"], incremental=True, **grid_kw)
+    safe_append(ean_o_long, outroot, "ean_o_long", delta=True)
+    safe_append(ean_d_long, outroot, "ean_d_long", delta=True)
+    last = max(t for t in (ean_o_long["datetime"].max(), ean_d_long["datetime"].max()) if pd.notna(t))
+    save_state(csvdir, "step1", batch=batch, delta=batch, watermark=last.isoformat())
+    print(f"[OK] step1: dávka {batch}, data {min(ean_o_long['datetime'].min(), ean_d_long['datetime'].min())} – {last}")
+    return batch
+
 def main():
     ap = argparse.ArgumentParser(description="Krok 1 – wide → long (site_map + kwp_by_site).")
-    ap.add_argument("--eano_wide", required=True)
-    ap.add_argument("--eand_wide", required=True)
+    ap.add_argument("--eano_wide", required=True, help="Soubor, glob nebo seznam souborů oddělený čárkou (utils.ingest).")
+    ap.add_argument("--eand_wide", required=True, help="Soubor, glob nebo seznam souborů oddělený čárkou (utils.ingest).")
     ap.add_argument("--outdir", required=True)
     ap.add_argument("--wide_sep", default="auto")
     ap.add_argument("--site_row_file", type=int, default=None, help="1-based řádek se jmény site (typ. 2).")
     ap.add_argument("--kwp_row_file", type=int, default=None, help="1-based řádek s kWp (typ. 3).")
     ap.add_argument("--units", choices=["kwh", "mwh"], default="kwh")
+    ap.add_argument("--chunksize", type=int, default=None,
+                    help="Streaming: zpracuj wide po N řádcích (omezená paměť pro velké soubory).")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Připiš nové období k existujícím long tabulkám (jen data po posledním načteném čase).")
+    ap.add_argument("--grid_freq", default="auto",
+                    help="Rozlišení společné časové mřížky time_grid (auto = nejčastější krok dat, jinak např. 15min).")
+    ap.add_argument("--tz", default="", help="Časové pásmo dat pro mřížku (např. Europe/Prague: bez jarní díry); prázdné = naivní čas.")
+    ap.add_argument("--csv_engine", choices=ENGINES, default="c",
+                    help="Parser wide CSV: c (výchozí) nebo pyarrow (rychlejší, čísla přesně zaokrouhlená; bez tisícového oddělovače).")
+    ap.add_argument("--redetect", action="store_true",
+                    help="Znovu zjisti dialekt wide CSV (desetinná čárka, formát času) místo uloženého csv/wide_dialect.json.")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="Procesy pro souběžné čtení více vstupních souborů (0 = dle CPU).")
+    ap.add_argument("--layout", choices=LAYOUTS, default="long",
+                    help="long = ean_*_long; wide = jen ean_*_wide pro párování bez melt (krok 2 --layout wide); both = obojí.")
     args = ap.parse_args()
 
     outroot = Path(args.outdir)
+    rows_kw = dict(sep=args.wide_sep, site_row_file=args.site_row_file, kwp_row_file=args.kwp_row_file,
+                   csvdir=csv_target(outroot), redetect=args.redetect)
+
+    try:
+        o_files, d_files = expand_inputs(args.eano_wide), expand_inputs(args.eand_wide)
+    except ValueError as e:
+        raise SystemExit(f"step1: {e}")
+    multi = len(o_files) > 1 or len(d_files) > 1
+    if args.incremental and args.chunksize:
+        raise SystemExit("--incremental nejde kombinovat s --chunksize (nové období se čte celé)")
+    if args.layout != "long" and (args.incremental or args.chunksize):
+        raise SystemExit(f"--layout {args.layout} zatím nejde s --incremental ani --chunksize")
+    if multi and (args.chunksize or args.layout != "long"):
+        raise SystemExit("Více vstupních souborů zatím jen s --layout long a bez --chunksize")
+    o_src, d_src = f"{len(o_files)} souborů", f"{len(d_files)} souborů"
+    if args.chunksize:
+        if args.chunksize < 1:
+            raise SystemExit("--chunksize musí být kladné celé číslo")
+        o_site_map, _o_kwp, o_row, o_times = _stream_wide_to_long(o_files[0], "ean_o_long", outroot,
+                                                                  units=args.units, chunksize=args.chunksize, **rows_kw)
+        d_site_map, d_kwp_map, d_row, d_times = _stream_wide_to_long(d_files[0], "ean_d_long", outroot,
+                                                                     units=args.units, chunksize=args.chunksize, **rows_kw)
+        o_src, d_src = f"data start: file row {o_row}", f"data start: file row {d_row}"
+    else:
+        if multi:
+            many_kw = dict(units=args.units, workers=args.workers, engine=args.csv_engine, **rows_kw)
+            ean_o_long, o_site_map, _o_kwp = _read_many(o_files, "ean_o_long", **many_kw)
+            ean_d_long, d_site_map, d_kwp_map = _read_many(d_files, "ean_d_long", **many_kw)
+            o_times, d_times = ean_o_long["datetime"], ean_d_long["datetime"]
+        else:
+            o_body, o_site_map, _o_kwp, o_row = _read_wide(o_files[0], engine=args.csv_engine, **rows_kw)
+            d_body, d_site_map, d_kwp_map, d_row = _read_wide(d_files[0], engine=args.csv_engine, **rows_kw)
+            o_times, d_times = o_body["datetime"], d_body["datetime"]
+            o_src, d_src = f"data start: file row {o_row}", f"data start: file row {d_row}"
 
-    o_body, o_site_map, _o_kwp, o_row = _read_wide(args.eano_wide, sep=args.wide_sep,
-                                                   site_row_file=args.site_row_file, kwp_row_file=args.kwp_row_file)
-    d_body, d_site_map, d_kwp_map, d_row = _read_wide(args.eand_wide, sep=args.wide_sep,
-                                                   site_row_file=args.site_row_file, kwp_row_file=args.kwp_row_file)
+            if args.layout != "long":
+                safe_to_csv(_typed_wide(o_body, units=args.units), outroot, name="ean_o_wide")
+                safe_to_csv(_typed_wide(d_body, units=args.units), outroot, name="ean_d_wide")
+            if args.layout != "wide":
+                ean_o_long = _wide_to_long(o_body, o_site_map, units=args.units)
+                ean_d_long = _wide_to_long(d_body, d_site_map, units=args.units)
 
-    ean_o_long = _wide_to_long(o_body, o_site_map, units=args.units)
-    ean_d_long = _wide_to_long(d_body, d_site_map, units=args.units)
+        if args.layout != "wide":
+            if args.incremental:
+                if _ingest_incremental(ean_o_long, ean_d_long, outroot, freq=args.grid_freq, tz=args.tz) is None:
+                    return
+            else:
+                safe_to_csv(ean_o_long, outroot, name="ean_o_long")
+                safe_to_csv(ean_d_long, outroot, name="ean_d_long")
 
-    safe_to_csv(ean_o_long, outroot, name="ean_o_long")
-    safe_to_csv(ean_d_long, outroot, name="ean_d_long")
+    if not args.incremental:
+        _write_grid(outroot, o_times, d_times, freq=args.grid_freq, tz=args.tz)
 
     rows = []
     seen = set()
@@ -157,14 +390,22 @@ def main():
         if e not in seen:
             rows.append({"ean": e, "site": s})
     site_map = pd.DataFrame(rows)
+    csvdir = csv_target(outroot)
+    if args.incremental:
+        site_map = _merge_keyed(site_map, csvdir / "site_map.csv", "ean")
     safe_to_csv(site_map, outroot, name="site_map")
 
     if d_kwp_map:
         kwp_by_site = _build_kwp_by_site(d_site_map, d_kwp_map)
+        if args.incremental:
+            kwp_by_site = _merge_keyed(kwp_by_site, csvdir / "kwp_by_site.csv", "site")
         safe_to_csv(kwp_by_site, outroot, name="kwp_by_site")
+    if not args.incremental:  # plný běh: nová dávka bez delty (navazující kroky přepočítat celé)
+        save_state(csvdir, "step1", batch=int(load_state(csvdir, "step1").get("batch", 0)) + 1, delta=None)
 
-    print(f"[OK] ean_o_long uložen (data start: file row {o_row})")
-    print(f"[OK] ean_d_long uložen (data start: file row {d_row})")
+    kind = "wide" if args.layout == "wide" else "long"
+    print(f"[OK] ean_o_{kind} uložen ({o_src})")
+    print(f"[OK] ean_d_{kind} uložen ({d_src})")
     print(f"[OK] site_map: {len(site_map)} záznamů")
     if d_kwp_map:
         print(f"[OK] kwp_by_site: {len(kwp_by_site)} site")
@@ -4,10 +4,13 @@
 import argparse
 from pathlib import Path
 import pandas as pd
-from ..utils.sharing_lib import local_pairing, safe_to_csv
+from ..utils.sharing_lib import LAYOUTS, local_pairing, local_pairing_wide, safe_to_csv, safe_append, csv_target
+from ..utils.store import read_table, exists
+from ..utils.compact import compact_long
+from ..utils.incremental import next_batch, producer_batch, read_delta, save_state
 
-def _load_csv(path: str | Path) -> pd.DataFrame:
-    return pd.read_csv(path, parse_dates=["datetime"])
+def _load_csv(path: str | Path, delta: bool = False) -> pd.DataFrame:
+    return (read_delta if delta else read_table)(path, parse_dates=["datetime"])
 
 def _apply_site_map(df: pd.DataFrame, site_map: pd.DataFrame | None) -> pd.DataFrame:
     if site_map is None or site_map.empty:
@@ -20,35 +23,74 @@ def _apply_site_map(df: pd.DataFrame, site_map: pd.DataFrame | None) -> pd.DataF
     out = out.drop(columns=["site_group"], errors="ignore")
     return out
 
+def _wide_maps(site_map: pd.DataFrame | None) -> tuple[dict, dict]:
+    """(EAN → site, site → site_group) ze site_map pro párování z wide tabulek."""
+    if site_map is None or site_map.empty:
+        return {}, {}
+    site_of = dict(zip(site_map["ean"].astype(str), site_map["site"])) if "ean" in site_map.columns else {}
+    group_of = {}
+    if "site_group" in site_map.columns:
+        m = site_map.dropna(subset=["site_group"]).drop_duplicates("site")
+        group_of = dict(zip(m["site"], m["site_group"]))
+    return site_of, group_of
+
 def main():
     ap = argparse.ArgumentParser(description="Krok 2 – lokální párování O↔D po objektu (site_group ze 2. řádku hlaviček)")
-    ap.add_argument("--eano_long_csv", required=True)
-    ap.add_argument("--eand_long_csv", required=True)
+    ap.add_argument("--eano_long_csv", default="")
+    ap.add_argument("--eand_long_csv", default="")
+    ap.add_argument("--layout", choices=LAYOUTS, default="long",
+                    help="Vstup z kroku 1: long = ean_*_long; wide/both = párování z ean_*_wide bez melt.")
+    ap.add_argument("--eano_wide_csv", default="", help="wide O z kroku 1 --layout wide (jinak <outdir>/csv/ean_o_wide.csv)")
+    ap.add_argument("--eand_wide_csv", default="", help="wide D z kroku 1 --layout wide (jinak <outdir>/csv/ean_d_wide.csv)")
     ap.add_argument("--outdir", required=True)
     ap.add_argument("--pair_freq", default="H", help="časový bin pro párování: 'H', '30min', '15min', ...")
     ap.add_argument("--site_map_csv", default="", help="volitelně cesta k site_map.csv (jinak .\\csv\\site_map.csv)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Zpracuj jen novou dávku z kroku 1 (csv/incremental/) a výsledky připiš.")
     args = ap.parse_args()
 
     outroot = Path(args.outdir)
-    eano_long = _load_csv(args.eano_long_csv)
-    eand_long = _load_csv(args.eand_long_csv)
+    csvdir = csv_target(outroot)
+    wide = args.layout != "long"
+    if wide and args.incremental:
+        raise SystemExit("--layout wide zatím nejde s --incremental")
+    if not wide and not (args.eano_long_csv and args.eand_long_csv):
+        ap.error("--eano_long_csv a --eand_long_csv jsou povinné (nebo --layout wide)")
+    batch = next_batch(csvdir, "step2", "step1") if args.incremental else None
+    if args.incremental and batch is None:
+        return
 
     # načti site_map vytvořený v kroku 1 z 2. řádku wide hlaviček
     sm_path = Path(args.site_map_csv) if args.site_map_csv else (outroot / "csv" / "site_map.csv")
-    site_map = pd.read_csv(sm_path) if sm_path.exists() else None
-
-    # přemapuj na site_group (název objektu ze 2. řádku)
-    eano_long = _apply_site_map(eano_long, site_map)
-    eand_long = _apply_site_map(eand_long, site_map)
+    site_map = read_table(sm_path, dtype={"ean": str}) if exists(sm_path) else None
 
     # pairing BEZ canonicalizace (respektuj přesně site_group z mapy)
-    eano_after, eand_after, local_self = local_pairing(
-        eano_long, eand_long, freq=args.pair_freq, use_canonical=False
-    )
+    if wide:
+        site_of, group_of = _wide_maps(site_map)
+        eano_after, eand_after, local_self = local_pairing_wide(
+            _load_csv(args.eano_wide_csv or csvdir / "ean_o_wide.csv"),
+            _load_csv(args.eand_wide_csv or csvdir / "ean_d_wide.csv"),
+            site_of, group_of=group_of, freq=args.pair_freq, use_canonical=False
+        )
+    else:
+        eano_long = _load_csv(args.eano_long_csv, delta=args.incremental)
+        eand_long = _load_csv(args.eand_long_csv, delta=args.incremental)
+        # přemapuj na site_group (název objektu ze 2. řádku)
+        eano_long = compact_long(_apply_site_map(eano_long, site_map))  # ECB_COMPACT: site/ean jako category
+        eand_long = compact_long(_apply_site_map(eand_long, site_map))
+        eano_after, eand_after, local_self = local_pairing(
+            eano_long, eand_long, freq=args.pair_freq, use_canonical=False
+        )
 
-    safe_to_csv(eano_after, outroot, name="eano_after_pv")
-    safe_to_csv(eand_after, outroot, name="eand_after_pv")
-    safe_to_csv(local_self, outroot, name="local_selfcons")
+    for df, name in ((eano_after, "eano_after_pv"), (eand_after, "eand_after_pv"), (local_self, "local_selfcons")):
+        if args.incremental:
+            safe_append(df, outroot, name, delta=True)
+        else:
+            safe_to_csv(df, outroot, name=name)
+    if args.incremental:
+        save_state(csvdir, "step2", batch=batch, delta=batch)
+    else:
+        save_state(csvdir, "step2", batch=producer_batch(csvdir, "step1"), delta=None)
 
     sc_sum = float(pd.to_numeric(local_self["local_selfcons_kwh"], errors="coerce").fillna(0.0).sum())
     if sc_sum <= 0.0:
@@ -3,7 +3,7 @@
 
 import argparse
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import pandas as pd
 import numpy as np
 
@@ -14,9 +14,16 @@ except Exception:
     def safe_to_csv(df: pd.DataFrame, outdir: Path, name: str) -> Path:
         outdir = Path(outdir); (outdir / "csv").mkdir(parents=True, exist_ok=True)
         p = outdir / "csv" / f"{name}.csv"; df.to_csv(p, index=False); print(f"[OK] {name}: {p}"); return p
+from ..utils.store import read_table, exists
+from ..utils.profiling import profiled
+from ..utils.sharing_lib import safe_alloc_store, safe_alloc_append, safe_append, csv_target
+from ..utils.incremental import delta_path, next_batch, producer_batch, save_state
+from ..utils.flow_alloc import has_milp, solve_hour
+from ..utils.compact import compact_long
+from ..utils.timegrid import dense, step_axis
 
 def _read(path: str, cols_required=None) -> pd.DataFrame:
-    df = pd.read_csv(path)
+    df = read_table(path)
     if "datetime" in df.columns:
         df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce")
     if cols_required:
@@ -29,38 +36,39 @@ def _sum_by_hour_site(df: pd.DataFrame, value_col: str) -> pd.DataFrame:
     if df is None or df.empty:
         return pd.DataFrame(columns=["datetime","site",value_col])
     out = (
-        df.groupby(["datetime","site"], as_index=False)[value_col]
+        df.groupby(["datetime","site"], as_index=False, observed=True)[value_col]
           .sum()
           .sort_values(["datetime","site"])
           .reset_index(drop=True)
     )
     return out
 
-def share_pool_degree_limited(
-    eano_after: pd.DataFrame,
-    eand_after: pd.DataFrame,
-    *,
-    max_recipients_per_from: int = 5,
-    exclude_self: bool = True
-) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    """ProporÄŤnĂ­ sdĂ­lenĂ­ po hodinĂˇch s omezenĂ­m poÄŤtu pĹ™Ă­jemcĹŻ na zdroj."""
+def _pivot_hour_site(eano_after: pd.DataFrame, eand_after: pd.DataFrame,
+                     times: Optional[pd.Index] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Pivot importů/exportů na matice hodiny × site (společné pro oba enginy); times = osa z time_grid."""
     # agregace (robustnÄ› vĹŻÄŤi duplicitĂˇm)
     imp = _sum_by_hour_site(eano_after, "import_after_kwh")
     exp = _sum_by_hour_site(eand_after, "export_after_kwh")
 
     sites = sorted(set(imp["site"].unique()) | set(exp["site"].unique()))
-    I = imp.pivot(index="datetime", columns="site", values="import_after_kwh").reindex(columns=sites, fill_value=0.0).fillna(0.0)
-    E = exp.pivot(index="datetime", columns="site", values="export_after_kwh").reindex(columns=sites, fill_value=0.0).fillna(0.0)
-
-    idx = I.index.union(E.index)
-    I = I.reindex(idx, fill_value=0.0).astype(float)
-    E = E.reindex(idx, fill_value=0.0).astype(float)
+    if times is None:
+        times = pd.DatetimeIndex(pd.Index(imp["datetime"]).unique().union(pd.Index(exp["datetime"]).unique()))
+    idx = pd.DatetimeIndex(times, name="datetime")
+    cols = pd.Index(sites, dtype=object, name="site")  # i z category (ECB_COMPACT)
+    # po sloupcích (jako pivot) – stejné pořadí sčítání v I.sum(axis=...)
+    I = pd.DataFrame(np.asfortranarray(dense(imp, "import_after_kwh", idx, sites)), index=idx, columns=cols)
+    E = pd.DataFrame(np.asfortranarray(dense(exp, "export_after_kwh", idx, sites)), index=idx, columns=cols)
+    return I, E
 
+def _share_hours_pandas(
+    I: pd.DataFrame, E: pd.DataFrame, *, max_recipients_per_from: int, exclude_self: bool
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Původní engine: smyčka přes hodiny a zdroje nad pandas Series."""
     alloc_rows: List[Tuple[pd.Timestamp, str, str, float]] = []
     resI_frames = []
     resE_frames = []
 
-    for ts in idx:
+    for ts in I.index:
         irow = I.loc[ts].astype(float)
         erow = E.loc[ts].astype(float)
         total_I = float(irow.sum()); total_E = float(erow.sum())
@@ -112,10 +120,248 @@ def share_pool_degree_limited(
 
     I_res = pd.concat(resI_frames).sort_index()
     E_res = pd.concat(resE_frames).sort_index()
+    allocations = pd.DataFrame(alloc_rows, columns=["datetime","from_site","to_site","shared_kwh"])
+    return I_res, E_res, allocations
+
+def _desc_order_like_pandas(vals: np.ndarray) -> np.ndarray:
+    """
+    Pořadí indexů jako `Series.sort_values(ascending=False)` (nargsort: otočení, quicksort,
+    otočení zpět). Shody tak dopadnou stejně jako v pandas enginu i pro > 16 prvků.
+    """
+    n = vals.shape[-1]
+    o = np.argsort(vals[..., ::-1], axis=-1, kind="quicksort")
+    return (n - 1 - o)[..., ::-1]
+
+def _top_k(cand: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indexy k největších kandidátů v každém řádku (nekandidáti = -inf), sestupně.
+    argpartition najde práh k-té hodnoty; jen řádky se shodou přímo na prahu
+    (výběr by nebyl jednoznačný) se dořeší přesným pořadím jako v pandas enginu.
+    """
+    n_rows, n_cols = cand.shape
+    k = min(k, n_cols)
+    if k < n_cols:
+        part = np.argpartition(-cand, k - 1, axis=1)[:, :k]
+        thr = np.take_along_axis(cand, part, axis=1).min(axis=1)[:, None]
+        above = cand > thr
+        tie = cand == thr
+        need = k - above.sum(axis=1, keepdims=True)
+        chosen = above | (tie & (np.cumsum(tie, axis=1) <= need))
+        idx = np.nonzero(chosen)[1].reshape(n_rows, k)
+        ambiguous = np.flatnonzero((tie.sum(axis=1, keepdims=True) > need)[:, 0] & np.isfinite(thr[:, 0]))
+        for i in ambiguous:
+            cols = np.flatnonzero(np.isfinite(cand[i]))
+            idx[i] = np.sort(cols[_desc_order_like_pandas(cand[i, cols])[:k]])
+    else:
+        idx = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    order = np.argsort(-np.take_along_axis(cand, idx, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1)
+
+def _share_block_numpy(
+    I_blk: np.ndarray, E_blk: np.ndarray, *, max_recipients_per_from: int, exclude_self: bool
+) -> Tuple[np.ndarray, np.ndarray, List[np.ndarray]]:
+    """
+    Jeden blok hodin (hodiny × site). Zdroje se zpracují po „kolech“: v kole r přijde
+    v každé hodině na řadu r-tý největší zdroj, takže pořadí v rámci hodiny zůstává
+    stejné jako v pandas enginu, ale všechny hodiny se počítají najednou.
+    """
+    I_res = I_blk.copy()
+    E_res = E_blk.copy()
+    total_I = I_blk.sum(axis=1)
+    total_E = E_blk.sum(axis=1)
+    act = np.flatnonzero((total_I > 0) & (total_E > 0))
+    if act.size == 0:
+        return I_res, E_res, []
+
+    Ia, Ea = I_blk[act], E_blk[act]
+    shared = np.minimum(total_I[act], total_E[act])[:, None]
+    desired_cover = shared * (Ia / total_I[act][:, None])
+    supply_from = shared * (Ea / total_E[act][:, None])
+    remaining_cover = desired_cover.copy()
+    remaining_supply = supply_from.copy()
+
+    n_act, n_sites = Ia.shape
+    rows = np.arange(n_act)
+    order = _desc_order_like_pandas(supply_from)
+    found: List[np.ndarray] = []
+
+    for r in range(n_sites):
+        src = order[:, r]
+        s_supply = remaining_supply[rows, src]
+        live = s_supply > 1e-12
+        if not live.any():
+            break  # pořadí je sestupné – další kola už nic nenabídnou
+        h, s_from, s_supply = rows[live], src[live], s_supply[live]
+
+        cand = remaining_cover[h]
+        if exclude_self:
+            cand[np.arange(h.size), s_from] = 0.0
+        cand = np.where(cand > 1e-12, cand, -np.inf)
+        has_cand = np.isfinite(cand).any(axis=1)
+        h, s_from, s_supply, cand = h[has_cand], s_from[has_cand], s_supply[has_cand], cand[has_cand]
+        if h.size == 0:
+            continue
+
+        sel = _top_k(cand, max_recipients_per_from)
+        sel_val = np.take_along_axis(cand, sel, axis=1)
+        n_sel = np.isfinite(sel_val).sum(axis=1)
+
+        # součet vybraných po skupinách se stejným počtem – stejné pořadí sčítání jako Series.sum()
+        sel_total = np.empty(h.size)
+        for n in np.unique(n_sel):
+            m = n_sel == n
+            sel_total[m] = np.ascontiguousarray(sel_val[m, :n]).sum(axis=1)
+        ok = sel_total > 1e-12
+        h, s_from, s_supply, sel, sel_val, n_sel, sel_total = (
+            h[ok], s_from[ok], s_supply[ok], sel[ok], sel_val[ok], n_sel[ok], sel_total[ok]
+        )
+        if h.size == 0:
+            continue
+
+        valid = np.arange(sel.shape[1])[None, :] < n_sel[:, None]
+        alloc = s_supply[:, None] * (np.where(valid, sel_val, 0.0) / sel_total[:, None])
+        valid &= alloc > 0
+        hh = np.broadcast_to(h[:, None], sel.shape)[valid]
+        to = sel[valid]
+        a = alloc[valid]
+        rest = remaining_cover[hh, to] - a
+        remaining_cover[hh, to] = np.where(rest > 0.0, rest, 0.0)
+        remaining_supply[h, s_from] = 0.0
+        found.append(np.column_stack([act[hh], np.broadcast_to(s_from[:, None], sel.shape)[valid], to, a]))
+
+    covered = desired_cover - remaining_cover
+    contributed = supply_from - remaining_supply
+    I_res[act] = Ia - np.where(covered >= 0.0, covered, 0.0)
+    E_res[act] = Ea - np.where(contributed >= 0.0, contributed, 0.0)
+    return I_res, E_res, found
+
+def _share_hours_numpy(
+    I: pd.DataFrame, E: pd.DataFrame, *, max_recipients_per_from: int, exclude_self: bool,
+    block_hours: int = 2048
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Maticový engine: stejný greedy algoritmus jako pandas engine, ale nad celým
+    pivotem (hodiny × site) v NumPy. Hodiny se berou po blocích kvůli paměti.
+    """
+    I_arr = np.ascontiguousarray(I.to_numpy(dtype=float))
+    E_arr = np.ascontiguousarray(E.to_numpy(dtype=float))
+    I_res = np.empty_like(I_arr)
+    E_res = np.empty_like(E_arr)
+    parts: List[np.ndarray] = []
+    for b0 in range(0, len(I_arr), block_hours):
+        b1 = b0 + block_hours
+        I_res[b0:b1], E_res[b0:b1], found = _share_block_numpy(
+            I_arr[b0:b1], E_arr[b0:b1],
+            max_recipients_per_from=max_recipients_per_from, exclude_self=exclude_self,
+        )
+        for f in found:
+            f[:, 0] += b0
+            parts.append(f)
+
+    sites = np.asarray(I.columns, dtype=object)
+    rec = np.concatenate(parts) if parts else np.empty((0, 4))
+    allocations = pd.DataFrame({
+        "datetime": I.index[rec[:, 0].astype(np.int64)],
+        "from_site": sites[rec[:, 1].astype(np.int64)],
+        "to_site": sites[rec[:, 2].astype(np.int64)],
+        "shared_kwh": rec[:, 3],
+    })
+    # layout bloků (site-major) jako u pd.concat v pandas enginu → bitově shodné souhrny
+    I_res = pd.DataFrame(np.ascontiguousarray(I_res.T).T, index=I.index, columns=I.columns)
+    E_res = pd.DataFrame(np.ascontiguousarray(E_res.T).T, index=E.index, columns=E.columns)
+    return I_res, E_res, allocations
+
+def _share_hours_optimal(
+    I: pd.DataFrame, E: pd.DataFrame, *, max_recipients_per_from: int, exclude_self: bool,
+    hour_budget_ms: float = 50.0
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    --mode optimal: každá hodina jako úloha max. toku s limitem příjemců (utils.flow_alloc),
+    warm start nosičem předchozí hodiny. Greedy (numpy engine, celý pivot najednou) je
+    spodní mez – hodinu, kde optimalizace v rozpočtu nedosáhne víc, převezme z greedy.
+    """
+    I_g, E_g, A_g = _share_hours_numpy(I, E, max_recipients_per_from=max_recipients_per_from, exclude_self=exclude_self)
+    I_arr, E_arr = I.to_numpy(dtype=float), E.to_numpy(dtype=float)
+    I_res, E_res = I_g.to_numpy(dtype=float).copy(), E_g.to_numpy(dtype=float).copy()
+    # greedy měříme pokrytým importem – alokace přes zbylou poptávku příjemce se v něm ořízne
+    greedy_tot = (I_arr - I_res).sum(axis=1)
+    sites = np.asarray(I.columns, dtype=object)
+    keep_greedy = np.ones(len(I_arr), dtype=bool)
+    stats = {"bound": 0, "milp": 0, "heuristic": 0, "greedy": 0}
+    rows: List[Tuple[int, int, int, float]] = []
+    warm: list = []
+    for h in np.flatnonzero((I_arr.sum(axis=1) > 0) & (E_arr.sum(axis=1) > 0)):
+        flow, how = solve_hour(E_arr[h], I_arr[h], max_recipients_per_from, exclude_self=exclude_self,
+                               warm=warm, budget_s=hour_budget_ms / 1000.0)
+        warm = list(flow)
+        if sum(flow.values()) < greedy_tot[h] - 1e-9 * max(1.0, greedy_tot[h]):
+            stats["greedy"] += 1
+            continue
+        stats[how] += 1
+        keep_greedy[h] = False
+        sent, received = np.zeros(len(sites)), np.zeros(len(sites))
+        for (i, j), x in flow.items():
+            rows.append((h, i, j, x))
+            sent[i] += x
+            received[j] += x
+        I_res[h] = I_arr[h] - received
+        E_res[h] = E_arr[h] - sent
+
+    rec = np.array(rows, dtype=float).reshape(-1, 4)
+    allocations = pd.concat([
+        A_g[A_g["datetime"].isin(I.index[keep_greedy])],
+        pd.DataFrame({
+            "datetime": I.index[rec[:, 0].astype(np.int64)],
+            "from_site": sites[rec[:, 1].astype(np.int64)],
+            "to_site": sites[rec[:, 2].astype(np.int64)],
+            "shared_kwh": rec[:, 3],
+        }),
+    ], ignore_index=True)
+    total, total_g = (I_arr - I_res).sum(), greedy_tot.sum()
+    print(f"[i] optimal: {stats['bound']} h optimum (horní mez), {stats['milp']} h MILP, "
+          f"{stats['heuristic']} h heuristika, {stats['greedy']} h greedy; pokryto sdílením {total / 1000:.3f} MWh "
+          f"(greedy {total_g / 1000:.3f} MWh{'' if has_milp() else ', bez scipy = bez MILP'})")
+    return (pd.DataFrame(I_res, index=I.index, columns=I.columns),
+            pd.DataFrame(E_res, index=E.index, columns=E.columns), allocations)
+
+_ENGINES = {
+    "pandas": _share_hours_pandas,
+    "numpy": _share_hours_numpy,
+}
+
+@profiled
+def share_pool_degree_limited(
+    eano_after: pd.DataFrame,
+    eand_after: pd.DataFrame,
+    *,
+    max_recipients_per_from: int = 5,
+    exclude_self: bool = True,
+    engine: str = "pandas",
+    mode: str = "hybrid",
+    hour_budget_ms: float = 50.0,
+    times: Optional[pd.Index] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    ProporÄŤnĂ­ sdĂ­lenĂ­ po hodinĂˇch s omezenĂ­m poÄŤtu pĹ™Ă­jemcĹŻ na zdroj.
+    mode='optimal' = max. sdílená energie v každé hodině (_share_hours_optimal, engine se ignoruje).
+    times = hodinová osa (step_axis); hodiny bez dat jsou ve výstupech jako nuly.
+    """
+    if engine not in _ENGINES:
+        raise ValueError(f"Neznámý engine: {engine} (očekávám {', '.join(_ENGINES)})")
+    I, E = _pivot_hour_site(eano_after, eand_after, times)
+    if mode == "optimal":
+        I_res, E_res, allocations = _share_hours_optimal(
+            I, E, max_recipients_per_from=max_recipients_per_from, exclude_self=exclude_self,
+            hour_budget_ms=hour_budget_ms,
+        )
+    else:
+        I_res, E_res, allocations = _ENGINES[engine](
+            I, E, max_recipients_per_from=max_recipients_per_from, exclude_self=exclude_self
+        )
 
     imp_wide = I_res.reset_index().rename(columns={"index": "datetime"})
     exp_wide = E_res.reset_index().rename(columns={"index": "datetime"})
-    allocations = pd.DataFrame(alloc_rows, columns=["datetime","from_site","to_site","shared_kwh"]).sort_values(["datetime","from_site","to_site"]).reset_index(drop=True)
+    allocations = allocations.sort_values(["datetime","from_site","to_site"]).reset_index(drop=True)
 
     # souhrny
     pre_I = I.sum(axis=0).rename("import_local_kwh").to_frame()
@@ -154,36 +400,76 @@ def main():
     ap.add_argument("--price_commodity_mwh", type=float, required=True)
     ap.add_argument("--price_distribution_mwh", type=float, required=True)
     ap.add_argument("--price_feed_in_mwh", type=float, required=True)
-    ap.add_argument("--mode", choices=["hybrid","proportional"], default="hybrid")
+    ap.add_argument("--mode", choices=["hybrid","proportional","optimal"], default="hybrid",
+                    help="hybrid/proportional = greedy od největšího zdroje; optimal = max. sdílení v hodině (utils.flow_alloc)")
+    ap.add_argument("--hour_budget_ms", type=float, default=50.0,
+                    help="--mode optimal: časový rozpočet na hodinu (pak heuristika, případně greedy). "
+                         "První nosič doběhne vždy; warm start, lokální hledání a MILP jen v rozpočtu – "
+                         "při vyčerpání závisí výsledek (i v cache) na rychlosti stroje")
     # aliasy: --max_receivers (pĹŻvodnĂ­) i --max_recipients (novĂ˝)
     ap.add_argument("--max_receivers", type=int, default=None, help="Max poÄŤet pĹ™Ă­jemcĹŻ na jeden zdroj v hodinÄ› (alias).")
     ap.add_argument("--max_recipients", type=int, default=None, help="Max poÄŤet pĹ™Ă­jemcĹŻ na jeden zdroj v hodinÄ› (alias).")
     ap.add_argument("--allow_self_pair", action="store_true", help="Povolit alokaci na tentĂ˝Ĺľ objekt (default: NE).")
     ap.add_argument("--site_map_csv", default="", help="(Kompatibilita CLI â€“ nevyuĹľito zde)")
+    ap.add_argument("--engine", choices=sorted(_ENGINES), default="pandas",
+                    help="Alokační engine: pandas (původní smyčka) nebo numpy (maticový, výrazně rychlejší).")
+    ap.add_argument("--alloc_format", choices=["csv", "sparse", "both"], default="csv",
+                    help="allocations: tabulka (csv/parquet dle store), sparse = allocations.npz (CSR po hodinách), nebo obojí")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Sdílej jen hodiny nové dávky z kroku 2 (csv/incremental/) a výsledky připiš.")
     args = ap.parse_args()
 
     # vyber hodnotu limitu z aliasĹŻ
     max_rec = args.max_recipients if args.max_recipients is not None else (args.max_receivers if args.max_receivers is not None else 5)
 
     # naÄŤti vstupy (local_self zatĂ­m nevyuĹľĂ­vĂˇme pĹ™Ă­mo â€“ je jen meta)
-    eano_after = _read(args.eano_after_pv_csv, cols_required=["datetime","site","import_after_kwh"])
-    eand_after = _read(args.eand_after_pv_csv, cols_required=["datetime","site","export_after_kwh"])
-    _ = _read(args.local_selfcons_csv)  # pro kontrolu existuje
+    outroot = Path(args.outdir)
+    csvdir = csv_target(outroot)
+    batch = next_batch(csvdir, "step3", "step2") if args.incremental else None
+    if args.incremental and batch is None:
+        return
+    src = delta_path if args.incremental else Path  # inkrementálně jen delty nových hodin
+    eano_after = compact_long(_read(src(args.eano_after_pv_csv), cols_required=["datetime","site","import_after_kwh"]))
+    eand_after = compact_long(_read(src(args.eand_after_pv_csv), cols_required=["datetime","site","export_after_kwh"]))
+    if not args.incremental:
+        _ = _read(args.local_selfcons_csv)  # pro kontrolu existuje
 
     imp_wide, exp_wide, by_site_after, by_hour_after, allocations = share_pool_degree_limited(
         eano_after, eand_after,
         max_recipients_per_from=max_rec,
         exclude_self=(not args.allow_self_pair),
+        engine=args.engine,
+        mode=args.mode,
+        hour_budget_ms=args.hour_budget_ms,
+        times=step_axis(csvdir, eano_after["datetime"], eand_after["datetime"], label="step3"),
     )
 
-    outroot = Path(args.outdir)
-    safe_to_csv(by_site_after, outroot, name="by_site_after")
-    safe_to_csv(by_hour_after, outroot, name="by_hour_after")
-    safe_to_csv(allocations, outroot, name="allocations")
-    safe_to_csv(imp_wide, outroot, name="imp_wide")
-    safe_to_csv(exp_wide, outroot, name="exp_wide")
+    if args.incremental:
+        # souhrn po site = dosavadní + nová dávka; hodinové tabulky se připíší
+        if exists(csvdir / "by_site_after.csv"):
+            by_site_after = pd.concat([read_table(csvdir / "by_site_after.csv"), by_site_after], ignore_index=True)
+            by_site_after = by_site_after.groupby("site", as_index=False).sum()
+        safe_to_csv(by_site_after, outroot, name="by_site_after")
+        safe_append(by_hour_after, outroot, "by_hour_after", delta=True)
+        if args.alloc_format in ("csv", "both"):
+            safe_append(allocations, outroot, "allocations")
+        if args.alloc_format in ("sparse", "both"):
+            safe_alloc_append(allocations, outroot, name="allocations")
+        safe_append(imp_wide, outroot, "imp_wide", fill_value=0.0)
+        safe_append(exp_wide, outroot, "exp_wide", fill_value=0.0)
+        save_state(csvdir, "step3", batch=batch, delta=batch)
+    else:
+        safe_to_csv(by_site_after, outroot, name="by_site_after")
+        safe_to_csv(by_hour_after, outroot, name="by_hour_after")
+        if args.alloc_format in ("csv", "both"):
+            safe_to_csv(allocations, outroot, name="allocations")
+        if args.alloc_format in ("sparse", "both"):
+            safe_alloc_store(allocations, outroot, name="allocations")
+        safe_to_csv(imp_wide, outroot, name="imp_wide")
+        safe_to_csv(exp_wide, outroot, name="exp_wide")
+        save_state(csvdir, "step3", batch=producer_batch(csvdir, "step2"), delta=None)
 
-    print(f"[OK] Sharing hotovo. Limit pĹ™Ă­jemcĹŻ = {max_rec}, self_pair = {args.allow_self_pair}")
+    print(f"[OK] Sharing hotovo. Limit pĹ™Ă­jemcĹŻ = {max_rec}, self_pair = {args.allow_self_pair}, engine = {args.engine}, mode = {args.mode}")
 
 if __name__ == "__main__":
     main()
@@ -5,7 +5,95 @@ import argparse
 from pathlib import Path
 import numpy as np
 import pandas as pd
-from ..utils.sharing_lib import safe_to_csv
+from typing import Optional
+from ..utils.sharing_lib import safe_to_csv, csv_target
+from ..utils.store import read_table
+from ..utils.incremental import delta_path, init_state_for, next_batch, producer_batch, save_state
+from ..utils.profiling import profiled
+from ..utils.battery_kernel import sweep_discharge
+from ..utils.timegrid import dense, step_axis
+
+def _site_hour_arrays(import_after: pd.DataFrame, export_after: pd.DataFrame, extra_sites=(), times=None):
+    """Sites (+ extra_sites bez dat = nulové sloupce) + husté pole hodiny × site na časové ose (times z time_grid)."""
+    # sjednocená, seřazená časová osa (unikátní – union neunikátních indexů by hodiny násobil)
+    all_times = pd.DatetimeIndex(
+        pd.Index(import_after["datetime"]).unique().union(pd.Index(export_after["datetime"]).unique())
+    ).sort_values() if times is None else pd.DatetimeIndex(times)
+
+    sites = sorted(set(import_after["site"]).union(set(export_after["site"])).union(extra_sites))
+
+    # Agregace po (datetime, site) => husté pole hodiny × site zarovnané s all_times
+    def _dense(df: pd.DataFrame, col: str) -> np.ndarray:
+        agg = df.groupby(["datetime", "site"], as_index=False, observed=True)[col].sum()
+        return dense(agg, col, all_times, sites)
+
+    return sites, _dense(import_after, "import_after_kwh"), _dense(export_after, "export_after_kwh")
+
+STATE_COLS = ["site", "cap_kwh", "soc_kwh", "throughput_kwh", "datetime"]
+
+def _last_time(*frames) -> pd.Timestamp:
+    return pd.concat([f["datetime"] for f in frames]).max()
+
+@profiled
+def simulate_local_battery_sweep(
+    import_after: pd.DataFrame,
+    export_after: pd.DataFrame,
+    *,
+    caps,
+    eta_c: float = 0.95,
+    eta_d: float = 0.95,
+    init_state: Optional[pd.DataFrame] = None,
+    return_state: bool = False,
+    times=None
+):
+    """
+    Citlivost přes více kapacit v jednom průchodu: pole hodiny × site se připraví jednou
+    a kapacity běží jako další rozměr jádra. Řádky: po kapacitách, uvnitř po site.
+    init_state = koncový stav předchozího běhu (STATE_COLS) → navázání na předchozí období,
+    výboj je pak kumulativní. return_state → (citlivost, koncový stav). times = osa (step_axis).
+    """
+    caps = [float(c) for c in caps]
+    prev = init_state if init_state is not None and len(init_state) else None
+    sites, imp_vals, exp_vals = _site_hour_arrays(import_after, export_after,
+                                                  () if prev is None else prev["site"].unique(), times)
+    soc0 = energy0 = None
+    if prev is not None:
+        st_caps = sorted(set(prev["cap_kwh"].astype(float)))
+        if st_caps != sorted(set(caps)):
+            raise ValueError(f"Kapacity {caps} se liší od uloženého stavu {st_caps} – přepočti celé.")
+        ci = pd.Index(caps).get_indexer(prev["cap_kwh"].astype(float))
+        si = pd.Index(sites).get_indexer(prev["site"])
+        soc0, energy0 = np.zeros((len(caps), len(sites))), np.zeros((len(caps), len(sites)))
+        soc0[ci, si] = prev["soc_kwh"].to_numpy(dtype=float)
+        energy0[ci, si] = prev["throughput_kwh"].to_numpy(dtype=float)
+    energy, soc = sweep_discharge("local", imp_vals, exp_vals, caps, eta_c=eta_c, eta_d=eta_d,
+                                  soc0=soc0, energy0=energy0, return_soc=True)
+    energy_in_shared = 0.0  # zatím neevidujeme zdroj nabíjení
+
+    rows = []
+    for cap_kwh, energy_row in zip(caps, energy.tolist()):
+        for site, energy_out in zip(sites, energy_row):
+            eq_cycles = energy_out / cap_kwh if cap_kwh and cap_kwh > 0 else 0.0
+            rows.append({
+                "site": site,
+                "cap_kwh": cap_kwh,
+                "discharge_mwh": energy_out / 1000.0,
+                "charge_shared_mwh": energy_in_shared / 1000.0,
+                "eq_cycles": eq_cycles
+            })
+
+    sens = pd.DataFrame(rows, columns=["site", "cap_kwh", "discharge_mwh", "charge_shared_mwh", "eq_cycles"])
+    if not return_state:
+        return sens
+    last = _last_time(import_after, export_after, *([] if prev is None else [prev]))
+    state = pd.DataFrame({
+        "site": np.tile(np.array(sites, dtype=object), len(caps)),
+        "cap_kwh": np.repeat(caps, len(sites)),
+        "soc_kwh": soc.ravel(),
+        "throughput_kwh": energy.ravel(),
+        "datetime": last,
+    }, columns=STATE_COLS)
+    return sens, state
 
 def simulate_local_battery(
     import_after: pd.DataFrame,
@@ -16,65 +104,10 @@ def simulate_local_battery(
     eta_d: float = 0.95
 ) -> pd.DataFrame:
     """
-    Greedy simulace na úrovni site, hodina po hodině.
+    Greedy simulace na úrovni site, hodina po hodině (jádro: utils.battery_kernel).
     Robustní vůči pandas 2.x, duplicitám timestampů i chybějícím hodinám.
     """
-    # sjednocená, seřazená časová osa
-    all_times = pd.DatetimeIndex(
-        pd.Index(import_after["datetime"]).union(pd.Index(export_after["datetime"]))
-    ).sort_values()
-
-    sites = sorted(set(import_after["site"]).union(set(export_after["site"])))
-    rows = []
-
-    for site in sites:
-        # Agregace po datetime => unikátní index
-        imp_s = (
-            import_after.loc[import_after["site"] == site, ["datetime", "import_after_kwh"]]
-            .groupby("datetime", as_index=True)["import_after_kwh"].sum()
-            .reindex(all_times, fill_value=0.0)
-        )
-        exp_s = (
-            export_after.loc[export_after["site"] == site, ["datetime", "export_after_kwh"]]
-            .groupby("datetime", as_index=True)["export_after_kwh"].sum()
-            .reindex(all_times, fill_value=0.0)
-        )
-
-        # Na jistotu: numerika → numpy vektory zarovnané s all_times
-        imp_vals = pd.to_numeric(imp_s, errors="coerce").fillna(0.0).to_numpy(dtype=float)
-        exp_vals = pd.to_numeric(exp_s, errors="coerce").fillna(0.0).to_numpy(dtype=float)
-
-        soc = 0.0
-        energy_out = 0.0
-        energy_in_shared = 0.0  # zatím neevidujeme zdroj nabíjení
-
-        for exp_t, imp_t in zip(exp_vals, imp_vals):
-            # nabíjení z lokálního přebytku
-            if cap_kwh > 0:
-                space = cap_kwh - soc
-                if space > 0:
-                    charge = exp_t * eta_c
-                    if charge > space:
-                        charge = space
-                    soc += charge
-
-            # vybíjení do lokální potřeby
-            if soc > 0 and imp_t > 0 and eta_d > 0:
-                can_dis = soc * eta_d
-                dis = imp_t if imp_t < can_dis else can_dis
-                soc -= dis / eta_d
-                energy_out += dis
-
-        eq_cycles = energy_out / cap_kwh if cap_kwh and cap_kwh > 0 else 0.0
-        rows.append({
-            "site": site,
-            "cap_kwh": float(cap_kwh),
-            "discharge_mwh": energy_out / 1000.0,
-            "charge_shared_mwh": energy_in_shared / 1000.0,
-            "eq_cycles": eq_cycles
-        })
-
-    return pd.DataFrame(rows)
+    return simulate_local_battery_sweep(import_after, export_after, caps=[cap_kwh], eta_c=eta_c, eta_d=eta_d)
 
 def main():
     ap = argparse.ArgumentParser(description="Krok 4 – lokální baterie: citlivost")
@@ -89,20 +122,35 @@ def main():
     ap.add_argument("--eta_c", type=float, default=0.95)
     ap.add_argument("--eta_d", type=float, default=0.95)
     ap.add_argument("--cap_kwh_list", default="0,5,10,15")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Simuluj jen novou dávku z kroku 2, SoC a součty navazují na uložený stav.")
+    ap.add_argument("--init_state_csv", default=None,
+                    help="Počáteční stav baterií (local_sensitivity_state z předchozího běhu); "
+                         "default u --incremental vlastní uložený stav, jinak prázdné baterie.")
     args = ap.parse_args()
 
-    eano_after = pd.read_csv(args.eano_after_pv_csv, parse_dates=["datetime"]).sort_values(["datetime", "site"])
-    eand_after = pd.read_csv(args.eand_after_pv_csv, parse_dates=["datetime"]).sort_values(["datetime", "site"])
+    outroot = Path(args.outdir)
+    csvdir = csv_target(outroot)
+    batch = next_batch(csvdir, "step4", "step2") if args.incremental else producer_batch(csvdir, "step2")
+    if batch is None:
+        return
+    src = delta_path if args.incremental else Path
+    eano_after = read_table(src(args.eano_after_pv_csv), parse_dates=["datetime"]).sort_values(["datetime", "site"])
+    eand_after = read_table(src(args.eand_after_pv_csv), parse_dates=["datetime"]).sort_values(["datetime", "site"])
 
     caps = [float(x) for x in str(args.cap_kwh_list).split(",") if str(x).strip()]
-    out_rows = []
-    for cap in caps:
-        sim = simulate_local_battery(eano_after, eand_after, cap_kwh=cap, eta_c=args.eta_c, eta_d=args.eta_d)
-        out_rows.append(sim)
-    sens = pd.concat(out_rows, ignore_index=True)
+    init_state = init_state_for(args, csvdir / "local_sensitivity_state.csv")
+    try:
+        sens, state = simulate_local_battery_sweep(eano_after, eand_after, caps=caps, eta_c=args.eta_c,
+                                                   eta_d=args.eta_d, init_state=init_state, return_state=True,
+                                                   times=step_axis(csvdir, eano_after["datetime"], eand_after["datetime"],
+                                                                   label="step4"))
+    except ValueError as e:
+        raise SystemExit(f"step4: {e}")
 
-    outroot = Path(args.outdir)
     safe_to_csv(sens, outroot, name="local_sensitivity")
+    safe_to_csv(state, outroot, name="local_sensitivity_state")
+    save_state(csvdir, "step4", batch=batch)
 
 if __name__ == "__main__":
     main()
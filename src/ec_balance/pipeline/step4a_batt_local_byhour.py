@@ -21,14 +21,28 @@ Parametry kapacity:
 Výstupy:
   by_hour_after_bat_local.csv        (datetime, own_stored_kwh, shared_stored_kwh, soc_kwh_sum)
   bat_local_by_site_hour.csv         (datetime, site, own_stored_kwh, shared_stored_kwh, soc_kwh)
+  bat_local_state.csv                (site, cap_kwh, soc_kwh, throughput_kwh, datetime) – koncový stav
+
+Stav a okna:
+  --init_state_csv      počáteční SoC (bat_local_state z předchozího běhu); default prázdné baterie
+  --incremental         jen nová dávka z kroku 2, SoC navazuje na vlastní bat_local_state, výstupy se připíší
+  --window, --workers   dlouhý horizont po oknech (year/month/hodiny) souběžně + sladění SoC na hranicích
+                        (battery_kernel.run_windows; výsledek je stejný jako jeden průchod)
 """
 import argparse
+import os
 from pathlib import Path
 import pandas as pd
 import numpy as np
+from ..utils.store import read_table, write_table, append_table
+from ..utils.battery_kernel import own_community_local, run_windows, seq_row_sums, window_bounds
+from ..utils.incremental import delta_path, init_state_for, next_batch, producer_batch, save_state
+from ..utils.timegrid import dense, step_axis
+
+STATE_COLS = ["site", "cap_kwh", "soc_kwh", "throughput_kwh", "datetime"]
 
 def _read(path):
-    df = pd.read_csv(path)
+    df = read_table(path)
     if "datetime" in df.columns:
         df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce").dt.floor("h")
     return df
@@ -64,12 +78,25 @@ def main():
     ap.add_argument("--cap_by_site_csv", default=None)
     ap.add_argument("--eta_c", type=float, default=0.95)
     ap.add_argument("--eta_d", type=float, default=0.95)
+    ap.add_argument("--incremental", action="store_true",
+                    help="Simuluj jen novou dávku z kroku 2 se SoC z konce předchozího běhu a výstupy připiš.")
+    ap.add_argument("--init_state_csv", default=None,
+                    help="Počáteční stav baterií (bat_local_state.csv z předchozího běhu)")
+    ap.add_argument("--window", default="none",
+                    help="Simulace po oknech: none | year | month | počet hodin (souběžně, pak sladění SoC)")
+    ap.add_argument("--workers", type=int, default=1, help="Vlákna pro --window (0 = počet CPU)")
     args = ap.parse_args()
 
     outdir = Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
-
-    eano = _read(args.eano_after_pv_csv)
-    eand = _read(args.eand_after_pv_csv)
+    batch = next_batch(outdir, "step4a", "step2") if args.incremental else producer_batch(outdir, "step2")
+    if batch is None:
+        return
+    init_state = init_state_for(args, outdir / "bat_local_state.csv")
+    prev = init_state if init_state is not None else pd.DataFrame(columns=STATE_COLS)
+    src = delta_path if args.incremental else Path
+
+    eano = _read(src(args.eano_after_pv_csv))
+    eand = _read(src(args.eand_after_pv_csv))
     kwp  = _read(args.kwp_csv) if args.kwp_csv else None
 
     site_col = "site" if "site" in eano.columns else _find_col(eano, [], ["site","object","lokal"])
@@ -80,92 +107,69 @@ def main():
     imp = eano[[dt, site_col, imp_col]].rename(columns={imp_col: "imp"}).copy()
     exp = eand[[dt, site_col, exp_col]].rename(columns={exp_col: "exp"}).copy()
 
-    imp = imp.groupby([dt, site_col], as_index=False)["imp"].sum()
-    exp = exp.groupby([dt, site_col], as_index=False)["exp"].sum()
+    imp = imp.groupby([dt, site_col], as_index=False, observed=True)["imp"].sum()
+    exp = exp.groupby([dt, site_col], as_index=False, observed=True)["exp"].sum()
 
-    sites = sorted(set(imp[site_col]).union(set(exp[site_col])))
-    times = pd.Index(sorted(set(imp[dt]).union(set(exp[dt]))))
+    # site z předchozích dávek zůstávají (baterie se může nabíjet z poolu i bez vlastních dat)
+    sites = sorted(set(imp[site_col]).union(set(exp[site_col])).union(prev["site"]))
+    times = step_axis(outdir, imp[dt], exp[dt], label="step4a")
 
     # Kapacity per site
     cap_map = _cap_map(kwp, args.cap_by_site_csv, args.fixed_cap_kwh, args.cap_kwh_per_kwp, site_col)
 
-    # state vectors
-    soc   = {s: 0.0 for s in sites}
-    cap_s = {s: (float(args.fixed_cap_kwh) if args.fixed_cap_kwh is not None else float(cap_map.get(s, 0.0))) for s in sites}
-
-    # fast lookup per hour
-    imp_by = {(r[dt], r[site_col]): float(r["imp"]) for _, r in imp.iterrows()}
-    exp_by = {(r[dt], r[site_col]): float(r["exp"]) for _, r in exp.iterrows()}
-
-    rows_site = []
-    rows_agg  = []
-
-    for t in times:
-        # snapshot per hour
-        imp_t = {s: imp_by.get((t, s), 0.0) for s in sites}
-        exp_t = {s: exp_by.get((t, s), 0.0) for s in sites}
-        own_dis = {s: 0.0 for s in sites}
-        sh_dis  = {s: 0.0 for s in sites}
-        # 1) charge z vlastních přetoků
-        for s in sites:
-            room = max(0.0, cap_s[s] - soc[s])
-            if room > 0 and exp_t[s] > 0:
-                e_in = min(exp_t[s], room / args.eta_c)
-                soc[s] += e_in * args.eta_c
-                exp_t[s] -= e_in
-        # 2) discharge do vlastní spotřeby
-        for s in sites:
-            if imp_t[s] > 0 and soc[s] > 0:
-                deliverable = soc[s] * args.eta_d
-                d = min(imp_t[s], deliverable)
-                own_dis[s] = d
-                soc[s] -= d / args.eta_d
-                imp_t[s] -= d
-        # 3) charge ze společných přetoků (pool)
-        pool_exp = sum(exp_t.values())
-        if pool_exp > 1e-12:
-            rooms = {s: max(0.0, cap_s[s] - soc[s]) / max(args.eta_c, 1e-9) for s in sites}
-            total_room = sum(rooms.values())
-            if total_room > 1e-12:
-                for s in sites:
-                    share = pool_exp * (rooms[s] / total_room) if total_room > 0 else 0.0
-                    e_in = min(share, rooms[s])
-                    soc[s] += e_in * args.eta_c
-                pool_exp = 0.0  # vše rozděleno proporčně
-        # 4) discharge do komunity (pool importu)
-        pool_imp = sum(imp_t.values())
-        if pool_imp > 1e-12:
-            deliverable = {s: soc[s] * args.eta_d for s in sites}
-            total_deliv = sum(deliverable.values())
-            if total_deliv > 1e-12:
-                for s in sites:
-                    take = pool_imp * (deliverable[s] / total_deliv) if total_deliv > 0 else 0.0
-                    d = min(take, deliverable[s])
-                    sh_dis[s] = d
-                    soc[s] -= d / args.eta_d
-
-        # zápis řádků
-        for s in sites:
-            rows_site.append({
-                "datetime": t, site_col: s,
-                "own_stored_kwh": own_dis[s],
-                "shared_stored_kwh": sh_dis[s],
-                "soc_kwh": soc[s],
-            })
-        rows_agg.append({
-            "datetime": t,
-            "own_stored_kwh": sum(own_dis.values()),
-            "shared_stored_kwh": sum(sh_dis.values()),
-            "soc_kwh": sum(soc.values()),  # agregovaný SoC (součet přes baterie)
-        })
-
-    by_site = pd.DataFrame(rows_site).sort_values(["datetime", site_col])
-    agg    = pd.DataFrame(rows_agg).sort_values("datetime")
-
-    by_site.to_csv(outdir / "bat_local_by_site_hour.csv", index=False)
-    agg.to_csv(outdir / "by_hour_after_bat_local.csv", index=False)
-    print(f"[OK] {outdir / 'by_hour_after_bat_local.csv'}")
-    print(f"[OK] {outdir / 'bat_local_by_site_hour.csv'}")
+    cap_s = np.array([float(args.fixed_cap_kwh) if args.fixed_cap_kwh is not None else float(cap_map.get(s, 0.0)) for s in sites])
+
+    # husté matice hodiny × site (chybějící hodnota = 0)
+    imp_m = dense(imp, "imp", times, sites, dt, site_col)
+    exp_m = dense(exp, "exp", times, sites, dt, site_col)
+
+    pos = pd.Index(sites).get_indexer(prev["site"])
+    soc0 = np.zeros(len(sites)); thr0 = np.zeros(len(sites))
+    soc0[pos] = prev["soc_kwh"].to_numpy(dtype=float)
+    thr0[pos] = prev["throughput_kwh"].to_numpy(dtype=float)
+    bad = prev["cap_kwh"].to_numpy(dtype=float) != cap_s[pos]
+    if bad.any():
+        diff = ", ".join(f"{s}: {c:g} ≠ {p:g}" for s, c, p in
+                         zip(prev["site"][bad], cap_s[pos][bad], prev["cap_kwh"].to_numpy(dtype=float)[bad]))
+        raise SystemExit(f"step4a: kapacity baterií se liší od uloženého stavu ({diff} kWh) – přepočti celé.")
+
+    bounds = window_bounds(times, args.window)
+    workers = args.workers or os.cpu_count() or 1
+    (soc, own_dis, sh_dis), redone = run_windows(
+        lambda a, b, s0: own_community_local(imp_m[a:b], exp_m[a:b], cap_s, eta_c=args.eta_c, eta_d=args.eta_d, soc0=s0),
+        bounds, soc0, workers=workers)
+    if len(bounds) > 2:
+        print(f"[i] {len(bounds) - 1} oken ({args.window}), sladění přepočítalo {redone} h z {len(times)}")
+
+    n_t, n_s = len(times), len(sites)
+    rows_site = pd.DataFrame({
+        "datetime": np.repeat(np.asarray(times), n_s), site_col: np.tile(np.array(sites, dtype=object), n_t),
+        "own_stored_kwh": own_dis.ravel(),
+        "shared_stored_kwh": sh_dis.ravel(),
+        "soc_kwh": soc.ravel(),
+    })
+    rows_agg = pd.DataFrame({
+        "datetime": np.asarray(times),
+        "own_stored_kwh": seq_row_sums(own_dis),
+        "shared_stored_kwh": seq_row_sums(sh_dis),
+        "soc_kwh": seq_row_sums(soc),  # agregovaný SoC (součet přes baterie)
+    })
+
+    by_site = rows_site.sort_values(["datetime", site_col])
+    agg    = rows_agg.sort_values("datetime")
+
+    put = append_table if args.incremental else write_table
+    p_site = put(by_site, outdir / "bat_local_by_site_hour.csv")
+    p_agg = put(agg, outdir / "by_hour_after_bat_local.csv")
+    print(f"[OK] {p_agg}")
+    print(f"[OK] {p_site}")
+    state = pd.DataFrame({
+        "site": sites, "cap_kwh": cap_s, "soc_kwh": soc[-1] if len(soc) else soc0,
+        "throughput_kwh": thr0 + own_dis.sum(axis=0) + sh_dis.sum(axis=0),
+        "datetime": times.max() if len(times) else (prev["datetime"].max() if len(prev) else pd.NaT),
+    }, columns=STATE_COLS)
+    print(f"[OK] {write_table(state, outdir / 'bat_local_state.csv')}")
+    save_state(outdir, "step4a", batch=batch)
 
 if __name__ == "__main__":
     main()
@@ -7,6 +7,7 @@ from pathlib import Path
 import math
 
 import pandas as pd
+from ..utils.store import read_table, write_table, exists
 
 try:
     import numpy as np
@@ -34,10 +35,9 @@ def _pick_first(df: pd.DataFrame, candidates: list[str]) -> str | None:
     return None
 
 def _read_csv(path: Path | str) -> pd.DataFrame | None:
-    p = Path(path)
-    if not p.exists():
+    if not exists(path):
         return None
-    return pd.read_csv(p)
+    return read_table(path)
 
 def _sum_discharge_kwh(df: pd.DataFrame | None) -> float:
     if df is None or df.empty:
@@ -172,10 +172,10 @@ def main():
 
     # Výstupy
     csvdir.mkdir(parents=True, exist_ok=True)
-    pd.DataFrame([econ_local]).to_csv(csvdir / "local_econ_best.csv", index=False)
-    pd.DataFrame([econ_central]).to_csv(csvdir / "central_econ_best.csv", index=False)
-    print(f"[OK] local_econ_best.csv → {csvdir / 'local_econ_best.csv'}")
-    print(f"[OK] central_econ_best.csv → {csvdir / 'central_econ_best.csv'}")
+    p_local = write_table(pd.DataFrame([econ_local]), csvdir / "local_econ_best.csv")
+    p_central = write_table(pd.DataFrame([econ_central]), csvdir / "central_econ_best.csv")
+    print(f"[OK] local_econ_best → {p_local}")
+    print(f"[OK] central_econ_best → {p_central}")
 
 if __name__ == "__main__":
     main()
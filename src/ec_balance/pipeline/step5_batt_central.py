@@ -4,28 +4,57 @@
 import argparse
 from pathlib import Path
 import pandas as pd
-from ..utils.sharing_lib import safe_to_csv
+from typing import Optional
+from ..utils.sharing_lib import safe_to_csv, csv_target
+from ..utils.store import read_table
+from ..utils.incremental import delta_path, init_state_for, next_batch, producer_batch, save_state
+from ..utils.profiling import profiled
+from ..utils.battery_kernel import sweep_discharge
 
-def simulate_central_battery(by_hour_after: pd.DataFrame, *, cap_kwh: float, eta_c: float = 0.95, eta_d: float = 0.95) -> pd.DataFrame:
-    imp = by_hour_after.set_index("datetime")["import_residual_kwh"].fillna(0.0)
-    exp = by_hour_after.set_index("datetime")["export_residual_kwh"].fillna(0.0)
-    soc = 0.0
-    energy_out = 0.0
+STATE_COLS = ["cap_kwh", "soc_kwh", "throughput_kwh", "datetime"]
+
+@profiled
+def simulate_central_battery_sweep(by_hour_after: pd.DataFrame, *, caps, eta_c: float = 0.95, eta_d: float = 0.95,
+                                   init_state: Optional[pd.DataFrame] = None, return_state: bool = False):
+    """
+    Citlivost přes všechny kapacity v jednom průchodu jádra (kapacita = další rozměr).
+    init_state/return_state = navázání na předchozí období a koncový stav (STATE_COLS), jako u kroku 4.
+    """
+    imp = by_hour_after["import_residual_kwh"].fillna(0.0).to_numpy(dtype=float)
+    exp = by_hour_after["export_residual_kwh"].fillna(0.0).to_numpy(dtype=float)
     energy_in_shared = 0.0
-    for t in imp.index:
-        charge = min(exp.loc[t] * eta_c, cap_kwh - soc)
-        soc += charge
-        can_dis = soc * eta_d
-        dis = min(imp.loc[t], can_dis)
-        soc -= dis / max(eta_d, 1e-9)
-        energy_out += dis
-    eq_cycles = energy_out / cap_kwh if cap_kwh > 0 else 0.0
-    return pd.DataFrame([{
-        "cap_kwh": cap_kwh,
-        "discharge_mwh": energy_out / 1000.0,
-        "charge_shared_mwh": energy_in_shared / 1000.0,
-        "eq_cycles": eq_cycles
-    }])
+    caps = [float(c) for c in caps]
+    prev = init_state if init_state is not None and len(init_state) else None
+    soc0 = energy0 = None
+    if prev is not None:
+        st_caps = sorted(set(prev["cap_kwh"].astype(float)))
+        if st_caps != sorted(set(caps)):
+            raise ValueError(f"Kapacity {caps} se liší od uloženého stavu {st_caps} – přepočti celé.")
+        st = prev.assign(cap_kwh=prev["cap_kwh"].astype(float)).set_index("cap_kwh")
+        soc0 = st.loc[caps, "soc_kwh"].to_numpy(dtype=float)
+        energy0 = st.loc[caps, "throughput_kwh"].to_numpy(dtype=float)
+    energy, soc = sweep_discharge("central", imp, exp, caps, eta_c=eta_c, eta_d=eta_d,
+                                  soc0=soc0, energy0=energy0, return_soc=True)
+    energy = energy[:, 0]
+    rows = []
+    for cap_kwh, energy_out in zip(caps, energy.tolist()):
+        eq_cycles = energy_out / cap_kwh if cap_kwh > 0 else 0.0
+        rows.append({
+            "cap_kwh": cap_kwh,
+            "discharge_mwh": energy_out / 1000.0,
+            "charge_shared_mwh": energy_in_shared / 1000.0,
+            "eq_cycles": eq_cycles
+        })
+    sens = pd.DataFrame(rows, columns=["cap_kwh", "discharge_mwh", "charge_shared_mwh", "eq_cycles"])
+    if not return_state:
+        return sens
+    times = [by_hour_after["datetime"]] + ([] if prev is None else [prev["datetime"]])
+    state = pd.DataFrame({"cap_kwh": caps, "soc_kwh": soc[:, 0], "throughput_kwh": energy,
+                          "datetime": pd.concat(times).max()}, columns=STATE_COLS)
+    return sens, state
+
+def simulate_central_battery(by_hour_after: pd.DataFrame, *, cap_kwh: float, eta_c: float = 0.95, eta_d: float = 0.95) -> pd.DataFrame:
+    return simulate_central_battery_sweep(by_hour_after, caps=[cap_kwh], eta_c=eta_c, eta_d=eta_d)
 
 def main():
     ap = argparse.ArgumentParser(description="Krok 5 – centrální baterie: citlivost")
@@ -35,19 +64,31 @@ def main():
     ap.add_argument("--eta_c", type=float, default=0.95)
     ap.add_argument("--eta_d", type=float, default=0.95)
     ap.add_argument("--cap_kwh_list", default="0,50,100,200")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Simuluj jen novou dávku z kroku 3, SoC a součty navazují na uložený stav.")
+    ap.add_argument("--init_state_csv", default=None,
+                    help="Počáteční stav baterií (central_sensitivity_state z předchozího běhu); "
+                         "default u --incremental vlastní uložený stav, jinak prázdné baterie.")
     args = ap.parse_args()
 
-    by_hour = pd.read_csv(args.by_hour_csv, parse_dates=["datetime"])
+    outroot = Path(args.outdir)
+    csvdir = csv_target(outroot)
+    batch = next_batch(csvdir, "step5", "step3") if args.incremental else producer_batch(csvdir, "step3")
+    if batch is None:
+        return
+    by_hour = read_table(delta_path(args.by_hour_csv) if args.incremental else args.by_hour_csv, parse_dates=["datetime"])
     caps = [float(x) for x in str(args.cap_kwh_list).split(",") if str(x).strip()]
-    out_rows = []
-    for cap in caps:
-        sim = simulate_central_battery(by_hour, cap_kwh=cap, eta_c=args.eta_c, eta_d=args.eta_d)
-        sim["site"] = "CENTRAL"
-        out_rows.append(sim)
-    sens = pd.concat(out_rows, ignore_index=True)
+    init_state = init_state_for(args, csvdir / "central_sensitivity_state.csv")
+    try:
+        sens, state = simulate_central_battery_sweep(by_hour, caps=caps, eta_c=args.eta_c, eta_d=args.eta_d,
+                                                     init_state=init_state, return_state=True)
+    except ValueError as e:
+        raise SystemExit(f"step5: {e}")
+    sens["site"] = "CENTRAL"
 
-    outroot = Path(args.outdir)
     safe_to_csv(sens, outroot, name="central_sensitivity")
+    safe_to_csv(state, outroot, name="central_sensitivity_state")
+    save_state(csvdir, "step5", batch=batch)
 
 if __name__ == "__main__":
     main()
@@ -5,13 +5,15 @@ import argparse
 from pathlib import Path
 import pandas as pd
 import numpy as np
+from ..utils.store import read_table, exists
+from ..utils.profiles import typical_profiles
 
 def _load(csvdir: Path, name: str, parse_dt=True):
     p = csvdir / f"{name}.csv"
-    if not p.exists(): return None
+    if not exists(p): return None
     if parse_dt:
-        return pd.read_csv(p, parse_dates=["datetime"])
-    return pd.read_csv(p)
+        return read_table(p, parse_dates=["datetime"])
+    return read_table(p)
 
 def _sum_hour(df: pd.DataFrame, col: str) -> pd.DataFrame:
     if df is None or df.empty: return pd.DataFrame(columns=["datetime", col])
@@ -108,36 +110,8 @@ def _profiles_day_week_month(df: pd.DataFrame):
     """Vytvoř typické profily komunity: denní (24h) a týdenní (168h) pro každý měsíc + měsíční součty."""
     if df is None or df.empty:
         return None, None, None
-    x = df.copy()
-    x["datetime"] = pd.to_datetime(x["datetime"])
-    x["month"] = x["datetime"].dt.month
-    x["doy"] = x["datetime"].dt.dayofyear
-    x["dow"] = x["datetime"].dt.dayofweek
-    x["hour"] = x["datetime"].dt.hour
-
-    cols = [c for c in ["consumption","import","pv_production","self_consumption","clear_export","shared_received_kwh","shared_sent_kwh"] if c in x.columns]
-
-    # typický den v měsíci = průměr podle hour v daném měsíci
-    day_tabs = {}
-    week_tabs = {}
-    month_tabs = {}
-    for m in sorted(x["month"].unique()):
-        xm = x[x["month"]==m]
-        day = xm.groupby("hour", as_index=False)[cols].mean()
-        day.insert(0,"month", m)
-        # typický týden: průměr podle (dow,hour)
-        xm["hweek"] = xm["dow"]*24 + xm["hour"]
-        wk = xm.groupby("hweek", as_index=False)[cols].mean()
-        wk.insert(0,"month", m)
-        # měsíční součty
-        ms = xm.groupby("month", as_index=False)[cols].sum()
-        day_tabs[m] = day
-        week_tabs[m]= wk
-        month_tabs[m]= ms
-    day_all = pd.concat(day_tabs.values(), ignore_index=True) if day_tabs else None
-    week_all= pd.concat(week_tabs.values(), ignore_index=True) if week_tabs else None
-    month_all=pd.concat(month_tabs.values(), ignore_index=True) if month_tabs else None
-    return day_all, week_all, month_all
+    cols = [c for c in ["consumption","import","pv_production","self_consumption","clear_export","shared_received_kwh","shared_sent_kwh"] if c in df.columns]
+    return typical_profiles(df, cols)
 
 def _chart_axes_max(*dfs, cols=None):
     m = 0.0
@@ -281,8 +255,8 @@ def main():
         bh_local = None
         if args.by_hour_bat_local_csv:
             p = Path(args.by_hour_bat_local_csv)
-            if p.exists():
-                bh_local = pd.read_csv(p, parse_dates=["datetime"])
+            if exists(p):
+                bh_local = read_table(p, parse_dates=["datetime"])
         base = s3 if 's3' in locals() else build_s3_sharing(by_hour_after, allocations, ean_o_long, ean_d_long, local_self,
                                                             args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
         if bh_local is not None:
@@ -301,8 +275,8 @@ def main():
         bh_cent = None
         if args.by_hour_bat_central_csv:
             p = Path(args.by_hour_bat_central_csv)
-            if p.exists():
-                bh_cent = pd.read_csv(p, parse_dates=["datetime"])
+            if exists(p):
+                bh_cent = read_table(p, parse_dates=["datetime"])
         base = s3 if 's3' in locals() else build_s3_sharing(by_hour_after, allocations, ean_o_long, ean_d_long, local_self,
                                                             args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
         if bh_cent is not None:
@@ -14,14 +14,27 @@ Parametry:
   --eta_c, --eta_d      default 0.95
 Výstup:
   by_hour_after_bat_central.csv   (datetime, own_stored_kwh, shared_stored_kwh, soc_kwh)
+  bat_central_state.csv           (central_site, cap_kwh, soc_kwh, throughput_kwh, datetime) – koncový stav
+
+Stav a okna (jako krok 4a):
+  --init_state_csv      počáteční SoC (bat_central_state z předchozího běhu); default prázdná baterie
+  --incremental         jen nová dávka z kroku 2, SoC navazuje na vlastní bat_central_state, výstup se připíše
+  --window, --workers   simulace po oknech souběžně + sladění SoC na hranicích
 """
 import argparse
+import os
 from pathlib import Path
 import pandas as pd
 import numpy as np
+from ..utils.store import read_table, write_table, append_table
+from ..utils.battery_kernel import own_community_central, run_windows, seq_row_sums, window_bounds
+from ..utils.incremental import delta_path, init_state_for, next_batch, producer_batch, save_state
+from ..utils.timegrid import dense, step_axis
+
+STATE_COLS = ["central_site", "cap_kwh", "soc_kwh", "throughput_kwh", "datetime"]
 
 def _read(path):
-    df = pd.read_csv(path)
+    df = read_table(path)
     if "datetime" in df.columns:
         df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce").dt.floor("h")
     return df
@@ -44,12 +57,30 @@ def main():
     ap.add_argument("--outdir", required=True)
     ap.add_argument("--eta_c", type=float, default=0.95)
     ap.add_argument("--eta_d", type=float, default=0.95)
+    ap.add_argument("--incremental", action="store_true",
+                    help="Simuluj jen novou dávku z kroku 2 se SoC z konce předchozího běhu a výstup připiš.")
+    ap.add_argument("--init_state_csv", default=None,
+                    help="Počáteční stav baterie (bat_central_state.csv z předchozího běhu)")
+    ap.add_argument("--window", default="none",
+                    help="Simulace po oknech: none | year | month | počet hodin (souběžně, pak sladění SoC)")
+    ap.add_argument("--workers", type=int, default=1, help="Vlákna pro --window (0 = počet CPU)")
     args = ap.parse_args()
 
     outdir = Path(args.outdir); outdir.mkdir(parents=True, exist_ok=True)
-
-    eano = _read(args.eano_after_pv_csv)
-    eand = _read(args.eand_after_pv_csv)
+    batch = next_batch(outdir, "step5a", "step2") if args.incremental else producer_batch(outdir, "step2")
+    if batch is None:
+        return
+    init_state = init_state_for(args, outdir / "bat_central_state.csv")
+    carry = None if init_state is None or init_state.empty else init_state.iloc[0]
+    if carry is not None and (carry["central_site"] != args.central_site or float(carry["cap_kwh"]) != float(args.cap_kwh)):
+        raise SystemExit(f"step5a: baterie {args.central_site}/{args.cap_kwh} kWh se liší od uloženého "
+                         f"stavu {carry['central_site']}/{carry['cap_kwh']} kWh – přepočti celé.")
+    soc0 = 0.0 if carry is None else float(carry["soc_kwh"])
+    thr0 = 0.0 if carry is None else float(carry["throughput_kwh"])
+    src = delta_path if args.incremental else Path
+
+    eano = _read(src(args.eano_after_pv_csv))
+    eand = _read(src(args.eand_after_pv_csv))
 
     site_col = "site" if "site" in eano.columns else _find_col(eano, [], ["site","object","lokal"])
     dt = "datetime"
@@ -58,76 +89,55 @@ def main():
 
     imp = eano[[dt, site_col, imp_col]].rename(columns={imp_col: "imp"}).copy()
     exp = eand[[dt, site_col, exp_col]].rename(columns={exp_col: "exp"}).copy()
-    imp = imp.groupby([dt, site_col], as_index=False)["imp"].sum()
-    exp = exp.groupby([dt, site_col], as_index=False)["exp"].sum()
+    imp = imp.groupby([dt, site_col], as_index=False, observed=True)["imp"].sum()
+    exp = exp.groupby([dt, site_col], as_index=False, observed=True)["exp"].sum()
 
-    times = pd.Index(sorted(set(imp[dt]).union(set(exp[dt]))))
+    times = step_axis(outdir, imp[dt], exp[dt], label="step5a")
     sites = sorted(set(imp[site_col]).union(set(exp[site_col])))
 
-    if args.central_site not in sites:
+    if args.central_site not in sites and carry is None:
         raise SystemExit(f"--central_site '{args.central_site}' není v datech (sites: {sorted(sites)[:6]}...)")
 
-    imp_by = {(r[dt], r[site_col]): float(r["imp"]) for _, r in imp.iterrows()}
-    exp_by = {(r[dt], r[site_col]): float(r["exp"]) for _, r in exp.iterrows()}
-
-    soc = 0.0; cap = float(args.cap_kwh)
-    rows = []
-
-    for t in times:
-        imp_c = imp_by.get((t, args.central_site), 0.0)
-        exp_c = exp_by.get((t, args.central_site), 0.0)
-        # ostatní komunita (bez centra)
-        imp_o = sum(imp_by.get((t, s), 0.0) for s in sites if s != args.central_site)
-        exp_o = sum(exp_by.get((t, s), 0.0) for s in sites if s != args.central_site)
-
-        own_dis = 0.0
-        sh_dis  = 0.0
-
-        # 1) charge z vlastní výroby (centrální site)
-        room = max(0.0, cap - soc)
-        if room > 0 and exp_c > 0:
-            e_in = min(exp_c, room / args.eta_c)
-            soc += e_in * args.eta_c
-            exp_c -= e_in
-
-        # 2) discharge do vlastní spotřeby (centrální site)
-        if imp_c > 0 and soc > 0:
-            deliverable = soc * args.eta_d
-            d = min(imp_c, deliverable)
-            own_dis = d
-            soc -= d / args.eta_d
-            imp_c -= d
-
-        # 3) charge z komunity (přebytek ostatních + zbytek vlastního přebytku)
-        pool_exp = exp_o + exp_c
-        room = max(0.0, cap - soc)
-        if pool_exp > 1e-12 and room > 1e-12:
-            e_in = min(pool_exp, room / args.eta_c)
-            soc += e_in * args.eta_c
-            pool_exp -= e_in
-
-        # 4) discharge do komunity (deficity ostatních)
-        pool_imp = imp_o
-        if pool_imp > 1e-12 and soc > 1e-12:
-            deliverable = soc * args.eta_d
-            d = min(pool_imp, deliverable)
-            sh_dis = d
-            soc -= d / args.eta_d
-
-        rows.append({
-            "datetime": t,
-            "own_stored_kwh": own_dis,
-            "shared_stored_kwh": sh_dis,
-            "soc_kwh": soc,
-        })
-
-    out = pd.DataFrame(rows).sort_values("datetime")
-    out.to_csv(outdir / "by_hour_after_bat_central.csv", index=False)
-    print(f"[OK] {outdir / 'by_hour_after_bat_central.csv'}")
+    sites = sorted(set(sites) | {args.central_site})  # inkrementálně může centrum v dávce chybět
+
+    # husté matice hodiny × site (chybějící hodnota = 0)
+    imp_m = dense(imp, "imp", times, sites, dt, site_col)
+    exp_m = dense(exp, "exp", times, sites, dt, site_col)
+    ci = sites.index(args.central_site)
+    others = [j for j, s in enumerate(sites) if s != args.central_site]
+    cap = float(args.cap_kwh)
+
+    # ostatní komunita (bez centra)
+    imp_c, exp_c = imp_m[:, ci], exp_m[:, ci]
+    imp_o, exp_o = seq_row_sums(imp_m[:, others]), seq_row_sums(exp_m[:, others])
+    bounds = window_bounds(times, args.window)
+    (soc, own_dis, sh_dis), redone = run_windows(
+        lambda a, b, s0: own_community_central(imp_c[a:b], exp_c[a:b], imp_o[a:b], exp_o[a:b], cap,
+                                               eta_c=args.eta_c, eta_d=args.eta_d, soc0=float(s0)),
+        bounds, soc0, workers=args.workers or os.cpu_count() or 1)
+    if len(bounds) > 2:
+        print(f"[i] {len(bounds) - 1} oken ({args.window}), sladění přepočítalo {redone} h z {len(times)}")
+    rows = pd.DataFrame({
+        "datetime": np.asarray(times),
+        "own_stored_kwh": own_dis,
+        "shared_stored_kwh": sh_dis,
+        "soc_kwh": soc,
+    })
+
+    out = rows.sort_values("datetime")
+    p_out = (append_table if args.incremental else write_table)(out, outdir / "by_hour_after_bat_central.csv")
+    print(f"[OK] {p_out}")
+    last = times.max() if len(times) else (pd.NaT if carry is None else carry["datetime"])
+    state = pd.DataFrame([{
+        "central_site": args.central_site, "cap_kwh": cap, "soc_kwh": float(soc[-1]) if len(soc) else soc0,
+        "throughput_kwh": thr0 + float(own_dis.sum() + sh_dis.sum()), "datetime": last,
+    }], columns=STATE_COLS)
+    print(f"[OK] {write_table(state, outdir / 'bat_central_state.csv')}")
+    save_state(outdir, "step5a", batch=batch)
 
     # meta info pro ekonomiku a metriky
-    pd.DataFrame([{"central_site": args.central_site, "cap_kwh": float(cap)}]).to_csv(outdir / "bat_central_meta.csv", index=False)
-    print(f"[OK] {outdir / 'bat_central_meta.csv'}")
+    p_meta = write_table(pd.DataFrame([{"central_site": args.central_site, "cap_kwh": float(cap)}]), outdir / "bat_central_meta.csv")
+    print(f"[OK] {p_meta}")
 
 if __name__ == "__main__":
     main()
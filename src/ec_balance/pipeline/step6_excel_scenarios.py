@@ -3,9 +3,18 @@
 
 # -*- coding: utf-8 -*-
 import argparse
+import os
+import time
+from functools import partial
 from pathlib import Path
 import numpy as np
 import pandas as pd
+from ..utils.store import read_table, exists
+from ..utils.profiling import profiled
+from ..utils.profiles import typical_profiles
+from ..utils.rainflow import DOD_EXPONENT, dod_summary
+from ..utils.alloc_store import load_hourly_totals
+from ..utils.timegrid import step_axis
 
 # jednotné sloupce pro by_hour
 REQ_SCHEMA = [
@@ -30,9 +39,9 @@ REQ_SCHEMA = [
 # ----------------- I/O pomocníci -----------------
 def _load(csvdir: Path, name: str, parse_dt=True):
     p = csvdir / f"{name}.csv"
-    if not p.exists():
+    if not exists(p):
         return None
-    df = pd.read_csv(p)
+    df = read_table(p)
     if parse_dt and "datetime" in df.columns:
         df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce").dt.floor("h")
     return df
@@ -57,6 +66,14 @@ def _merge_time(a: pd.DataFrame | None, b: pd.DataFrame | None):
     out = pd.merge(a, b, on="datetime", how="outer")
     return out.sort_values("datetime").reset_index(drop=True)
 
+def _on_axis(df: pd.DataFrame, times: pd.Index | None):
+    """Hodinová tabulka na ose time_grid – hodiny bez dat jako explicitní nulové řádky."""
+    if times is None or not len(times) or df is None or "datetime" not in df.columns:
+        return df
+    x = df.set_index("datetime")
+    idx = pd.DatetimeIndex(times).union(pd.DatetimeIndex(x.index.dropna().unique()))
+    return x.reindex(idx.rename("datetime"), fill_value=0.0).reset_index()
+
 def _ensure_schema(df: pd.DataFrame | None):
     if df is None:
         return pd.DataFrame(columns=REQ_SCHEMA)
@@ -67,8 +84,8 @@ def _ensure_schema(df: pd.DataFrame | None):
     return out[REQ_SCHEMA].sort_values("datetime").reset_index(drop=True)
 
 # ----------------- Scénáře S1–S3 -----------------
-def build_s1(ean_o_long, p_com_mwh, p_dist_mwh):
-    cons = _sum_hour(ean_o_long, "value_kwh", "consumption")
+def build_s1(ean_o_long, p_com_mwh, p_dist_mwh, times=None):
+    cons = _on_axis(_sum_hour(ean_o_long, "value_kwh", "consumption"), times)
     base = cons.copy()
     base["import"] = base["consumption"]
     base["pv_production"] = 0.0
@@ -87,14 +104,14 @@ def build_s1(ean_o_long, p_com_mwh, p_dist_mwh):
     base["saving_sharing_kcz"] = 0.0
     return _ensure_schema(base)
 
-def build_s2(eano_after_pv, eand_after_pv, local_self, p_com_mwh, p_dist_mwh, p_feed_mwh):
+def build_s2(eano_after_pv, eand_after_pv, local_self, p_com_mwh, p_dist_mwh, p_feed_mwh, times=None):
     imp = _sum_hour(eano_after_pv, "import_after_kwh", "import")
     exp = _sum_hour(eand_after_pv, "export_after_kwh", "export")
     selfc = _sum_hour(local_self, "local_selfcons_kwh", "self_pv_consumption")
     base = _merge_time(_merge_time(imp, exp), selfc)
     if base is None:
         base = pd.DataFrame(columns=["datetime"])
-    base = base.fillna(0.0)
+    base = _on_axis(base.fillna(0.0), times)
     base["consumption"] = base["import"] + base["self_pv_consumption"]
     base["pv_production"] = base["self_pv_consumption"] + base["export"]
     base["shared_received_kwh"] = 0.0
@@ -111,7 +128,8 @@ def build_s2(eano_after_pv, eand_after_pv, local_self, p_com_mwh, p_dist_mwh, p_
     base["saving_sharing_kcz"] = 0.0
     return _ensure_schema(base)
 
-def build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self, p_com_mwh, p_dist_mwh, p_feed_mwh):
+def build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self, p_com_mwh, p_dist_mwh, p_feed_mwh,
+             times=None):
     if by_hour_after is None or by_hour_after.empty:
         raise ValueError("Chybí by_hour_after.csv (krok 3).")
     df = by_hour_after.rename(columns={
@@ -124,7 +142,7 @@ def build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self, p_c
     df = _merge_time(df, selfc)
     df = _merge_time(df, cons)
     df = _merge_time(df, prod)
-    df = df.fillna(0.0)
+    df = _on_axis(df.fillna(0.0), times)
     if allocations is not None and not allocations.empty:
         sh = allocations.groupby("datetime", as_index=False)["shared_kwh"].sum()
         df = _merge_time(df, sh.rename(columns={"shared_kwh": "shared_received_kwh"}))
@@ -145,6 +163,57 @@ def build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self, p_c
     df["saving_sharing_kcz"] = df["shared_received_kwh"] * k_com
     return _ensure_schema(df)
 
+def build_s4(base, flows, bh, p_com_mwh, p_dist_mwh, p_feed_mwh):
+    """S4a/S4b = S3 (`base`, nemění se) + baterie: toky po baterii (`flows`) a hodinové metriky (`bh`)."""
+    s4 = base.copy()
+
+    # 1) pokud bat-CSV obsahuje import/export po baterii, přepiš je
+    if flows is not None:
+        s4 = s4.merge(flows, on="datetime", how="left", suffixes=("","_bat"))
+        if "import_bat" in s4.columns:
+            s4["import"] = s4["import_bat"].fillna(s4["import"]); s4.drop(columns=["import_bat"], inplace=True)
+        if "export_bat" in s4.columns:
+            s4["export"] = s4["export_bat"].fillna(s4["export"]); s4.drop(columns=["export_bat"], inplace=True)
+        if "shared_received_kwh_bat" in s4.columns:
+            s4["shared_received_kwh"] = s4["shared_received_kwh_bat"].fillna(s4.get("shared_received_kwh", 0.0))
+            s4.drop(columns=["shared_received_kwh_bat"], inplace=True)
+
+    # 2) smaž nulové storage sloupce z base, ať nevznikne _x/_y
+    for c in ["own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh", "soc_kwh"]:
+        if c in s4.columns:
+            s4.drop(columns=[c], inplace=True)
+
+    # 3) přimerguj hodinové baterkové metriky
+    if bh is not None:
+        s4 = s4.merge(
+            bh[["datetime", "own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh"]],
+            on="datetime", how="left"
+        )
+
+    # 4) koalescence na čísla
+    for c in ["own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh"]:
+        if c not in s4.columns:
+            s4[c] = 0.0
+        s4[c] = pd.to_numeric(s4[c], errors="coerce").fillna(0.0)
+
+    # 5) FALLBACK: když jsme nenašli bat import/export, uprav z S3: snížíme import o discharge a export o charge
+    if flows is None or (("import" in s4.columns) and s4["import"].equals(base["import"])):
+        s4["import"] = (s4["import"] - s4["consumption_from_storage_kwh"]).clip(lower=0.0)
+    if flows is None or (("export" in s4.columns) and s4["export"].equals(base["export"])):
+        s4["export"] = (s4["export"] - (s4["own_pv_stored_kwh"] + s4["shared_pv_stored_kwh"])).clip(lower=0.0)
+
+    s4 = _ensure_schema(s4)
+
+    # 6) finance z nových import/export (sdílení dist necháváme podle 'shared_received_kwh', pokud máme)
+    k_com = p_com_mwh / 1000.0
+    k_dist = p_dist_mwh / 1000.0
+    k_feed = p_feed_mwh / 1000.0
+    s4["cost_import_kcz"] = s4["import"] * (k_com + k_dist)
+    s4["cost_shared_dist_kcz"] = s4.get("shared_received_kwh", 0.0) * k_dist
+    s4["revenue_export_kcz"] = s4["export"] * k_feed
+    s4["total_cost_kcz"] = s4["cost_import_kcz"] + s4["cost_shared_dist_kcz"] - s4["revenue_export_kcz"]
+    return s4
+
 # ----------------- Baterky: loadery & metriky -----------------
 def _sum_cols(df, like_any, exclude_any=None):
     if exclude_any is None:
@@ -178,9 +247,9 @@ def _load_battery_flows(path):
     z by_hour_after_bat_*.csv, když jsou k dispozici.
     """
     p = Path(path)
-    if not p.exists():
+    if not exists(p):
         return None
-    df = pd.read_csv(p)
+    df = read_table(p)
     if "datetime" not in df.columns or df.empty:
         return None
     df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce").dt.floor("h")
@@ -228,10 +297,10 @@ def _load_battery_by_hour(path, kind, eta_c=0.95, eta_d=0.95):
     if not path:
         return None
     p = Path(path)
-    if not p.exists():
+    if not exists(p):
         print(f"[WARN] Battery CSV nenalezeno: {p}")
         return None
-    df = pd.read_csv(p)
+    df = read_table(p)
     if df.empty or "datetime" not in df.columns:
         return None
 
@@ -283,21 +352,27 @@ def _load_battery_by_hour(path, kind, eta_c=0.95, eta_d=0.95):
 
 def _load_local_caps(csvdir: Path):
     p = csvdir / "bat_local_cap_by_site.csv"
-    if p.exists():
-        df = pd.read_csv(p)
+    if exists(p):
+        df = read_table(p)
         if {"site", "cap_kwh"}.issubset(df.columns):
             return float(pd.to_numeric(df["cap_kwh"], errors="coerce").fillna(0.0).sum())
     return None
 
 def _load_central_meta(csvdir: Path):
     p = csvdir / "bat_central_meta.csv"
-    if p.exists():
-        df = pd.read_csv(p)
+    if exists(p):
+        df = read_table(p)
         if {"central_site", "cap_kwh"}.issubset(df.columns):
             return df.iloc[0]["central_site"], float(df.iloc[0]["cap_kwh"])
     return None, None
 
-def battery_metrics(bh: pd.DataFrame | None, cap_total_kwh: float | None, eta_d=0.95):
+def battery_metrics(bh: pd.DataFrame | None, cap_total_kwh: float | None, eta_d=0.95, *,
+                    cycles: str = "minima", cycle_life: float = 5000.0, dod_exponent: float = DOD_EXPONENT):
+    """
+    Metriky baterie z hodinové řady. cycles="minima": délka cyklu = vzdálenost lokálních minim SoC;
+    cycles="rainflow": navíc rainflow (histogram DoD, cykly vážené degradací a životnost
+    při `cycle_life` plných cyklech).
+    """
     if bh is None or bh.empty:
         return {
             "efc": 0.0,
@@ -316,54 +391,36 @@ def battery_metrics(bh: pd.DataFrame | None, cap_total_kwh: float | None, eta_d=
     hours = max(1, len(bh))
     cycles_per_year = efc * (8760.0 / hours)
     soc = pd.to_numeric(bh.get("soc_kwh", pd.Series(0.0)), errors="coerce").fillna(0.0).to_numpy()
-    mins = []
-    for i in range(1, len(soc) - 1):
-        if soc[i] <= soc[i - 1] and soc[i] <= soc[i + 1]:
-            mins.append(i)
-    cycle_lengths = []
-    for j in range(len(mins) - 1):
-        d = mins[j + 1] - mins[j]
-        if d > 0:
-            cycle_lengths.append(d)
-    median_cycle_h = float(np.median(cycle_lengths)) if cycle_lengths else 0.0
+    # lokální minima (soc[i] <= oba sousedé), délky cyklů = rozestupy minim
+    mins = np.flatnonzero((soc[1:-1] <= soc[:-2]) & (soc[1:-1] <= soc[2:])) + 1 if len(soc) > 2 else np.zeros(0, int)
+    cycle_lengths = np.diff(mins)
+    median_cycle_h = float(np.median(cycle_lengths)) if len(cycle_lengths) else 0.0
     lifetime_years = (5000.0 / cycles_per_year) if cycles_per_year > 0 else np.inf
     cap_factor = float(discharge.sum() / (cap * 8760.0)) if cap > 0 else 0.0
-    return {
+    out = {
         "efc": efc,
         "cycles_per_year": cycles_per_year,
         "median_cycle_h": median_cycle_h,
         "lifetime_years_at_5000": lifetime_years,
         "capacity_factor": cap_factor,
     }
+    if cycles == "rainflow":
+        rf = dod_summary(soc, cap, exponent=dod_exponent)
+        w_per_year = rf["efc_weighted"] * (8760.0 / hours)
+        out["rainflow_cycles"] = rf["cycles"]
+        out["efc_dod_weighted"] = rf["efc_weighted"]
+        out["lifetime_years_rainflow"] = (cycle_life / w_per_year) if w_per_year > 0 else np.inf
+        out.update({f"cycles_dod_{k}": v for k, v in rf["dod_hist"].items()})
+    return out
 
 # ----------------- Profily & osy -----------------
+PROFILE_COLS = ["consumption", "import", "pv_production", "self_pv_consumption", "export",
+                "shared_received_kwh", "own_pv_stored_kwh", "shared_pv_stored_kwh"]
+
 def _profiles(df: pd.DataFrame | None):
     if df is None or df.empty:
         return None, None, None
-    x = df.copy()
-    x["datetime"] = pd.to_datetime(x["datetime"]).dt.floor("h")
-    x["month"] = x["datetime"].dt.month
-    x["dow"] = x["datetime"].dt.dayofweek
-    x["hour"] = x["datetime"].dt.hour
-    cols = [c for c in ["consumption", "import", "pv_production", "self_pv_consumption", "export",
-                        "shared_received_kwh", "own_pv_stored_kwh", "shared_pv_stored_kwh"] if c in x.columns]
-    day_tabs, week_tabs, month_tabs = {}, {}, {}
-    for m in sorted(x["month"].unique()):
-        xm = x.loc[x["month"] == m].copy()
-        day = xm.groupby("hour", as_index=False)[cols].mean()
-        day.insert(0, "month", m)
-        xm.loc[:, "hweek"] = xm["dow"] * 24 + xm["hour"]
-        wk = xm.groupby("hweek", as_index=False)[cols].mean()
-        wk.insert(0, "month", m)
-        ms = xm.groupby("month", as_index=False)[cols].sum()
-        day_tabs[m] = day
-        week_tabs[m] = wk
-        month_tabs[m] = ms
-    return (
-        pd.concat(day_tabs.values(), ignore_index=True) if day_tabs else None,
-        pd.concat(week_tabs.values(), ignore_index=True) if week_tabs else None,
-        pd.concat(month_tabs.values(), ignore_index=True) if month_tabs else None,
-    )
+    return typical_profiles(df, [c for c in PROFILE_COLS if c in df.columns], floor="h")
 
 def _axes_max(*dfs, cols=None):
     m = 0.0
@@ -379,6 +436,7 @@ def _axes_max(*dfs, cols=None):
     return (0, m * 1.05 if m > 0 else 1.0)
 
 # ----------------- Excel výstupy -----------------
+@profiled(phase_name="write")
 def _write_dashboard_finance(writer, name, df, day, week, month, allocations=None, bat_df=None, bat_metrics=None):
     wb = writer.book
 
@@ -501,6 +559,201 @@ def _write_dashboard_finance(writer, name, df, day, week, month, allocations=Non
                 excel_writer=writer, sheet_name="battery", startrow=0, startcol=4, index=False
             )
 
+# ----------------- Rychlý zápis (--excel_mode fast) -----------------
+# xlsxwriter constant_memory: řádky se zapisují postupně a hned flushují na disk, takže
+# každý list se plní striktně po řádcích (pandas to_excel zapisuje po sloupcích → nelze).
+_EXCEL_EPOCH = np.datetime64("1899-12-30")
+_FLOW_COLS = ["consumption", "import", "pv_production"]
+_COST_COLS = ["cost_import_kcz", "cost_shared_dist_kcz", "revenue_export_kcz", "total_cost_kcz"]
+
+def _excel_columns(df: pd.DataFrame):
+    """Sloupce DF jako Python listy pro write_row (datetime → sériové číslo Excelu, NaN → None)."""
+    out, kinds = [], []
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            v = (s.dt.tz_localize(None) if s.dt.tz is not None else s).to_numpy("datetime64[ns]")
+            num = (v - _EXCEL_EPOCH) / np.timedelta64(1, "D")
+            kinds.append("datetime")
+        elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+            num = s.to_numpy(dtype=float)
+            kinds.append("int" if pd.api.types.is_integer_dtype(s) else "number")
+        else:
+            vals = s.astype(object).where(s.notna(), None)
+            out.append(vals.tolist())
+            kinds.append("text")
+            continue
+        vals = num.astype(object)
+        vals[np.isnan(num)] = None
+        out.append(vals.tolist())
+    return out, kinds
+
+def _stream_frame(ws, df: pd.DataFrame, fmt: dict, startrow: int = 0, startcol: int = 0) -> int:
+    """Zapiš DF po řádcích; formát nese sloupec (set_column), ne buňka. Vrací počet datových řádků."""
+    ws.write_row(startrow, startcol, [str(c) for c in df.columns], fmt["header"])
+    cols, kinds = _excel_columns(df)
+    for j, kind in enumerate(kinds):
+        width = 18 if kind == "datetime" else 12
+        ws.set_column(startcol + j, startcol + j, width, fmt.get(kind))
+    for i, row in enumerate(zip(*cols), start=startrow + 1):
+        ws.write_row(i, startcol, row)
+    return len(df)
+
+def _daily(df: pd.DataFrame, cols) -> pd.DataFrame:
+    x = df[["datetime"] + [c for c in cols if c in df.columns]].copy()
+    x["datetime"] = pd.to_datetime(x["datetime"]).dt.floor("D")
+    return x.groupby("datetime", as_index=False).sum().rename(columns={"datetime": "date"})
+
+@profiled(phase_name="write")
+def _write_dashboard_fast(path: Path, name, df, day, week, month, allocations=None, bat_df=None, bat_metrics=None):
+    """Stejné listy jako _write_dashboard_finance; grafy nad denními součty (list by_day)."""
+    import xlsxwriter
+    wb = xlsxwriter.Workbook(str(path), {"constant_memory": True, "nan_inf_to_errors": True})
+    fmt = {
+        "header": wb.add_format({"bold": True, "border": 1}),
+        "datetime": wb.add_format({"num_format": "yyyy-mm-dd hh:mm"}),
+        "date": wb.add_format({"num_format": "yyyy-mm-dd"}),
+        "number": wb.add_format({"num_format": "0.000"}),
+        "int": None,
+        "text": None,
+    }
+    try:
+        _stream_frame(wb.add_worksheet("by_hour"), df, fmt)
+
+        daily = _daily(df, _FLOW_COLS + _COST_COLS)
+        wsd = wb.add_worksheet("by_day")
+        nd = _stream_frame(wsd, daily, fmt)
+        wsd.set_column(0, 0, 12, fmt["date"])
+
+        # Dashboard
+        ws = wb.add_worksheet("Dashboard")
+        totals = {c: float(pd.to_numeric(df[c], errors="coerce").fillna(0.0).sum())
+                  for c in ["consumption", "pv_production", "import", "self_pv_consumption",
+                            "shared_received_kwh", "export", "total_cost_kcz"] if c in df.columns}
+        _stream_frame(ws, pd.DataFrame({
+            "Metric": ["Consumption (kWh)", "PV production (kWh)", "Import (kWh)", "Self PV (kWh)",
+                       "Shared received (kWh)", "Export (kWh)", "Total cost (kCZ)"],
+            "Value": [totals.get(c, 0.0) for c in ["consumption", "pv_production", "import", "self_pv_consumption",
+                                                   "shared_received_kwh", "export", "total_cost_kcz"]],
+        }), fmt)
+        ws.set_column(0, 0, 22)
+
+        ymin, ymax = _axes_max(daily, cols=_FLOW_COLS)
+        lc = wb.add_chart({"type": "line"})
+        lc.set_title({"name": f"{name}: Daily flows"})
+        lc.set_x_axis({"name": "Day", "date_axis": True, "num_format": "yyyy-mm-dd"})
+        lc.set_y_axis({"name": "kWh/day", "min": ymin, "max": ymax})
+        for cname in _FLOW_COLS:
+            if cname in daily.columns:
+                ci = daily.columns.get_loc(cname)
+                lc.add_series({"name": ["by_day", 0, ci], "categories": ["by_day", 1, 0, nd, 0],
+                               "values": ["by_day", 1, ci, nd, ci]})
+        lc.set_legend({"position": "bottom"})
+        ws.insert_chart(1, 6, lc, {"x_scale": 1.6, "y_scale": 1.2})
+
+        _stream_frame(ws, pd.DataFrame({
+            "Part": ["Self PV", "Shared PV", "Grid"],
+            "kWh": [float(pd.to_numeric(df.get(c, pd.Series(0.0))).sum())
+                    for c in ["self_pv_consumption", "shared_received_kwh", "import"]],
+        }), fmt, startrow=16)
+        pie = wb.add_chart({"type": "doughnut"})
+        pie.set_title({"name": "Shares of consumption"})
+        pie.add_series({"categories": ["Dashboard", 17, 0, 19, 0], "values": ["Dashboard", 17, 1, 19, 1]})
+        pie.set_hole_size(50)
+        ws.insert_chart(16, 6, pie, {"x_scale": 1.0, "y_scale": 1.0})
+
+        # Finance (hodinová data, grafy po dnech)
+        wsf = wb.add_worksheet("Finance")
+        _stream_frame(wsf, df[["datetime"] + _COST_COLS], fmt)
+        ch = wb.add_chart({"type": "column", "subtype": "stacked"})
+        ch.set_title({"name": "Costs per day (stacked)"})
+        ch.set_x_axis({"name": "Day", "date_axis": True, "num_format": "yyyy-mm-dd"})
+        ch.set_y_axis({"name": "kCZ"})
+        for c in ["cost_import_kcz", "cost_shared_dist_kcz"]:
+            ci = daily.columns.get_loc(c)
+            ch.add_series({"name": ["by_day", 0, ci], "categories": ["by_day", 1, 0, nd, 0],
+                           "values": ["by_day", 1, ci, nd, ci]})
+        ch2 = wb.add_chart({"type": "column"})
+        ch2.set_title({"name": "Revenue from export per day"})
+        ci_rev = daily.columns.get_loc("revenue_export_kcz")
+        ch2.add_series({"name": ["by_day", 0, ci_rev], "categories": ["by_day", 1, 0, nd, 0],
+                        "values": ["by_day", 1, ci_rev, nd, ci_rev]})
+        wsf.insert_chart(1, 8, ch, {"x_scale": 1.2, "y_scale": 1.0})
+        wsf.insert_chart(20, 8, ch2, {"x_scale": 1.2, "y_scale": 1.0})
+
+        for sheet, prof in (("profiles_day", day), ("profiles_week", week), ("profiles_month", month)):
+            if prof is not None:
+                _stream_frame(wb.add_worksheet(sheet), prof, fmt)
+
+        if bat_df is not None and not bat_df.empty and "soc_kwh" in bat_df.columns:
+            wsb = wb.add_worksheet("battery")
+            # metriky od sloupce E (řádky 0–1) přepisují data jako ve standardním režimu;
+            # řádky se ale smí psát jen vzestupně → vkládají se hned za řádek 0, resp. 1
+            mcols = [str(k) for k in (bat_metrics or {})]
+            mvals = [("inf" if np.isinf(v) else None) if not np.isfinite(v) else float(v)
+                     for v in (bat_metrics or {}).values()]  # jako pandas inf_rep
+            wsb.write_row(0, 0, [str(c) for c in bat_df.columns], fmt["header"])
+            if mcols:
+                wsb.write_row(0, 4, mcols, fmt["header"])
+            cols, kinds = _excel_columns(bat_df)
+            for j, kind in enumerate(kinds):
+                wsb.set_column(j, j, 18 if kind == "datetime" else 12, fmt.get(kind))
+            for i, row in enumerate(zip(*cols), start=1):
+                wsb.write_row(i, 0, row)
+                if i == 1 and mcols:
+                    wsb.write_row(1, 4, mvals)
+            nbat = len(bat_df)
+            chs = wb.add_chart({"type": "line"})
+            chs.set_title({"name": "State of charge (kWh)"})
+            chs.add_series({"name": ["battery", 0, 1], "categories": ["battery", 1, 0, nbat, 0],
+                            "values": ["battery", 1, 1, nbat, 1]})
+            wsb.insert_chart(1, 3, chs, {"x_scale": 1.4, "y_scale": 1.0})
+    finally:
+        wb.close()
+
+def _write_workbook(path: Path, name: str, df: pd.DataFrame, fast: bool, kwargs: dict) -> str:
+    """Jeden scénářový sešit (profily + listy); běží i v pracovním procesu."""
+    day, week, month = _profiles(df)
+    if fast:
+        _write_dashboard_fast(path, name, df, day, week, month, **kwargs)
+    else:
+        with pd.ExcelWriter(path, engine="xlsxwriter") as xw:
+            _write_dashboard_finance(xw, name, df, day, week, month, **kwargs)
+    return str(path)
+
+def _scenario(build, book, fast: bool, *args) -> pd.DataFrame:
+    """Uzel DAG: postav scénář a (je-li book = (cesta, název, kwargs)) zapiš jeho sešit."""
+    df = build(*args)
+    if book is not None:
+        path, name, kw = book
+        _write_workbook(path, name, df, fast, kw)
+    return df
+
+def _run_dag(nodes: dict, workers: int) -> dict:
+    """
+    nodes = {klíč: (fn, závislosti, args)}, volá se fn(*výsledky závislostí, *args).
+    workers <= 1 → postupně v pořadí vložení (to musí být topologické); jinak v procesech,
+    uzel se spustí, jakmile jsou hotové jeho závislosti. Vrací {klíč: výsledek}.
+    """
+    done = {}
+    if workers <= 1:
+        for k, (fn, deps, args) in nodes.items():
+            done[k] = fn(*[done[d] for d in deps], *args)
+        return done
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    pending, running = dict(nodes), {}
+    with ProcessPoolExecutor(min(workers, len(nodes))) as ex:
+        while pending or running:
+            for k in [k for k, (_, deps, _) in pending.items() if all(d in done for d in deps)]:
+                fn, deps, args = pending.pop(k)
+                running[ex.submit(fn, *[done[d] for d in deps], *args)] = k
+            if not running:
+                raise ValueError(f"Nesplnitelné závislosti scénářů: {sorted(pending)}")
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for f in finished:
+                done[running.pop(f)] = f.result()
+    return done
+
 def _scenario_totals(name, df):
     s = df.sum(numeric_only=True)
     d = {"scenario": name}
@@ -619,8 +872,16 @@ def main():
     ap.add_argument("--project_years", type=int, default=15)
     ap.add_argument("--discount_rate", type=float, default=0.03)
     ap.add_argument("--batt_cycle_life", type=float, default=5000.0)
+    ap.add_argument("--batt_cycles", choices=["minima", "rainflow"], default="minima",
+                    help="rainflow = navíc histogram DoD a životnost z cyklů vážených degradací")
+    ap.add_argument("--batt_dod_exponent", type=float, default=DOD_EXPONENT,
+                    help="k ve Wöhlerově křivce N(DoD) = N100 * DoD^-k (pro --batt_cycles rainflow)")
     ap.add_argument("--eta_c", type=float, default=0.95)  # pro dopočet discharge ze SOC
     ap.add_argument("--eta_d", type=float, default=0.95)
+    ap.add_argument("--excel_mode", choices=["standard", "fast"], default="standard",
+                    help="fast = constant_memory zápis po řádcích, grafy nad denními součty")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="procesy pro scénářové sešity (0 = fast: dle CPU, standard: 1)")
     args = ap.parse_args()
 
     csvdir = Path(args.csv_dir)
@@ -633,38 +894,12 @@ def main():
     eand_after = _load(csvdir, "eand_after_pv")
     local_self = _load(csvdir, "local_selfcons")
     by_hour_after = _load(csvdir, "by_hour_after")
-    allocations = _load(csvdir, "allocations")
+    allocations = load_hourly_totals(csvdir / "allocations.csv")  # step6 potřebuje jen součty po hodinách
 
     scen = set(s.strip().lower() for s in args.scenarios.split(",") if s.strip())
-    built = {}
-
-    # S1
-    if "s1" in scen:
-        s1 = build_s1(ean_o_long, args.price_commodity_mwh, args.price_distribution_mwh)
-        d1, w1, m1 = _profiles(s1)
-        with pd.ExcelWriter(outdir / "scenario_1_grid_only.xlsx", engine="xlsxwriter") as xw:
-            _write_dashboard_finance(xw, "S1 Grid-only", s1, d1, w1, m1)
-        built["S1"] = s1
-
-    # S2
-    if "s2" in scen:
-        s2 = build_s2(eano_after, eand_after, local_self,
-                      args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
-        d2, w2, m2 = _profiles(s2)
-        with pd.ExcelWriter(outdir / "scenario_2_local_pv.xlsx", engine="xlsxwriter") as xw:
-            _write_dashboard_finance(xw, "S2 PV-only", s2, d2, w2, m2)
-        built["S2"] = s2
-
-    # S3
-    if "s3" in scen:
-        s3 = build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self,
-                      args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
-        d3, w3, m3 = _profiles(s3)
-        with pd.ExcelWriter(outdir / "scenario_3_sharing.xlsx", engine="xlsxwriter") as xw:
-            _write_dashboard_finance(xw, "S3 Sharing", s3, d3, w3, m3, allocations=allocations)
-        built["S3"] = s3
-    else:
-        s3 = None
+    # společná hodinová osa z time_grid (kroku 1) – S1–S3 mají stejné hodiny i při mezerách v datech
+    hours = step_axis(csvdir, *(f["datetime"] for f in (ean_o_long, eano_after, by_hour_after) if f is not None),
+                      freq="h", label="step6")
 
     # bateriová data
     bh_local = _load_battery_by_hour(args.by_hour_bat_local_csv, "local", eta_c=args.eta_c, eta_d=args.eta_d) if args.by_hour_bat_local_csv else None
@@ -677,138 +912,50 @@ def main():
     if cap_central is None and bh_centr is not None and "soc_kwh" in bh_centr.columns:
         cap_central = float(bh_centr["soc_kwh"].max())
 
-    econ_rows = []
+    bm_opts = {"cycles": args.batt_cycles, "cycle_life": args.batt_cycle_life, "dod_exponent": args.batt_dod_exponent}
 
-    # S4a – Local battery
+    # DAG scénářů: S3 se staví jednou (i když není vybraný) a je základem S4a/S4b
+    prices = (args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
+    fast = args.excel_mode == "fast"
+    nodes = {}
+    if "s1" in scen:
+        nodes["S1"] = (partial(_scenario, build_s1, (outdir / "scenario_1_grid_only.xlsx", "S1 Grid-only", {}), fast),
+                       (), (ean_o_long, *prices[:2], hours))
+    if "s2" in scen:
+        nodes["S2"] = (partial(_scenario, build_s2, (outdir / "scenario_2_local_pv.xlsx", "S2 PV-only", {}), fast),
+                       (), (eano_after, eand_after, local_self, *prices, hours))
+    if scen & {"s3", "s4a", "s4b"}:
+        book = (outdir / "scenario_3_sharing.xlsx", "S3 Sharing", {"allocations": allocations}) if "s3" in scen else None
+        nodes["S3"] = (partial(_scenario, build_s3, book, fast),
+                       (), (by_hour_after, allocations, ean_o_long, ean_d_long, local_self, *prices, hours))
     if "s4a" in scen:
-        base = built.get("S3", None)
-        if base is None:
-            base = build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self,
-                            args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
-        s4a = base.copy()
-
-        # 1) pokud bat-CSV obsahuje import/export po baterii, přepiš je
-        if flows4a is not None:
-            s4a = s4a.merge(flows4a, on="datetime", how="left", suffixes=("","_bat"))
-            if "import_bat" in s4a.columns:
-                s4a["import"] = s4a["import_bat"].fillna(s4a["import"]); s4a.drop(columns=["import_bat"], inplace=True)
-            if "export_bat" in s4a.columns:
-                s4a["export"] = s4a["export_bat"].fillna(s4a["export"]); s4a.drop(columns=["export_bat"], inplace=True)
-            if "shared_received_kwh_bat" in s4a.columns:
-                s4a["shared_received_kwh"] = s4a["shared_received_kwh_bat"].fillna(s4a.get("shared_received_kwh", 0.0))
-                s4a.drop(columns=["shared_received_kwh_bat"], inplace=True)
-
-        # 2) smaž nulové storage sloupce z base, ať nevznikne _x/_y
-        for c in ["own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh", "soc_kwh"]:
-            if c in s4a.columns:
-                s4a.drop(columns=[c], inplace=True)
-
-        # 3) přimerguj hodinové baterkové metriky
-        if bh_local is not None:
-            s4a = s4a.merge(
-                bh_local[["datetime", "own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh"]],
-                on="datetime", how="left"
-            )
-
-        # 4) koalescence na čísla
-        for c in ["own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh"]:
-            if c not in s4a.columns:
-                s4a[c] = 0.0
-            s4a[c] = pd.to_numeric(s4a[c], errors="coerce").fillna(0.0)
-
-        # 5) FALLBACK: když jsme nenašli bat import/export, uprav z S3: snížíme import o discharge a export o charge
-        if flows4a is None or (("import" in s4a.columns) and s4a["import"].equals(base["import"])):
-            s4a["import"] = (s4a["import"] - s4a["consumption_from_storage_kwh"]).clip(lower=0.0)
-        if flows4a is None or (("export" in s4a.columns) and s4a["export"].equals(base["export"])):
-            s4a["export"] = (s4a["export"] - (s4a["own_pv_stored_kwh"] + s4a["shared_pv_stored_kwh"])).clip(lower=0.0)
-
-        s4a = _ensure_schema(s4a)
-
-        # 6) finance z nových import/export (sdílení dist necháváme podle 'shared_received_kwh', pokud máme)
-        k_com = args.price_commodity_mwh / 1000.0
-        k_dist = args.price_distribution_mwh / 1000.0
-        k_feed = args.price_feed_in_mwh / 1000.0
-        s4a["cost_import_kcz"] = s4a["import"] * (k_com + k_dist)
-        s4a["cost_shared_dist_kcz"] = s4a.get("shared_received_kwh", 0.0) * k_dist
-        s4a["revenue_export_kcz"] = s4a["export"] * k_feed
-        s4a["total_cost_kcz"] = s4a["cost_import_kcz"] + s4a["cost_shared_dist_kcz"] - s4a["revenue_export_kcz"]
-
-        d4a, w4a, m4a = _profiles(s4a)
-        bm_local = battery_metrics(bh_local, float(cap_local or 0.0))
-        with pd.ExcelWriter(outdir / "scenario_4a_batt_local.xlsx", engine="xlsxwriter") as xw:
-            _write_dashboard_finance(xw, "S4a Local battery", s4a, d4a, w4a, m4a,
-                                     allocations=allocations, bat_df=bh_local, bat_metrics=bm_local)
-        built["S4a"] = s4a
-
-        capex_local = float((cap_local or 0.0) * args.local_price_per_kwh + args.local_fixed_cost)
-        if s3 is None:
-            s3 = base
-        econ = build_econ_rows(s3, s4a, capex_local, args.project_years, args.discount_rate)
-        if econ:
-            econ_rows.append({"scenario": "S4a vs S3", **econ})
-
-    # S4b – Central battery
+        book = (outdir / "scenario_4a_batt_local.xlsx", "S4a Local battery",
+                {"allocations": allocations, "bat_df": bh_local,
+                 "bat_metrics": battery_metrics(bh_local, float(cap_local or 0.0), **bm_opts)})
+        nodes["S4a"] = (partial(_scenario, build_s4, book, fast), ("S3",), (flows4a, bh_local, *prices))
     if "s4b" in scen:
-        base = built.get("S3", None)
-        if base is None:
-            base = build_s3(by_hour_after, allocations, ean_o_long, ean_d_long, local_self,
-                            args.price_commodity_mwh, args.price_distribution_mwh, args.price_feed_in_mwh)
-        s4b = base.copy()
-
-        if flows4b is not None:
-            s4b = s4b.merge(flows4b, on="datetime", how="left", suffixes=("","_bat"))
-            if "import_bat" in s4b.columns:
-                s4b["import"] = s4b["import_bat"].fillna(s4b["import"]); s4b.drop(columns=["import_bat"], inplace=True)
-            if "export_bat" in s4b.columns:
-                s4b["export"] = s4b["export_bat"].fillna(s4b["export"]); s4b.drop(columns=["export_bat"], inplace=True)
-            if "shared_received_kwh_bat" in s4b.columns:
-                s4b["shared_received_kwh"] = s4b["shared_received_kwh_bat"].fillna(s4b.get("shared_received_kwh", 0.0))
-                s4b.drop(columns=["shared_received_kwh_bat"], inplace=True)
-
-        for c in ["own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh", "soc_kwh"]:
-            if c in s4b.columns:
-                s4b.drop(columns=[c], inplace=True)
-
-        if bh_centr is not None:
-            s4b = s4b.merge(
-                bh_centr[["datetime", "own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh"]],
-                on="datetime", how="left"
-            )
-
-        for c in ["own_pv_stored_kwh", "shared_pv_stored_kwh", "consumption_from_storage_kwh"]:
-            if c not in s4b.columns:
-                s4b[c] = 0.0
-            s4b[c] = pd.to_numeric(s4b[c], errors="coerce").fillna(0.0)
-
-        if flows4b is None or (("import" in s4b.columns) and s4b["import"].equals(base["import"])):
-            s4b["import"] = (s4b["import"] - s4b["consumption_from_storage_kwh"]).clip(lower=0.0)
-        if flows4b is None or (("export" in s4b.columns) and s4b["export"].equals(base["export"])):
-            s4b["export"] = (s4b["export"] - (s4b["own_pv_stored_kwh"] + s4b["shared_pv_stored_kwh"])).clip(lower=0.0)
-
-        s4b = _ensure_schema(s4b)
-
-        k_com = args.price_commodity_mwh / 1000.0
-        k_dist = args.price_distribution_mwh / 1000.0
-        k_feed = args.price_feed_in_mwh / 1000.0
-        s4b["cost_import_kcz"] = s4b["import"] * (k_com + k_dist)
-        s4b["cost_shared_dist_kcz"] = s4b.get("shared_received_kwh", 0.0) * k_dist
-        s4b["revenue_export_kcz"] = s4b["export"] * k_feed
-        s4b["total_cost_kcz"] = s4b["cost_import_kcz"] + s4b["cost_shared_dist_kcz"] - s4b["revenue_export_kcz"]
-
-        d4b, w4b, m4b = _profiles(s4b)
-        bm_c = battery_metrics(bh_centr, float(cap_central or 0.0))
-        with pd.ExcelWriter(outdir / "scenario_4b_batt_central.xlsx", engine="xlsxwriter") as xw:
-            _write_dashboard_finance(xw, "S4b Central battery", s4b, d4b, w4b, m4b,
-                                     allocations=allocations, bat_df=bh_centr, bat_metrics=bm_c)
-        built["S4b"] = s4b
-
-        capex_central = float((cap_central or 0.0) * args.central_price_per_kwh + args.central_fixed_cost)
-        if s3 is None:
-            s3 = base
-        econ = build_econ_rows(s3, s4b, capex_central, args.project_years, args.discount_rate)
-        if econ:
-            econ_rows.append({"scenario": "S4b vs S3", **econ})
+        book = (outdir / "scenario_4b_batt_central.xlsx", "S4b Central battery",
+                {"allocations": allocations, "bat_df": bh_centr,
+                 "bat_metrics": battery_metrics(bh_centr, float(cap_central or 0.0), **bm_opts)})
+        nodes["S4b"] = (partial(_scenario, build_s4, book, fast), ("S3",), (flows4b, bh_centr, *prices))
+
+    workers = args.workers or ((os.cpu_count() or 1) if fast else 1)
+    t0 = time.perf_counter()
+    frames = _run_dag(nodes, workers)
+    print(f"[OK] {len(nodes)} scénářů ({args.excel_mode}, procesy: {max(1, min(workers, len(nodes)))})"
+          f" → {outdir} ({time.perf_counter() - t0:.1f} s)")
+    built = {k: frames[k] for k in ("S1", "S2", "S3", "S4a", "S4b") if k in frames and (k != "S3" or "s3" in scen)}
 
+    econ_rows = []
+    capex = {
+        "S4a": float((cap_local or 0.0) * args.local_price_per_kwh + args.local_fixed_cost),
+        "S4b": float((cap_central or 0.0) * args.central_price_per_kwh + args.central_fixed_cost),
+    }
+    for k in ("S4a", "S4b"):
+        if k in frames:
+            econ = build_econ_rows(frames["S3"], frames[k], capex[k], args.project_years, args.discount_rate)
+            if econ:
+                econ_rows.append({"scenario": f"{k} vs S3", **econ})
     econ_df = pd.DataFrame(econ_rows) if econ_rows else None
     _write_summary(outdir, built, econ=econ_df)
 
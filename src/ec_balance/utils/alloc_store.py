@@ -0,0 +1,181 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Řídké úložiště alokací sdílení (krok 3, `--alloc_format sparse`) – `allocations.npz`.
+
+Místo řádku (datetime, from_site, to_site, shared_kwh) s opakovanými řetězci:
+
+  hours       datetime64[ns] (H,)   seřazené hodiny s nějakou alokací
+  sites       str (S,)              slovník site; from/to jsou indexy do něj
+  hour_ptr    int64 (H+1,)          CSR: řádky hodiny h = [hour_ptr[h], hour_ptr[h+1])
+  from_idx    int32 (N,)            v rámci hodiny seřazeno podle (from, to)
+  to_idx      int32 (N,)
+  value       float64 (N,)          shared_kwh
+  hour_total  float64 (H,)          předpočtené součty po hodinách (pro step6)
+
+Sloupce jsou samostatná pole v npz (bez pickle), čtou se líně – `load_hourly_totals`
+sáhne jen na `hours` a `hour_total`. `AllocStore` nabízí výřezy po hodinách a po site,
+inkrementální běh kroku 3 připojuje nové hodiny přes `extend` (append_alloc_store).
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from . import artifacts
+from .profiling import phase
+from .store import _note_written, exists, read_table, resolve
+
+SUFFIX = ".npz"
+
+class AllocStore:
+    def __init__(self, hours, sites, hour_ptr, from_idx, to_idx, value, hour_total):
+        self.hours = pd.DatetimeIndex(hours)
+        self.sites = np.asarray(sites, dtype=str)
+        self.hour_ptr = np.asarray(hour_ptr, dtype=np.int64)
+        self.from_idx = np.asarray(from_idx, dtype=np.int32)
+        self.to_idx = np.asarray(to_idx, dtype=np.int32)
+        self.value = np.asarray(value, dtype=float)
+        self.hour_total = np.asarray(hour_total, dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    # ---------- zápis / čtení ----------
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "AllocStore":
+        dt = pd.to_datetime(df["datetime"])
+        h_idx, hours = pd.factorize(dt, sort=True)
+        sites = np.array(sorted(set(df["from_site"].astype(str)) | set(df["to_site"].astype(str))), dtype=str)
+        f_idx = pd.Categorical(df["from_site"].astype(str), categories=sites).codes.astype(np.int32)
+        t_idx = pd.Categorical(df["to_site"].astype(str), categories=sites).codes.astype(np.int32)
+        value = pd.to_numeric(df["shared_kwh"]).to_numpy(float)
+        order = np.lexsort((t_idx, f_idx, h_idx))
+        counts = np.bincount(h_idx, minlength=len(hours))
+        # součty stejně jako groupby("datetime").sum() ve step6 (pandas, ne bincount) → shodné výsledky
+        totals = pd.Series(value).groupby(h_idx).sum().reindex(range(len(hours)), fill_value=0.0).to_numpy()
+        return cls(hours.values, sites, np.r_[0, np.cumsum(counts)], f_idx[order], t_idx[order], value[order], totals)
+
+    def save(self, path: str | Path) -> Path:
+        p = Path(path).with_suffix(SUFFIX)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(p, hours=self.hours.values.astype("datetime64[ns]"), sites=self.sites, hour_ptr=self.hour_ptr,
+                 from_idx=self.from_idx, to_idx=self.to_idx, value=self.value, hour_total=self.hour_total)
+        return p
+
+    @classmethod
+    def load(cls, path: str | Path) -> "AllocStore":
+        with np.load(Path(path).with_suffix(SUFFIX), allow_pickle=False) as z:
+            return cls(z["hours"], z["sites"], z["hour_ptr"], z["from_idx"], z["to_idx"], z["value"], z["hour_total"])
+
+    def extend(self, other: "AllocStore") -> "AllocStore":
+        """Připoj pozdější hodiny (inkrementální běh); slovník site se sjednotí a kódy přečíslují."""
+        if len(self.hours) and len(other.hours) and other.hours[0] <= self.hours[-1]:
+            raise ValueError(f"Alokace od {other.hours[0]} se překrývají s uloženými (do {self.hours[-1]}).")
+        sites = np.union1d(self.sites, other.sites)  # seřazené → přečíslování zachová pořadí v hodině
+        a, b = np.searchsorted(sites, self.sites), np.searchsorted(sites, other.sites)
+        return AllocStore(
+            np.r_[self.hours.values, other.hours.values], sites,
+            np.r_[self.hour_ptr, other.hour_ptr[1:] + self.hour_ptr[-1]],
+            np.r_[a[self.from_idx], b[other.from_idx]], np.r_[a[self.to_idx], b[other.to_idx]],
+            np.r_[self.value, other.value], np.r_[self.hour_total, other.hour_total],
+        )
+
+    # ---------- výřezy ----------
+    def _rows(self, rows) -> pd.DataFrame:
+        h = np.repeat(np.arange(len(self.hours)), np.diff(self.hour_ptr))[rows]
+        return pd.DataFrame({
+            "datetime": self.hours[h],
+            "from_site": self.sites[self.from_idx[rows]].astype(object),
+            "to_site": self.sites[self.to_idx[rows]].astype(object),
+            "shared_kwh": self.value[rows],
+        })
+
+    def to_frame(self) -> pd.DataFrame:
+        """Celá tabulka ve tvaru allocations.csv."""
+        return self._rows(slice(None))
+
+    def hours_between(self, start, end=None) -> pd.DataFrame:
+        """Alokace v hodinách [start, end] (end=None → jen hodina start)."""
+        lo = self.hours.searchsorted(pd.Timestamp(start), side="left")
+        hi = self.hours.searchsorted(pd.Timestamp(end if end is not None else start), side="right")
+        return self._rows(slice(self.hour_ptr[lo], self.hour_ptr[hi]))
+
+    def site(self, name: str, role: str = "any") -> pd.DataFrame:
+        """Alokace site jako zdroje (role='from'), příjemce ('to') nebo obojí ('any')."""
+        if role not in ("from", "to", "any"):
+            raise ValueError(f"role='{role}' (povoleno: from, to, any)")
+        hit = np.flatnonzero(self.sites == str(name))
+        if not len(hit):
+            return self._rows(slice(0, 0))
+        code = hit[0]
+        mask = np.zeros(len(self), dtype=bool)
+        if role in ("from", "any"):
+            mask |= self.from_idx == code
+        if role in ("to", "any"):
+            mask |= self.to_idx == code
+        return self._rows(np.flatnonzero(mask))
+
+    def hourly_totals(self) -> pd.DataFrame:
+        return pd.DataFrame({"datetime": self.hours, "shared_kwh": self.hour_total})
+
+    def site_totals(self) -> pd.DataFrame:
+        n = len(self.sites)
+        return pd.DataFrame({
+            "site": self.sites.astype(object),
+            "shared_in_kwh": np.bincount(self.to_idx, weights=self.value, minlength=n),
+            "shared_out_kwh": np.bincount(self.from_idx, weights=self.value, minlength=n),
+        })
+
+# ---------- napojení na kroky ----------
+def write_alloc_store(df: pd.DataFrame, path: str | Path) -> Path:
+    """Ulož alokace jako npz; v run-all je DataFrame dostupný i v registru (pod jménem .csv)."""
+    p = Path(path).with_suffix(SUFFIX)
+    reg = artifacts.active()
+    if reg is not None:
+        reg.put(p.with_suffix(".csv"), df)
+        if not reg.persist:
+            return p
+    with phase("write"):
+        AllocStore.from_frame(df).save(p)
+    _note_written(p)
+    return p
+
+def append_alloc_store(df: pd.DataFrame, path: str | Path) -> Path:
+    """Připiš alokace nových hodin k existujícímu npz (bez převodu historie na tabulku)."""
+    p = Path(path).with_suffix(SUFFIX)
+    reg = artifacts.active()
+    if not p.exists() or (reg is not None and not reg.persist):
+        old = reg.get(p.with_suffix(".csv")) if reg is not None else None
+        return write_alloc_store(df if old is None else pd.concat([old, df], ignore_index=True), p)
+    if reg is not None and p.with_suffix(".csv") in reg:
+        reg.put(p.with_suffix(".csv"), pd.concat([reg.get(p.with_suffix(".csv")), df], ignore_index=True))
+    with phase("write"):
+        AllocStore.load(p).extend(AllocStore.from_frame(df)).save(p)
+    _note_written(p)
+    return p
+
+def load_hourly_totals(path: str | Path) -> Optional[pd.DataFrame]:
+    """
+    Hodinové součty sdílení (datetime, shared_kwh) k cestě allocations.csv: z registru nebo
+    z tabulky (groupby), případně z allocations.npz, je-li novější než tabulka (jen 2 pole).
+    """
+    p = Path(path)
+    npz = p.with_suffix(SUFFIX)
+    reg = artifacts.active()
+    if not (reg is not None and p in reg) and npz.exists():
+        table = resolve(p)
+        if not table.exists() or npz.stat().st_mtime >= table.stat().st_mtime:
+            with phase("load"), np.load(npz, allow_pickle=False) as z:
+                df = pd.DataFrame({"datetime": pd.DatetimeIndex(z["hours"]), "shared_kwh": z["hour_total"]})
+            df["datetime"] = df["datetime"].dt.floor("h")
+            return df.groupby("datetime", as_index=False)["shared_kwh"].sum()
+    if not exists(p):
+        return None
+    df = read_table(p)
+    df["datetime"] = pd.to_datetime(df["datetime"], errors="coerce").dt.floor("h")
+    return df.groupby("datetime", as_index=False)["shared_kwh"].sum()
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Registr artefaktů pro běh pipeline v jednom procesu (`ecb run-all`).
+
+Když je registr aktivní, utils.store místo (nebo vedle) zápisu na disk uloží DataFrame
+sem a čtení stejné cesty vrátí kopii z paměti – kroky si tak předávají tabulky bez
+CSV/Parquet round-tripu. Klíč = absolutní cesta bez přípony (…/csv/by_hour_after),
+takže funguje s *.csv cestami z CLI/configu i s oběma formáty úložiště.
+"""
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+import pandas as pd
+
+# povinné sloupce známých artefaktů (kontrola při zápisu)
+SCHEMAS: Dict[str, tuple] = {
+    "ean_o_long": ("datetime", "site", "ean", "value_kwh"),
+    "ean_d_long": ("datetime", "site", "ean", "value_kwh"),
+    "ean_o_wide": ("datetime",),
+    "ean_d_wide": ("datetime",),
+    "time_grid": ("start", "end", "freq"),
+    "site_map": ("ean", "site"),
+    "kwp_by_site": ("site", "kwp"),
+    "eano_after_pv": ("datetime", "site", "import_after_kwh"),
+    "eand_after_pv": ("datetime", "site", "export_after_kwh"),
+    "local_selfcons": ("datetime", "site", "local_selfcons_kwh"),
+    "by_site_after": ("site",),
+    "by_hour_after": ("datetime", "import_residual_kwh", "export_residual_kwh"),
+    "allocations": ("datetime", "from_site", "to_site", "shared_kwh"),
+    "local_sensitivity": ("site", "cap_kwh", "discharge_mwh"),
+    "central_sensitivity": ("cap_kwh", "discharge_mwh"),
+    "by_hour_after_bat_local": ("datetime", "own_stored_kwh", "shared_stored_kwh", "soc_kwh"),
+    "bat_local_by_site_hour": ("datetime", "site", "own_stored_kwh", "shared_stored_kwh", "soc_kwh"),
+    "by_hour_after_bat_central": ("datetime", "own_stored_kwh", "shared_stored_kwh", "soc_kwh"),
+    "bat_central_meta": ("central_site", "cap_kwh"),
+    "local_sensitivity_state": ("site", "cap_kwh", "soc_kwh", "throughput_kwh"),
+    "central_sensitivity_state": ("cap_kwh", "soc_kwh", "throughput_kwh"),
+    "bat_local_state": ("site", "cap_kwh", "soc_kwh", "throughput_kwh"),
+    "bat_central_state": ("central_site", "cap_kwh", "soc_kwh", "throughput_kwh"),
+}
+
+_SUFFIXES = (".csv", ".parquet")
+
+@dataclass
+class Artifact:
+    name: str
+    path: Path
+    frame: pd.DataFrame
+    producer: Optional[str] = None
+    created: float = field(default_factory=time.time)
+
+    @property
+    def rows(self) -> int:
+        return len(self.frame)
+
+def artifact_key(path: str | Path) -> str:
+    p = Path(path)
+    if p.suffix.lower() in _SUFFIXES:
+        p = p.with_suffix("")
+    return str(p.resolve())
+
+class ArtifactRegistry:
+    """DataFrame artefakty v paměti; persist=False = mezivýsledky se na disk nezapisují."""
+
+    def __init__(self, *, persist: bool = True):
+        self.persist = persist
+        self.current_step: Optional[str] = None
+        self._items: Dict[str, Artifact] = {}
+
+    def put(self, path: str | Path, df: pd.DataFrame) -> Artifact:
+        key = artifact_key(path)
+        name = Path(key).name
+        required = SCHEMAS.get(name, ())
+        missing = [c for c in required if c not in df.columns]
+        if missing:
+            raise ValueError(f"Artefakt '{name}' nemá povinné sloupce {missing} (krok {self.current_step}).")
+        # stejně jako CSV round-trip: vlastní kopie s RangeIndexem
+        frame = df.copy()
+        frame.index = pd.RangeIndex(len(frame))
+        art = Artifact(name=name, path=Path(path), frame=frame, producer=self.current_step)
+        self._items[key] = art
+        return art
+
+    def get(self, path: str | Path) -> Optional[pd.DataFrame]:
+        art = self._items.get(artifact_key(path))
+        return None if art is None else art.frame.copy()
+
+    def __contains__(self, path) -> bool:
+        return artifact_key(path) in self._items
+
+    def __iter__(self) -> Iterator[Artifact]:
+        return iter(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+_ACTIVE: Optional[ArtifactRegistry] = None
+
+def active() -> Optional[ArtifactRegistry]:
+    return _ACTIVE
+
+@contextmanager
+def use_registry(reg: ArtifactRegistry):
+    """Aktivuj registr pro blok kódu (utils.store ho pak používá pro čtení/zápis)."""
+    global _ACTIVE
+    prev, _ACTIVE = _ACTIVE, reg
+    try:
+        yield reg
+    finally:
+        _ACTIVE = prev
@@ -0,0 +1,470 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Sdílené jádro bateriových simulací (hodina po hodině).
+
+Všechny funkce berou husté float pole:
+  imp, exp   … (hodiny × baterie) import/export v kWh
+  cap        … (baterie,) kapacita v kWh
+  eta_c/eta_d … účinnost nabíjení/vybíjení
+a vrací pole SoC a toků ve stejném tvaru. Sloupec = jedna baterie (site, případně
+site × kapacita), takže kroky 4/4a/5/5a sdílí jeden kód a liší se jen přípravou polí.
+Jádra přijímají počáteční stav (soc0, u sweepu i průběžný výboj) – navázání na předchozí
+období nebo okno; run_windows počítá dlouhý horizont po oknech souběžně a pak je sladí.
+
+Backend:
+  - numba (volitelné, `pip install ec-balance[jit]`) – JIT smyčky,
+  - numpy – smyčka přes hodiny, vektorově přes baterie.
+Volba přes ECB_BATT_BACKEND=auto|numba|numpy (default auto = numba, pokud je k dispozici).
+
+Aritmetika (pořadí operací, min/max, sekvenční součty přes site jako Python `sum`) je
+1:1 s původními smyčkami v krocích, takže výstupní CSV zůstávají bitově stejná.
+"""
+from __future__ import annotations
+import os
+from typing import Callable, Tuple
+import numpy as np
+
+try:
+    import numba  # type: ignore
+except Exception:
+    numba = None
+
+# ---------------- backend ----------------
+def backend() -> str:
+    """Aktivní backend: 'numba' nebo 'numpy'."""
+    want = os.getenv("ECB_BATT_BACKEND", "auto").strip().lower()
+    if want == "numpy":
+        return "numpy"
+    if want == "numba" and numba is None:
+        raise RuntimeError("ECB_BATT_BACKEND=numba, ale numba není nainstalovaná (pip install numba)")
+    return "numba" if numba is not None else "numpy"
+
+_JIT_CACHE: dict = {}
+
+def _jit(fn: Callable) -> Callable:
+    if fn not in _JIT_CACHE:
+        _JIT_CACHE[fn] = numba.njit(cache=True, nogil=True)(fn)
+    return _JIT_CACHE[fn]
+
+def _as_2d(x) -> np.ndarray:
+    a = np.asarray(x, dtype=float)
+    if a.ndim == 1:
+        a = a[:, None]
+    return np.ascontiguousarray(a)
+
+def _as_cap(cap, n: int) -> np.ndarray:
+    c = np.asarray(cap, dtype=float)
+    if c.ndim == 0:
+        c = np.full(n, float(c))
+    return np.ascontiguousarray(c)
+
+def seq_row_sums(a: np.ndarray) -> np.ndarray:
+    """Součty řádků sčítané zleva doprava (= Python `sum` přes site), ne párově jako np.sum."""
+    a = np.asarray(a, dtype=float)
+    if a.shape[1] == 0:
+        return np.zeros(a.shape[0])
+    return 0.0 + np.cumsum(a, axis=1)[:, -1]
+
+def _seq_sum(x: np.ndarray) -> float:
+    return 0.0 + float(np.cumsum(x)[-1]) if len(x) else 0.0
+
+# ---------------- greedy: krok 4 (lokální) ----------------
+# Greedy jádra: baterie j používá sloupec vstupu j % N, takže cap délky K×N = K kapacit
+# pro každý sloupec (sweep) bez kopírování vstupů. tot_out = sekvenční součet výboje.
+def _greedy_local_loop(imp, exp, cap, eta_c, eta_d, soc0, soc_out, dis_out, tot_out, store):
+    T, N = imp.shape
+    M = cap.shape[0]
+    soc = soc0  # počáteční SoC; na konci v něm zůstane koncový
+    for t in range(T):
+        for j in range(M):
+            s = soc[j]
+            c = cap[j]
+            # nabíjení z lokálního přebytku
+            if c > 0:
+                space = c - s
+                if space > 0:
+                    charge = exp[t, j % N] * eta_c
+                    if charge > space:
+                        charge = space
+                    s += charge
+            # vybíjení do lokální potřeby
+            dis = 0.0
+            imp_t = imp[t, j % N]
+            if s > 0 and imp_t > 0 and eta_d > 0:
+                can_dis = s * eta_d
+                dis = imp_t if imp_t < can_dis else can_dis
+                s -= dis / eta_d
+            soc[j] = s
+            tot_out[j] += dis
+            if store:
+                soc_out[t, j] = s
+                dis_out[t, j] = dis
+
+def _greedy_local_np(imp, exp, cap, eta_c, eta_d, soc0, soc_out, dis_out, tot_out, store):
+    K = cap.shape[0] // imp.shape[1]
+    soc = soc0.copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for t in range(imp.shape[0]):
+            space = cap - soc
+            charge = np.tile(exp[t], K) * eta_c
+            charge = np.where(charge > space, space, charge)
+            soc = np.where((cap > 0) & (space > 0), soc + charge, soc)
+            imp_t = np.tile(imp[t], K)
+            can_dis = soc * eta_d
+            ok = (soc > 0) & (imp_t > 0) & (eta_d > 0)
+            dis = np.where(ok, np.where(imp_t < can_dis, imp_t, can_dis), 0.0)
+            soc = np.where(ok, soc - dis / eta_d, soc)
+            tot_out += dis
+            if store:
+                soc_out[t] = soc
+                dis_out[t] = dis
+    soc0[:] = soc
+
+# ---------------- greedy: krok 5 (centrální citlivost) ----------------
+def _greedy_central_loop(imp, exp, cap, eta_c, eta_d, soc0, soc_out, dis_out, tot_out, store):
+    T, N = imp.shape
+    M = cap.shape[0]
+    eta_d_g = 1e-9 if 1e-9 > eta_d else eta_d
+    soc = soc0
+    for t in range(T):
+        for j in range(M):
+            s = soc[j]
+            a = exp[t, j % N] * eta_c
+            b = cap[j] - s
+            s += b if b < a else a
+            can_dis = s * eta_d
+            i = imp[t, j % N]
+            dis = can_dis if can_dis < i else i
+            s -= dis / eta_d_g
+            soc[j] = s
+            tot_out[j] += dis
+            if store:
+                soc_out[t, j] = s
+                dis_out[t, j] = dis
+
+def _greedy_central_np(imp, exp, cap, eta_c, eta_d, soc0, soc_out, dis_out, tot_out, store):
+    K = cap.shape[0] // imp.shape[1]
+    eta_d_g = 1e-9 if 1e-9 > eta_d else eta_d
+    soc = soc0.copy()
+    for t in range(imp.shape[0]):
+        a = np.tile(exp[t], K) * eta_c
+        b = cap - soc
+        soc = soc + np.where(b < a, b, a)
+        can_dis = soc * eta_d
+        i = np.tile(imp[t], K)
+        dis = np.where(can_dis < i, can_dis, i)
+        soc = soc - dis / eta_d_g
+        tot_out += dis
+        if store:
+            soc_out[t] = soc
+            dis_out[t] = dis
+    soc0[:] = soc
+
+def _init(x, n: int) -> np.ndarray:
+    """Počáteční stav (SoC, průběžný součet) délky n – kopie, jádra ho přepisují koncovým."""
+    return np.zeros(n) if x is None else np.array(np.broadcast_to(np.asarray(x, dtype=float), (n,)))
+
+def _run_greedy(loop, np_fn, imp, exp, cap, eta_c, eta_d, store, soc0=None, tot0=None):
+    imp = _as_2d(imp); exp = _as_2d(exp); cap = _as_cap(cap, imp.shape[1])
+    T, N = imp.shape
+    if N == 0 or cap.shape[0] % N:
+        raise ValueError(f"Délka cap ({cap.shape[0]}) musí být násobkem počtu sloupců ({N}).")
+    shape = (T, cap.shape[0]) if store else (0, 0)
+    soc = np.zeros(shape); dis = np.zeros(shape)
+    end = _init(soc0, cap.shape[0]); tot = _init(tot0, cap.shape[0])
+    fn = _jit(loop) if backend() == "numba" else np_fn
+    fn(imp, exp, cap, float(eta_c), float(eta_d), end, soc, dis, tot, store)
+    return soc, dis, tot, end
+
+def greedy_local(imp, exp, cap, *, eta_c: float = 0.95, eta_d: float = 0.95, soc0=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Greedy baterie na úrovni site (krok 4). Vrací (soc, discharge), obojí hodiny × baterie."""
+    soc, dis, _, _ = _run_greedy(_greedy_local_loop, _greedy_local_np, imp, exp, cap, eta_c, eta_d, True, soc0)
+    return soc, dis
+
+def greedy_central(imp, exp, cap, *, eta_c: float = 0.95, eta_d: float = 0.95, soc0=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Greedy centrální baterie nad residuálním by_hour (krok 5). Vrací (soc, discharge)."""
+    soc, dis, _, _ = _run_greedy(_greedy_central_loop, _greedy_central_np, imp, exp, cap, eta_c, eta_d, True, soc0)
+    return soc, dis
+
+# ---------------- sweep přes kapacity ----------------
+_SWEEP = {
+    "local": (_greedy_local_loop, _greedy_local_np),
+    "central": (_greedy_central_loop, _greedy_central_np),
+}
+
+def sweep_discharge(kind: str, imp, exp, caps, *, eta_c: float = 0.95, eta_d: float = 0.95,
+                    soc0=None, energy0=None, return_soc: bool = False):
+    """
+    Celkový výboj [kWh] pro každou kombinaci kapacita × sloupec → pole (kapacity, sloupce).
+    Kapacity běží jako další rozměr jednoho průchodu jádra (kind = 'local' | 'central');
+    hodinové řady se neukládají, paměť je O(kapacity × sloupce).
+    soc0/energy0 (kapacity × sloupce) = navázání na předchozí období (SoC a průběžný součet,
+    výsledek je pak bitově stejný jako průchod celou řadou); return_soc → (výboj, koncový SoC).
+    """
+    if kind not in _SWEEP:
+        raise ValueError(f"Neznámý typ sweepu '{kind}' (povoleno: {sorted(_SWEEP)})")
+    imp = _as_2d(imp)
+    caps = np.asarray(caps, dtype=float).ravel()
+    N = imp.shape[1]
+    if len(caps) == 0 or N == 0:
+        zero = np.zeros((len(caps), N))
+        return (zero, zero.copy()) if return_soc else zero
+    soc0, energy0 = (None if x is None else np.asarray(x, dtype=float).ravel() for x in (soc0, energy0))
+    _, _, tot, end = _run_greedy(*_SWEEP[kind], imp, exp, np.repeat(caps, N), eta_c, eta_d, False,
+                                 soc0, energy0)
+    energy = 0.0 + tot.reshape(len(caps), N)
+    return (energy, end.reshape(len(caps), N)) if return_soc else energy
+
+# ---------------- own→community: krok 4a (lokální baterie) ----------------
+def _own_community_local_loop(imp, exp, cap, eta_c, eta_d, soc0, soc_out, own_out, sh_out):
+    T, N = imp.shape
+    eta_c_g = 1e-9 if 1e-9 > eta_c else eta_c
+    soc = soc0.copy()
+    ex = np.zeros(N)
+    im = np.zeros(N)
+    tmp = np.zeros(N)
+    for t in range(T):
+        # 1) charge z vlastních přetoků
+        for j in range(N):
+            e = exp[t, j]
+            room = cap[j] - soc[j]
+            room = room if room > 0.0 else 0.0
+            if room > 0 and e > 0:
+                lim = room / eta_c
+                e_in = lim if lim < e else e
+                soc[j] += e_in * eta_c
+                e -= e_in
+            ex[j] = e
+        # 2) discharge do vlastní spotřeby
+        for j in range(N):
+            i = imp[t, j]
+            d_own = 0.0
+            if i > 0 and soc[j] > 0:
+                deliverable = soc[j] * eta_d
+                d = deliverable if deliverable < i else i
+                d_own = d
+                soc[j] -= d / eta_d
+                i -= d
+            im[j] = i
+            own_out[t, j] = d_own
+            sh_out[t, j] = 0.0
+        # 3) charge ze společných přetoků (pool)
+        pool_exp = 0.0
+        for j in range(N):
+            pool_exp += ex[j]
+        if pool_exp > 1e-12:
+            total_room = 0.0
+            for j in range(N):
+                room = cap[j] - soc[j]
+                tmp[j] = (room if room > 0.0 else 0.0) / eta_c_g
+                total_room += tmp[j]
+            if total_room > 1e-12:
+                for j in range(N):
+                    share = pool_exp * (tmp[j] / total_room)
+                    e_in = tmp[j] if tmp[j] < share else share
+                    soc[j] += e_in * eta_c
+        # 4) discharge do komunity (pool importu)
+        pool_imp = 0.0
+        for j in range(N):
+            pool_imp += im[j]
+        if pool_imp > 1e-12:
+            total_deliv = 0.0
+            for j in range(N):
+                tmp[j] = soc[j] * eta_d
+                total_deliv += tmp[j]
+            if total_deliv > 1e-12:
+                for j in range(N):
+                    take = pool_imp * (tmp[j] / total_deliv)
+                    d = tmp[j] if tmp[j] < take else take
+                    sh_out[t, j] = d
+                    soc[j] -= d / eta_d
+        for j in range(N):
+            soc_out[t, j] = soc[j]
+
+def _own_community_local_np(imp, exp, cap, eta_c, eta_d, soc0, soc_out, own_out, sh_out):
+    eta_c_g = 1e-9 if 1e-9 > eta_c else eta_c
+    soc = soc0.copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for t in range(imp.shape[0]):
+            # 1) charge z vlastních přetoků
+            e = exp[t]
+            room = cap - soc
+            room = np.where(room > 0.0, room, 0.0)
+            m = (room > 0) & (e > 0)
+            lim = room / eta_c
+            e_in = np.where(lim < e, lim, e)
+            soc = np.where(m, soc + e_in * eta_c, soc)
+            e = np.where(m, e - e_in, e)
+            # 2) discharge do vlastní spotřeby
+            i = imp[t]
+            m = (i > 0) & (soc > 0)
+            deliverable = soc * eta_d
+            d = np.where(deliverable < i, deliverable, i)
+            own_out[t] = np.where(m, d, 0.0)
+            soc = np.where(m, soc - d / eta_d, soc)
+            i = np.where(m, i - d, i)
+            sh_out[t] = 0.0
+            # 3) charge ze společných přetoků (pool)
+            pool_exp = _seq_sum(e)
+            if pool_exp > 1e-12:
+                room = cap - soc
+                rooms = np.where(room > 0.0, room, 0.0) / eta_c_g
+                total_room = _seq_sum(rooms)
+                if total_room > 1e-12:
+                    share = pool_exp * (rooms / total_room)
+                    soc = soc + np.where(rooms < share, rooms, share) * eta_c
+            # 4) discharge do komunity (pool importu)
+            pool_imp = _seq_sum(i)
+            if pool_imp > 1e-12:
+                deliverable = soc * eta_d
+                total_deliv = _seq_sum(deliverable)
+                if total_deliv > 1e-12:
+                    take = pool_imp * (deliverable / total_deliv)
+                    d = np.where(deliverable < take, deliverable, take)
+                    sh_out[t] = d
+                    soc = soc - d / eta_d
+            soc_out[t] = soc
+
+def own_community_local(imp, exp, cap, *, eta_c: float = 0.95, eta_d: float = 0.95, soc0=None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lokální baterie own→community (krok 4a). Vrací (soc, own_discharge, shared_discharge).
+    soc0 = SoC na začátku (navázání na předchozí období, default prázdné baterie).
+    """
+    imp = _as_2d(imp); exp = _as_2d(exp); cap = _as_cap(cap, imp.shape[1])
+    soc = np.empty_like(imp); own = np.empty_like(imp); sh = np.empty_like(imp)
+    fn = _jit(_own_community_local_loop) if backend() == "numba" else _own_community_local_np
+    fn(imp, exp, cap, float(eta_c), float(eta_d), _init(soc0, imp.shape[1]), soc, own, sh)
+    return soc, own, sh
+
+# ---------------- own→community: krok 5a (centrální baterie) ----------------
+def _own_community_central_loop(imp_c, exp_c, imp_o, exp_o, cap, eta_c, eta_d, soc0, soc_out, own_out, sh_out):
+    soc = soc0
+    for t in range(len(imp_c)):
+        ic = imp_c[t]
+        ec = exp_c[t]
+        own_dis = 0.0
+        sh_dis = 0.0
+        # 1) charge z vlastní výroby (centrální site)
+        room = cap - soc
+        room = room if room > 0.0 else 0.0
+        if room > 0 and ec > 0:
+            lim = room / eta_c
+            e_in = lim if lim < ec else ec
+            soc += e_in * eta_c
+            ec -= e_in
+        # 2) discharge do vlastní spotřeby (centrální site)
+        if ic > 0 and soc > 0:
+            deliverable = soc * eta_d
+            d = deliverable if deliverable < ic else ic
+            own_dis = d
+            soc -= d / eta_d
+            ic -= d
+        # 3) charge z komunity (přebytek ostatních + zbytek vlastního přebytku)
+        pool_exp = exp_o[t] + ec
+        room = cap - soc
+        room = room if room > 0.0 else 0.0
+        if pool_exp > 1e-12 and room > 1e-12:
+            lim = room / eta_c
+            e_in = lim if lim < pool_exp else pool_exp
+            soc += e_in * eta_c
+        # 4) discharge do komunity (deficity ostatních)
+        pool_imp = imp_o[t]
+        if pool_imp > 1e-12 and soc > 1e-12:
+            deliverable = soc * eta_d
+            d = deliverable if deliverable < pool_imp else pool_imp
+            sh_dis = d
+            soc -= d / eta_d
+        soc_out[t] = soc
+        own_out[t] = own_dis
+        sh_out[t] = sh_dis
+
+def own_community_central(imp_c, exp_c, imp_o, exp_o, cap: float, *, eta_c: float = 0.95, eta_d: float = 0.95,
+                          soc0: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Centrální baterie own→community (krok 5a): *_c = centrální site, *_o = součet ostatních.
+    Jediná baterie → numpy backend jede skalární smyčku nad Python floaty. soc0 = SoC na začátku.
+    """
+    arrs = [np.ascontiguousarray(np.asarray(x, dtype=float).ravel()) for x in (imp_c, exp_c, imp_o, exp_o)]
+    n = arrs[0].shape[0]
+    soc = np.empty(n); own = np.empty(n); sh = np.empty(n)
+    if backend() == "numba":
+        _jit(_own_community_central_loop)(*arrs, float(cap), float(eta_c), float(eta_d), float(soc0), soc, own, sh)
+    else:
+        s, o, h = [0.0] * n, [0.0] * n, [0.0] * n
+        _own_community_central_loop(*[a.tolist() for a in arrs], float(cap), float(eta_c), float(eta_d), float(soc0), s, o, h)
+        soc[:], own[:], sh[:] = s, o, h
+    return soc, own, sh
+
+# ---------------- okna: paralelní simulace + sladění ----------------
+def window_bounds(times, window: str) -> list:
+    """
+    Hranice oken nad seřazenou časovou osou: 'year' | 'month' | počet hodin (např. '2160') |
+    'none'. Vrací indexy [0, …, T] (okno k = hodiny bounds[k]..bounds[k+1]-1).
+    """
+    t = np.asarray(times, dtype="datetime64[ns]")
+    n = len(t)
+    w = str(window or "none").strip().lower()
+    if w == "none" or n == 0:
+        return [0, n]
+    if w in ("year", "month"):
+        key = t.astype("datetime64[Y]" if w == "year" else "datetime64[M]")
+        cuts = (np.flatnonzero(key[1:] != key[:-1]) + 1).tolist()
+    else:
+        try:
+            step = int(w)
+        except ValueError:
+            raise ValueError(f"Neznámé okno '{window}' (povoleno: none, year, month, počet hodin)")
+        if step < 1:
+            raise ValueError("Okno v hodinách musí být kladné")
+        cuts = list(range(step, n, step))
+    return [0] + cuts + [n]
+
+def _close(a, b, tol: float) -> bool:
+    return bool(np.all(np.abs(np.asarray(a) - np.asarray(b)) <= tol))
+
+def run_windows(run: Callable, bounds, soc0, *, workers: int = 1, tol: float = 0.0, chunk: int = 168):
+    """
+    Dlouhý horizont po oknech: run(t0, t1, soc0) → (soc, *toky) pro hodiny t0..t1-1 (soc = stav
+    po každé hodině, první osa = hodiny). Postup:
+      1) všechna okna souběžně (vlákna – numba jádra uvolňují GIL), okno 0 od soc0, další od prázdné baterie;
+      2) sladění (warm start): okno k dostane skutečný konec okna k-1 a přepočítává se po `chunk`
+         hodinách, dokud se SoC neshoduje s odhadem z kroku 1 (do `tol` kWh) – od té chvíle je
+         zbytek okna stejný (baterie se mezitím vybila/nabila na mez). Default tol=0 → výsledek je
+         bitově stejný jako jeden průchod; obvykle stačí přepočítat první blok okna.
+    Vrací ((soc, *toky) přes celý horizont, počet přepočítaných hodin).
+    """
+    spans = [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    if not spans:
+        return run(0, 0, soc0), 0
+    start = np.asarray(soc0, dtype=float)
+    guesses = [start] + [np.zeros_like(start)] * (len(spans) - 1)
+    if workers > 1 and len(spans) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(min(workers, len(spans))) as ex:
+            parts = list(ex.map(lambda k: run(*spans[k], guesses[k]), range(len(spans))))
+    else:
+        parts = [run(a, b, g) for (a, b), g in zip(spans, guesses)]
+    outs = [np.concatenate([p[i] for p in parts]) for i in range(len(parts[0]))]
+
+    redone = 0
+    for (a, b), (_, b_prev) in zip(spans[1:], spans[:-1]):
+        s = outs[0][b_prev - 1]
+        if _close(s, np.zeros_like(s), tol):
+            continue  # okno začalo ze správného stavu
+        t = a
+        while t < b:
+            t1 = min(t + chunk, b)
+            fixed = run(t, t1, s)
+            s = fixed[0][-1]
+            converged = _close(s, outs[0][t1 - 1], tol)
+            for o, f in zip(outs, fixed):
+                o[t:t1] = f
+            redone += t1 - t
+            t = t1
+            if converged:
+                break
+    return tuple(outs), redone
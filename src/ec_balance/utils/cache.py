@@ -0,0 +1,223 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Obsahově adresovaná cache kroků pipeline.
+
+Klíč kroku = sha256 z: jména kroku, kódu balíčku ec_balance, efektivních parametrů
+(po sloučení config + CLI, bez CACHE_IGNORED_ARGS a --outdir) a obsahu vstupních souborů
+(parametr ukazující na existující soubor se nahradí hashem obsahu; + implicitní vstupy kroku).
+Při shodě se krok nespouští a jeho zaznamenané výstupy se obnoví z cache – relativně
+k --outdir, takže stejný výpočet v jiném adresáři (workspace) cache také využije.
+
+Zapnutí: ECB_CACHE_DIR=<adresář> (config `global.cache_dir`, CLI `ecb --cache-dir`).
+Velikost: ECB_CACHE_MAX_MB (default 2048) – nad limit se mažou nejdéle nepoužité záznamy (LRU).
+Cachují se jen výpočetní kroky (CACHEABLE); step4b-econ a step6 závisí na cenách a
+čtou celý adresář csv, takže běží vždy.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from . import profiling
+from .store import recording_writes, resolve, persisting
+from .ingest import expand_inputs, is_pattern
+
+CACHEABLE = ("step1", "step2", "step3", "step4", "step4a", "step5a", "step5")
+
+# parametry bez vlivu na výstupy kroku (ceny step3/step4 jen kvůli CLI kompatibilitě)
+_PRICES = ("price_commodity_mwh", "price_distribution_mwh", "price_feed_in_mwh")
+CACHE_IGNORED_ARGS: Dict[str, tuple] = {
+    "step1": ("chunksize", "workers"),
+    "step3": _PRICES,
+    "step4": _PRICES,
+    # okna se sladí na výsledek jednoho průchodu
+    "step4a": ("window", "workers"),
+    "step5a": ("window", "workers"),
+}
+
+def _input_files(spec: str) -> List[str]:
+    """
+    Soubory za globem / seznamem vstupů kroku 1. Samotná cesta (i existující s čárkou v názvu)
+    se hashuje už jako parametr; neúplný seznam klíč nedostane – krok sám skončí chybou.
+    """
+    if not spec or not is_pattern(spec):
+        return []
+    try:
+        return expand_inputs(spec)
+    except ValueError:
+        return []
+
+# vstupy, které krok čte, aniž by byly v parametrech
+IMPLICIT_INPUTS: Dict[str, Callable[[Dict[str, str]], List[str]]] = {
+    "step1": lambda a: _input_files(a.get("eano_wide", "")) + _input_files(a.get("eand_wide", "")),
+    "step2": lambda a: [a.get("site_map_csv") or str(Path(a.get("outdir", ".")) / "csv" / "site_map.csv")],
+}
+
+# prostředí, které mění podobu výstupů
+_ENV_IN_KEY = ("ECB_STORE_FORMAT", "ECB_STORE_CSV", "ECB_COMPACT")
+
+_MANIFEST = "manifest.json"
+
+def parse_argv(argv: List[str]) -> Dict[str, str]:
+    """`--k v` / `--k=v` / `--flag` → {k: v}; pozdější výskyt vyhrává (jako argparse)."""
+    out: Dict[str, str] = {}
+    i = 0
+    while i < len(argv):
+        tok = str(argv[i])
+        if tok.startswith("--"):
+            k, eq, v = tok[2:].partition("=")
+            if not eq:
+                nxt = argv[i + 1] if i + 1 < len(argv) else None
+                if nxt is not None and not str(nxt).startswith("--"):
+                    v, i = str(nxt), i + 1
+                else:
+                    v = "true"
+            out[k] = v
+        i += 1
+    return out
+
+def _file_digest(p: Path) -> str:
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+@lru_cache(maxsize=1)
+def _code_digest() -> str:
+    root = Path(__file__).resolve().parents[1]
+    h = hashlib.sha256()
+    for p in sorted(root.rglob("*.py")):
+        h.update(p.relative_to(root).as_posix().encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()
+
+def step_key(step: str, args: Dict[str, str]) -> str:
+    """Klíč nezávisí na umístění: vstupní soubory podle obsahu, výstupy relativně k --outdir."""
+    ignored = set(CACHE_IGNORED_ARGS.get(step, ())) | {"outdir"}
+    eff = {}
+    for k, v in sorted(args.items()):
+        if k in ignored:
+            continue
+        p = resolve(v) if v else None
+        eff[k] = "sha256:" + _file_digest(p) if p is not None and p.is_file() else v
+    implicit = []
+    for v in IMPLICIT_INPUTS.get(step, lambda a: [])(args):
+        p = resolve(v)
+        implicit.append(_file_digest(p) if p.is_file() else None)
+    payload = {
+        "step": step,
+        "code": _code_digest(),
+        "args": sorted(eff.items()),
+        "implicit": implicit,
+        "env": {k: os.getenv(k, "") for k in _ENV_IN_KEY},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+class StepCache:
+    def __init__(self, root: str | Path, *, max_mb: float = 2048.0):
+        self.root = Path(root)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+    @classmethod
+    def from_env(cls) -> Optional["StepCache"]:
+        root = os.getenv("ECB_CACHE_DIR", "").strip()
+        if not root:
+            return None
+        return cls(root, max_mb=float(os.getenv("ECB_CACHE_MAX_MB", "2048") or 2048))
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def restore(self, key: str, base: Path) -> Optional[List[Path]]:
+        entry = self._entry(key)
+        try:
+            meta = json.loads((entry / _MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not all((entry / o["file"]).is_file() for o in meta["outputs"]):
+            return None
+        restored = []
+        for o in meta["outputs"]:
+            dest = base / o["path"] if o.get("relative") else Path(o["path"])
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(entry / o["file"], dest)  # copy2 drží mtime (resolve() CSV vs Parquet)
+            restored.append(dest)
+        meta["last_used"] = time.time()
+        (entry / _MANIFEST).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        return restored
+
+    def put(self, key: str, step: str, outputs: List[Path], base: Path) -> None:
+        files = [Path(p) for p in outputs if Path(p).is_file()]
+        if not files:
+            return
+        entry = self._entry(key)
+        tmp = entry.with_name(entry.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        meta = {"step": step, "created": time.time(), "last_used": time.time(), "size": 0, "outputs": []}
+        for i, p in enumerate(files):
+            name = f"{i:03d}_{p.name}"
+            shutil.copy2(p, tmp / name)
+            meta["size"] += p.stat().st_size
+            try:
+                rel = {"path": p.resolve().relative_to(base).as_posix(), "relative": True}
+            except ValueError:
+                rel = {"path": str(p.resolve())}
+            meta["outputs"].append({"file": name, **rel})
+        (tmp / _MANIFEST).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        shutil.rmtree(entry, ignore_errors=True)
+        tmp.rename(entry)
+        self.evict()
+
+    def entries(self) -> List[dict]:
+        out = []
+        for m in self.root.glob(f"*/*/{_MANIFEST}"):
+            try:
+                meta = json.loads(m.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            meta["dir"] = m.parent
+            out.append(meta)
+        return out
+
+    def evict(self) -> int:
+        """LRU: mazat nejdéle nepoužité záznamy, dokud se cache nevejde do limitu."""
+        entries = sorted(self.entries(), key=lambda m: m.get("last_used", 0))
+        total = sum(m.get("size", 0) for m in entries)
+        removed = 0
+        while entries and total > self.max_bytes:
+            m = entries.pop(0)
+            shutil.rmtree(m["dir"], ignore_errors=True)
+            total -= m.get("size", 0)
+            removed += 1
+        return removed
+
+def run_cached(step: str, argv: List[str], call: Callable[[], object]):
+    """Spusť krok přes cache (je-li zapnutá a krok cachovatelný); jinak jen call()."""
+    cache = StepCache.from_env()
+    # inkrementální běh závisí na stavu v csv/incremental/ a připisuje → necachovat
+    if cache is None or step not in CACHEABLE or not persisting() or "--incremental" in argv:
+        return call()
+    args = parse_argv(argv)
+    base = Path(args.get("outdir", ".")).resolve()
+    key = step_key(step, args)
+    restored = cache.restore(key, base)
+    if restored is not None:
+        print(f"[OK] cache: {step} přeskočen, obnoveno {len(restored)} souborů (klíč {key[:12]})")
+        prof = profiling.active()
+        if prof is not None:
+            prof.cached = True
+        return None
+    with recording_writes() as written:
+        result = call()
+    cache.put(key, step, written, base)
+    return result
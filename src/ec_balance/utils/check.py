@@ -3,6 +3,7 @@ import sys
 import argparse
 from pathlib import Path
 import pandas as pd
+from .store import read_table, exists
 
 def _fail(msg: str) -> None:
     print(f"[X] {msg}")
@@ -12,10 +13,10 @@ def _ok(msg: str) -> None:
     print(f"[OK] {msg}")
 
 def _read_csv(path: Path) -> pd.DataFrame:
-    if not path.exists():
+    if not exists(path):
         _fail(f"Soubor neexistuje: {path}")
     try:
-        df = pd.read_csv(path)
+        df = read_table(path)
     except Exception as e:
         _fail(f"Nešlo číst CSV {path.name}: {e}")
     if "datetime" in df.columns:
@@ -49,6 +50,10 @@ def _check_after_step2(p: Path) -> None:
 def _check_after_step3(p: Path) -> None:
     _read_csv(p / "by_site_after.csv"); _ok("by_site_after.csv")
     df = _read_csv(p / "by_hour_after.csv"); _ensure_cols(df, ["datetime"], "by_hour_after.csv"); _ok("by_hour_after.csv")
+    if (p / "allocations.npz").exists() and not (p / "allocations.csv").exists():  # step3 --alloc_format sparse
+        from .alloc_store import AllocStore
+        AllocStore.load(p / "allocations.npz"); _ok("allocations.npz")
+        return
     df = _read_csv(p / "allocations.csv");   _ensure_cols(df, ["datetime"], "allocations.csv");   _ok("allocations.csv")
 
 def _check_after_batt(p: Path) -> None:
@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Kompaktní long tabulky (ECB_COMPACT, config `global.compact`, CLI `ecb --compact`).
+
+Long tabulky kroků 1–3 (ean_o_long, ean_d_long, eano_after_pv, eand_after_pv, local_selfcons)
+nesou site/ean jako řetězec na každém řádku. V kompaktním režimu jsou to category (kód
+int8/int16 na řádek + jednou seznam názvů), volitelně i hodnoty ve float32:
+  0        vypnuto (výchozí)
+  1        category – výsledky bitově shodné s výchozím režimem
+  float32  category + float32 hodnoty (zhruba poloviční paměť ještě jednou, odchylky ~1e-7 relativně)
+
+Kategorie jsou vždy lexikálně seřazené, takže sort_values, groupby i outer merge dávají stejné
+pořadí jako nad řetězci. Groupby přes category musí mít observed=True (jinak vzniká kartézský
+součin všech kategorií). Čas zůstává datetime64 – groupby ho stejně faktorizuje na celočíselné
+kódy a výstupy ho potřebují jako čas. Na disk (CSV/parquet) se píše stejně jako dřív.
+"""
+from __future__ import annotations
+import os
+from typing import Callable, Dict, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .store import CATEGORICAL_COLS
+
+MODES = ("0", "1", "float32")
+
+def compact_mode() -> str:
+    mode = os.getenv("ECB_COMPACT", "0").strip().lower() or "0"
+    mode = {"false": "0", "off": "0", "true": "1", "on": "1", "category": "1"}.get(mode, mode)
+    if mode not in MODES:
+        raise ValueError(f"ECB_COMPACT='{mode}' není podporován (povoleno: {MODES})")
+    return mode
+
+def compact_on() -> bool:
+    return compact_mode() != "0"
+
+def value_dtype() -> type:
+    return np.float32 if compact_mode() == "float32" else np.float64
+
+def as_category(s: pd.Series | Iterable, categories: Sequence | None = None) -> pd.Categorical:
+    """Category s lexikálně seřazenými kategoriemi (nebo danými `categories`, musí být seřazené)."""
+    if categories is None:
+        if isinstance(getattr(s, "dtype", None), pd.CategoricalDtype):
+            cats = s.cat.categories
+            if cats.is_monotonic_increasing:
+                return s.array
+            return pd.Categorical(s, categories=sorted(cats))
+        s = pd.Series(s, dtype=object) if not isinstance(s, pd.Series) else s
+        categories = sorted(s.dropna().unique())
+    return pd.Categorical(s, categories=categories)
+
+def recode(s: pd.Series, fn: Callable[[str], str] | Dict) -> pd.Categorical:
+    """Přejmenuj kategorie (funkcí nebo slovníkem, chybějící klíč = beze změny); shodné názvy se sloučí."""
+    s = pd.Series(as_category(s), index=s.index)
+    old = s.cat.categories
+    new = [fn.get(c, c) for c in old] if isinstance(fn, dict) else [fn(c) for c in old]
+    cats = sorted(set(new))
+    m = pd.Index(cats).get_indexer(new)
+    codes = s.cat.codes.to_numpy()
+    return pd.Categorical.from_codes(np.where(codes >= 0, m[codes], -1), categories=cats)
+
+def unify_categories(*frames: pd.DataFrame, col: str = "site") -> None:
+    """Sjednoť kategorie sloupce `col` ve všech tabulkách (merge přes category je jinak object)."""
+    cats = sorted(set().union(*(set(df[col].cat.categories) for df in frames)))
+    for df in frames:
+        df[col] = pd.Categorical(df[col], categories=cats)
+
+def compact_long(df: pd.DataFrame) -> pd.DataFrame:
+    """Long tabulka v kompaktním tvaru podle ECB_COMPACT (vypnuto = beze změny)."""
+    mode = compact_mode()
+    if mode == "0" or df is None:
+        return df
+    out = df.copy(deep=False)
+    for c in CATEGORICAL_COLS:
+        if c in out.columns:
+            out[c] = as_category(out[c])
+    if mode == "float32":
+        for c in out.columns:
+            if out[c].dtype == np.float64:
+                out[c] = out[c].astype(np.float32)
+    return out
+
+def long_from_wide(dt: pd.Series, names: Sequence[str], sites: Sequence[str], values: np.ndarray) -> pd.DataFrame:
+    """
+    Long [datetime, site, ean, value_kwh] z wide matice `values` (řádky × sloupce `names`) bez
+    melt: site/ean rovnou jako category kódy, pořadí řádků jako u melt (po sloupcích).
+    """
+    n, k = values.shape
+    ean = as_category(list(names))
+    site = as_category(list(sites))
+    col = np.repeat(np.arange(k), n)
+    return pd.DataFrame({
+        "datetime": np.tile(np.asarray(dt), k),
+        "site": pd.Categorical.from_codes(np.asarray(site.codes)[col], categories=site.categories),
+        "ean": pd.Categorical.from_codes(np.asarray(ean.codes)[col], categories=ean.categories),
+        "value_kwh": values.ravel(order="F").astype(value_dtype(), copy=False),
+    })
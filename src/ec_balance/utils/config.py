@@ -21,6 +21,31 @@ def load_yaml(path: str | None) -> dict:
         return {}
     return data
 
+# config klíče → proměnné prostředí (nepředávají se krokům jako --parametry)
+ENV_KEYS = {
+    "store_format": "ECB_STORE_FORMAT",
+    "store_csv_export": "ECB_STORE_CSV",
+    "cache_dir": "ECB_CACHE_DIR",
+    "cache_max_mb": "ECB_CACHE_MAX_MB",
+    "profile": "ECB_PROFILE",
+    "profile_funcs": "ECB_PROFILE_FUNCS",
+    "compact": "ECB_COMPACT",
+}
+
+def pop_env_keys(*sections: dict | None) -> dict[str, str]:
+    """Vyjmi ze sekcí configu klíče z ENV_KEYS; vrací {ENV: hodnota} (pozdější sekce přebíjí)."""
+    env: dict[str, str] = {}
+    for d in sections:
+        if not isinstance(d, dict):
+            continue
+        for k, var in ENV_KEYS.items():
+            if k in d:
+                v = d.pop(k)
+                if v is None:
+                    continue
+                env[var] = ("1" if v else "0") if isinstance(v, bool) else str(v)
+    return env
+
 def _flat_kv(d: dict | None) -> List[tuple[str, str]]:
     out: List[tuple[str, str]] = []
     if not isinstance(d, dict):
@@ -0,0 +1,214 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Dialekt wide CSV pro krok 1: oddělovač, desetinný a tisícový oddělovač, formát času.
+
+Zjistí se jednou ze vzorku (SAMPLE_ROWS řádků pod hlavičkou) a data se pak čtou s explicitním
+decimal=/thousands=/format= (C parser, volitelně pyarrow) – místo převodu každé buňky přes
+str.replace + to_numeric a odhadu formátu času. Dialekt se uloží do csv/wide_dialect.json pod
+otiskem hlavičkového řádku souboru, takže další ingest stejného zdroje (--incremental, nová
+dodávka) detekci přeskočí (--redetect ji vynutí). Uložený dialekt se nejdřív ověří na CHECK_ROWS
+řádcích nového souboru; když mu odporují (jiný desetinný oddělovač, hodnota neplatná při daném
+oddělovači tisíců, čas mimo formát), detekuje se znovu. Sloupce, které ani tak nejsou čísla (text
+v datech), a časy mimo zjištěný formát se převedou postaru po buňkách.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+from .store import _note_written, persisting
+
+SIDECAR = "wide_dialect.json"
+SAMPLE_ROWS = 500
+SAMPLE_VALUES = 20000  # max. hodnot pro detekci desetinného/tisícového oddělovače
+CHECK_ROWS = 50        # řádků pro ověření dialektu ze sidecaru
+ENGINES = ("c", "pyarrow")
+
+# kandidátní formáty času (první s nejvíc úspěšnými řádky vzorku vyhrává)
+DT_FORMATS = (
+    "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H.%M", "%d.%m.%Y",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d",
+    "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d-%m-%Y %H:%M", "%m/%d/%Y %H:%M",
+)
+_GROUP = " ., '"
+
+@dataclass(frozen=True)
+class Dialect:
+    sep: str = ","
+    decimal: str = "."
+    thousands: str = ""   # "" = bez oddělovače tisíců
+    dt_format: str = ""   # "" = odhad formátu (dayfirst)
+
+def header_key(path: str | Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.readline().strip()).hexdigest()[:16]
+
+def _votes(values: List[str]) -> tuple[int, int]:
+    """Počet hodnot, které vypadají jako desetinná čárka / desetinná tečka."""
+    comma = dot = 0
+    for v in values:
+        if re.fullmatch(r"[+-]?(\d{1,3}(?:[ . ']\d{3})+|\d*),\d+", v):
+            comma += 1
+        elif re.fullmatch(r"[+-]?(\d{1,3}(?:[ , ']\d{3})+|\d*)\.\d+", v):
+            dot += 1
+    return comma, dot
+
+def _num_sep(values: List[str]) -> tuple[str, str]:
+    """(decimal, thousands) z textových hodnot vzorku."""
+    comma, dot = _votes(values)
+    decimal = "," if comma > dot else "."
+    return decimal, _thousands(values, decimal)
+
+def _thousands(values: List[str], decimal: str) -> str:
+    """Oddělovač tisíců ze vzorku při daném desetinném ("" = žádný nebo nejednoznačný)."""
+    # bez desetinného oddělovače ve třídě – jinak skupina spolkne i 3místnou desetinnou část
+    group = re.escape(_GROUP.replace(decimal, ""))
+    groups = set()
+    for v in values:
+        m = re.fullmatch(rf"[+-]?\d{{1,3}}(?:([{group}])\d{{3}})+(?:{re.escape(decimal)}\d+)?", v)
+        if m:
+            groups.add(m.group(1))
+    return groups.pop() if len(groups) == 1 else ""
+
+def _dt_format(values: pd.Series) -> str:
+    best, hits = "", 0
+    for fmt in DT_FORMATS:
+        n = int(pd.to_datetime(values, format=fmt, errors="coerce").notna().sum())
+        if n > hits:
+            best, hits = fmt, n
+    return best
+
+def _values(s: pd.DataFrame, rows: pd.Series) -> List[str]:
+    vals = pd.unique(s.loc[rows.to_numpy(), s.columns[1:]].to_numpy().ravel())
+    return [v.strip() for v in vals[:SAMPLE_VALUES] if v.strip()]
+
+def detect(path: str | Path, sep: str) -> Dialect:
+    """Dialekt ze vzorku souboru (hlavička + SAMPLE_ROWS řádků, vše jako text)."""
+    s = pd.read_csv(path, sep=sep, nrows=SAMPLE_ROWS, dtype=str, keep_default_na=False)
+    if s.empty:
+        return Dialect(sep=sep)
+    fmt = _dt_format(s.iloc[:, 0].str.strip())
+    rows = pd.to_datetime(s.iloc[:, 0].str.strip(), format=fmt, errors="coerce").notna() if fmt else \
+        pd.to_datetime(s.iloc[:, 0], errors="coerce", dayfirst=True).notna()
+    decimal, thousands = _num_sep(_values(s, rows))
+    return Dialect(sep=sep, decimal=decimal, thousands=thousands, dt_format=fmt)
+
+def fits(path: str | Path, d: Dialect, nrows: int = CHECK_ROWS) -> bool:
+    """Odpovídá dialekt (ze sidecaru) prvním `nrows` řádkům souboru? Neprůkazný vzorek = ano."""
+    s = pd.read_csv(path, sep=d.sep, nrows=nrows, dtype=str, keep_default_na=False)
+    if s.empty:
+        return True
+    times = s.iloc[:, 0].str.strip()
+    rows = pd.to_datetime(times, errors="coerce", dayfirst=True, format="mixed").notna()
+    if d.dt_format:
+        ok = pd.to_datetime(times, format=d.dt_format, errors="coerce").notna()
+        if rows.any() and not ok.any():
+            return False
+        rows = rows | ok
+    vals = _values(s, rows)
+    comma, dot = _votes(vals)
+    if (comma > dot and d.decimal != ",") or (dot > comma and d.decimal != "."):
+        return False
+    if d.thousands:
+        grouped = rf"[+-]?\d{{1,3}}(?:{re.escape(d.thousands)}\d{{3}})+(?:{re.escape(d.decimal)}\d+)?"
+        if any(d.thousands in v and not re.fullmatch(grouped, v) for v in vals):
+            return False
+    seen = _thousands(vals, d.decimal)
+    return not seen or seen == d.thousands
+
+def resolve(path: str | Path, sep: str, csvdir: Optional[Path] = None, redetect: bool = False) -> Dialect:
+    """Dialekt ze sidecaru csv/wide_dialect.json (podle hlavičky souboru), jinak detekce a uložení."""
+    key = header_key(path)
+    side = Path(csvdir) / SIDECAR if csvdir is not None else None
+    known = {}
+    if side is not None and side.exists():
+        try:
+            known = json.loads(side.read_text(encoding="utf-8"))
+        except ValueError:
+            known = {}
+    if not redetect and key in known and known[key].get("sep") == sep:
+        d = Dialect(**{k: v for k, v in known[key].items() if k in Dialect.__dataclass_fields__})
+        if fits(path, d):
+            return d
+        print(f"[i] dialekt {Path(path).name}: uložený dialekt neodpovídá datům – detekuji znovu")
+    d = detect(path, sep)
+    print(f"[i] dialekt {Path(path).name}: sep '{d.sep}', decimal '{d.decimal}', "
+          f"tisíce '{d.thousands or '-'}', čas '{d.dt_format or 'odhad'}'")
+    if side is not None and persisting():
+        known[key] = asdict(d)
+        side.parent.mkdir(parents=True, exist_ok=True)
+        side.write_text(json.dumps(known, ensure_ascii=False, indent=1), encoding="utf-8")
+        _note_written(side)
+    return d
+
+def parse_times(s: pd.Series, d: Dialect) -> pd.Series:
+    """Časy podle dialektu; co formátu neodpovídá, zkusí ještě odhad (dayfirst) – jen ty řádky."""
+    if not d.dt_format:
+        return pd.to_datetime(s, errors="coerce", dayfirst=True)
+    txt = s.astype(str).str.strip()
+    out = pd.to_datetime(txt, format=d.dt_format, errors="coerce")
+    miss = out.isna() & s.notna() & txt.ne("")
+    if miss.any():
+        out[miss] = pd.to_datetime(txt[miss], errors="coerce", dayfirst=True)
+    return out
+
+def parse_numbers(s: pd.Series, d: Dialect) -> pd.Series:
+    """
+    Čísla sloupce, který parser nenačetl jako číselný (text v datech): po buňkách podle oddělovačů
+    dialektu, prázdné = 0. Bez zjištěného oddělovače tisíců platí druhý oddělovač vedle desetinného
+    za tisíce ("1,234.5"); samotná čárka je desetinná. Co ani tak není číslo, zůstane NaN a ohlásí se.
+    """
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s.astype(float).fillna(0.0)
+    txt = s.astype(str).str.strip()
+    if d.thousands:
+        txt = txt.str.replace(d.thousands, "", regex=False)
+    else:
+        other = "," if d.decimal == "." else "."
+        both = txt.str.contains(other, regex=False) & txt.str.contains(d.decimal, regex=False)
+        txt = txt.where(~both, txt.str.replace(other, "", regex=False))
+    out = pd.to_numeric(txt.str.replace(",", ".", regex=False), errors="coerce")
+    empty = s.isna() | txt.eq("")
+    bad = out.isna() & ~empty
+    if bad.any():
+        print(f"[WARN] {s.name}: {int(bad.sum())} hodnot není číslo (např. '{s[bad].iloc[0]}') – ponechány prázdné")
+    return out.mask(empty, 0.0)
+
+def _read_arrow(path: str | Path, d: Dialect, names: List[str], skip: int) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    tbl = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(skip_rows=skip, column_names=names),
+        parse_options=pacsv.ParseOptions(delimiter=d.sep),
+        convert_options=pacsv.ConvertOptions(decimal_point=d.decimal, column_types={names[0]: pa.string()},
+                                             strings_can_be_null=True),
+    )
+    return tbl.to_pandas()
+
+def read_body(path: str | Path, d: Dialect, names: List[str], skip: int, *, engine: str = "c",
+              chunksize: Optional[int] = None):
+    """
+    Datová část wide souboru (bez `skip` úvodních řádků) se sloupci `names`: hodnoty rovnou jako
+    float (decimal/thousands z dialektu), 1. sloupec jako text. engine='pyarrow' jen bez tisícového
+    oddělovače a bez --chunksize; při chybě převodu se vrátí k C parseru.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Neznámý CSV engine: {engine} (očekávám {', '.join(ENGINES)})")
+    if engine == "pyarrow" and not d.thousands and chunksize is None:
+        try:
+            return _read_arrow(path, d, names, skip)
+        except ImportError:
+            raise SystemExit("--csv_engine pyarrow vyžaduje pyarrow (pip install ec-balance[parquet])")
+        except Exception as e:  # pyarrow.ArrowInvalid: text v číselném sloupci apod.
+            print(f"[i] pyarrow: {str(e).splitlines()[0]} – čtu C parserem")
+    return pd.read_csv(path, sep=d.sep, skiprows=skip, header=None, names=names, decimal=d.decimal,
+                       thousands=d.thousands or None, dtype={names[0]: str}, chunksize=chunksize)
@@ -0,0 +1,217 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Optimální sdílení v hodině (step3 --mode optimal): maximum sdílené energie při limitu
+příjemců na zdroj (a volitelně bez self-pair).
+
+Hodina = transportní úloha: zdroj i pošle ≤ e_i, příjemce j přijme ≤ d_j, zdroj má nejvýš
+K příjemců. Bez limitu K je to max-flow s horní mezí v uzavřeném tvaru (upper_bound);
+s limitem jde o smíšeně celočíselnou úlohu. Postup na hodinu (solve_hour):
+  1) nosič (dvojice zdroj→příjemce) z „plnění“ – zdroje od největšího zbytku, příjemci od
+     největší zbylé poptávky, každému co nejvíc; druhý start = nosič předchozí hodiny (warm start);
+  2) na nosiči přesný max-flow (augmentační cesty), volné sloty zdrojů znovu plněním – dokud
+     se nosič mění;
+  3) dosáhne-li tok horní meze, je optimální; jinak lokální hledání (výměna hrany) a MILP
+     (scipy.optimize.milp / HiGHS, volitelné, `pip install ec-balance[optimal]`) v limitu zbytku rozpočtu hodiny.
+Volající (step3) hodinu porovná s greedy a horší výsledek (vyčerpaný rozpočet) nahradí greedy.
+"""
+from __future__ import annotations
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+try:
+    from scipy.optimize import milp as _milp, LinearConstraint, Bounds  # type: ignore
+    from scipy.sparse import coo_array  # type: ignore
+except Exception:
+    _milp = None
+
+EPS = 1e-12
+Flow = Dict[Tuple[int, int], float]
+
+def has_milp() -> bool:
+    return _milp is not None
+
+def upper_bound(e: np.ndarray, d: np.ndarray, exclude_self: bool) -> float:
+    """Max-flow bez limitu příjemců: min(ΣE, ΣI) a bez self-pair i min_k(ΣE − e_k + ΣI − d_k)."""
+    te, td = float(e.sum()), float(d.sum())
+    ub = min(te, td)
+    if exclude_self and len(e):
+        ub = min(ub, float((te - e + td - d).min()))
+    return max(ub, 0.0)
+
+def _augment(flow: Flow, e_rem: list, d_rem: list) -> None:
+    """Max-flow na nosiči `flow` (klíče = hrany) z daného přípustného toku – augmentační cesty (BFS)."""
+    out, inn = defaultdict(list), defaultdict(list)
+    for i, j in flow:
+        out[i].append(j)
+        inn[j].append(i)
+    while True:
+        starts = [i for i in out if e_rem[i] > EPS]
+        prev_j: Dict[int, int] = {}         # příjemce → zdroj, odkud jsme přišli (dopředu)
+        prev_i: Dict[int, Optional[int]] = {i: None for i in starts}  # zdroj → příjemce (zpět), None = start
+        queue, end = list(starts), None
+        while queue and end is None:
+            nxt = []
+            for i in queue:
+                for j in out[i]:
+                    if j in prev_j:
+                        continue
+                    prev_j[j] = i
+                    if d_rem[j] > EPS:
+                        end = j
+                        break
+                    for i2 in inn[j]:
+                        if i2 not in prev_i and flow[(i2, j)] > EPS:
+                            prev_i[i2] = j
+                            nxt.append(i2)
+                if end is not None:
+                    break
+            queue = nxt
+        if end is None:
+            return
+        # úzké hrdlo: zbytek příjemce, toky zpětných hran, zbytek startovního zdroje
+        path, j = [], end
+        while True:
+            i = prev_j[j]
+            path.append((i, j))
+            jb = prev_i[i]
+            if jb is None:
+                break
+            path.append((i, jb))  # zpětná hrana (i → jb se zmenší)
+            j = jb
+        delta = min(d_rem[end], e_rem[path[-1][0]])
+        for k, (i, j) in enumerate(path):
+            if k % 2:
+                delta = min(delta, flow[(i, j)])
+        if delta <= EPS:
+            return
+        for k, (i, j) in enumerate(path):
+            flow[(i, j)] += -delta if k % 2 else delta
+        d_rem[end] -= delta
+        e_rem[path[-1][0]] -= delta
+
+def _fill(flow: Flow, e_rem: list, d_rem: list, k: int, exclude_self: bool) -> bool:
+    """Volné sloty zdrojů doplň plněním (největší zdroj → největší zbylá poptávka); True = nosič se změnil."""
+    deg = defaultdict(int)
+    for i, _ in flow:
+        deg[i] += 1
+    changed = False
+    d = np.asarray(d_rem)
+    for i in sorted(range(len(e_rem)), key=lambda x: -e_rem[x]):
+        if e_rem[i] <= EPS:
+            break
+        while deg[i] < k and e_rem[i] > EPS:
+            cand = d.copy()
+            if exclude_self:
+                cand[i] = 0.0
+            for (i2, j2) in flow:
+                if i2 == i:
+                    cand[j2] = 0.0
+            j = int(np.argmax(cand))
+            if cand[j] <= EPS:
+                break
+            x = min(e_rem[i], d_rem[j])
+            flow[(i, j)] = x
+            e_rem[i] -= x; d_rem[j] -= x; d[j] = d_rem[j]
+            deg[i] += 1
+            changed = True
+    return changed
+
+def _improve(e: np.ndarray, d: np.ndarray, k: int, exclude_self: bool, start: Iterable = ()) -> Flow:
+    flow: Flow = {}
+    e_rem, d_rem = e.tolist(), d.tolist()
+    deg = defaultdict(int)
+    for i, j in start:  # nosič předchozí hodiny – jen hrany, které teď dávají smysl
+        if e[i] > EPS and d[j] > EPS and deg[i] < k and not (exclude_self and i == j):
+            flow[(i, j)] = 0.0
+            deg[i] += 1
+    while True:
+        _augment(flow, e_rem, d_rem)
+        if not _fill(flow, e_rem, d_rem, k, exclude_self):
+            break
+    return {p: x for p, x in flow.items() if x > EPS}
+
+def _swap_search(e: np.ndarray, d: np.ndarray, k: int, exclude_self: bool, flow: Flow,
+                 deadline: float, tol: float, ub: float) -> Flow:
+    """Lokální hledání: výměna jedné hrany za hranu k nenasycenému příjemci, přijmout při zlepšení."""
+    best, val = flow, sum(flow.values())
+    improved = True
+    while improved and val < ub - tol and time.perf_counter() < deadline:
+        improved = False
+        rec = defaultdict(float)
+        for (_, j), x in best.items():
+            rec[j] += x
+        open_j = [j for j in range(len(d)) if d[j] - rec[j] > EPS]
+        for (i, j) in list(best):
+            for j2 in open_j:
+                if j2 == j or (exclude_self and j2 == i) or (i, j2) in best:
+                    continue
+                cand = _improve(e, d, k, exclude_self, [p for p in best if p != (i, j)] + [(i, j2)])
+                v = sum(cand.values())
+                if v > val + tol:
+                    best, val, improved = cand, v, True
+                    break
+            if improved or time.perf_counter() >= deadline:
+                break
+    return best
+
+def _solve_milp(e: np.ndarray, d: np.ndarray, k: int, exclude_self: bool, time_limit: float) -> Optional[Flow]:
+    src, dst = np.flatnonzero(e > EPS), np.flatnonzero(d > EPS)
+    pairs = [(i, j) for i in src for j in dst if not (exclude_self and i == j)]
+    m = len(pairs)
+    if m == 0:
+        return {}
+    pi = np.array([p[0] for p in pairs]); pj = np.array([p[1] for p in pairs])
+    ar = np.arange(m)
+    si = {v: n for n, v in enumerate(src)}; sj = {v: n for n, v in enumerate(dst)}
+    ri = np.array([si[i] for i in pi]); rj = np.array([sj[j] for j in pj])
+    ns, nd = len(src), len(dst)
+    # proměnné: x (toky) | y (hrana použita); řádky: zdroje, příjemci, x − M·y ≤ 0, Σy ≤ K
+    rows = np.r_[ri, ns + rj, ns + nd + ar, ns + nd + ar, ns + nd + m + ri]
+    cols = np.r_[ar, ar, ar, m + ar, m + ar]
+    vals = np.r_[np.ones(m), np.ones(m), np.ones(m), -np.minimum(e[pi], d[pj]), np.ones(m)]
+    A = coo_array((vals, (rows, cols)), shape=(ns + nd + m + ns, 2 * m))
+    ub = np.r_[e[src], d[dst], np.zeros(m), np.full(ns, float(k))]
+    res = _milp(np.r_[-np.ones(m), np.zeros(m)], integrality=np.r_[np.zeros(m), np.ones(m)],
+                bounds=Bounds(0, np.r_[np.minimum(e[pi], d[pj]), np.ones(m)]),
+                constraints=LinearConstraint(A, -np.inf, ub), options={"time_limit": max(time_limit, 1e-3)})
+    if res.x is None:
+        return None
+    x, y = res.x[:m], res.x[m:]
+    keep = (x > EPS) & (y > 0.5)
+    return {pairs[n]: float(x[n]) for n in np.flatnonzero(keep)}
+
+def solve_hour(e: np.ndarray, d: np.ndarray, k: int, *, exclude_self: bool = True,
+               warm: Iterable = (), budget_s: float = 0.05) -> Tuple[Flow, str]:
+    """
+    Nejlepší nalezený tok jedné hodiny a jak byl nalezen: 'bound' (dosažena horní mez =
+    optimum), 'milp' (HiGHS, optimum nebo nejlepší v limitu) nebo 'heuristic' (rozpočet/bez scipy).
+    Rozpočet budget_s počítá od začátku hodiny: první nosič doběhne vždy, warm start, lokální
+    hledání a MILP jen dokud rozpočet nevyčerpá.
+    """
+    t0 = time.perf_counter()
+    ub = upper_bound(e, d, exclude_self)
+    tol = 1e-9 * max(1.0, ub)
+    best: Flow = {}
+    for n, start in enumerate(((), warm) if warm else ((),)):
+        if n and time.perf_counter() >= t0 + budget_s:
+            break
+        flow = _improve(e, d, k, exclude_self, start)
+        if sum(flow.values()) > sum(best.values()):
+            best = flow
+        if sum(best.values()) >= ub - tol:
+            return best, "bound"
+    best = _swap_search(e, d, k, exclude_self, best, t0 + budget_s, tol, ub)
+    if sum(best.values()) >= ub - tol:
+        return best, "bound"
+    left = budget_s - (time.perf_counter() - t0)
+    if has_milp() and left > 0:
+        sol = _solve_milp(e, d, k, exclude_self, left)
+        if sol is not None and sum(sol.values()) > sum(best.values()) + tol:
+            return sol, "milp"
+    return best, "heuristic"
@@ -0,0 +1,95 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Inkrementální zpracování nových období (`--incremental` u kroků 1–5a, `run-all --incremental`).
+
+Krok 1 načte nová wide data (řádky do vodoznaku = posledního už načteného času zahodí),
+připíše je k long tabulkám (store.append_table) a novou část zapíše i do csv/incremental/.
+Navazující kroky pak místo celé historie čtou jen tuto deltu svého vstupu, výsledky připíší
+a zapíší vlastní deltu pro další krok. Párování, sdílení i by-hour baterie jsou po hodinách
+nezávislé až na SoC baterií – bateriové kroky navazují na svůj koncový stav (csv/*_state:
+SoC a kumulativní výboj) místo soc = 0. Reporty (step4b-econ, step6) běží nad celými tabulkami.
+
+Stav: csv/incremental/<krok>.json
+  batch      poslední zpracovaná dávka (krok 1 ji zvyšuje při každém běhu, ostatní přebírají)
+  delta      dávka, ke které patří delty kroku v csv/incremental/ (None = plný běh, delty neplatí)
+  watermark  poslední načtený čas (jen krok 1)
+Plný běh kroku stav také zapíše, takže inkrementální běh může navázat i na plný přepočet.
+"""
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .store import _note_written, exists, persisting, read_table, write_table
+
+INC_DIR = "incremental"
+
+def delta_path(path: str | Path) -> Path:
+    """Cesta k deltě tabulky: csv/<jméno> → csv/incremental/<jméno>."""
+    p = Path(path)
+    return p.parent / INC_DIR / p.name
+
+def read_delta(path: str | Path, **kwargs) -> pd.DataFrame:
+    return read_table(delta_path(path), **kwargs)
+
+def write_delta(df: pd.DataFrame, csvdir: str | Path, name: str) -> Path:
+    return write_table(df, Path(csvdir) / INC_DIR / f"{name}.csv")
+
+def _state_path(csvdir: str | Path, step: str) -> Path:
+    return Path(csvdir) / INC_DIR / f"{step}.json"
+
+def load_state(csvdir: str | Path, step: str) -> dict:
+    try:
+        return json.loads(_state_path(csvdir, step).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def save_state(csvdir: str | Path, step: str, **state) -> Optional[Path]:
+    """Zapiš stav kroku (nic při `run-all --no-persist`); soubor jde i do cache kroku."""
+    if not persisting():
+        return None
+    p = _state_path(csvdir, step)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(json.dumps(state, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+    _note_written(p)
+    return p
+
+def read_battery_state(path: str | Path | None) -> Optional[pd.DataFrame]:
+    """
+    Koncový stav baterií (*_state: SoC, kumulativní výboj) jako počáteční stav dalšího běhu;
+    None = soubor není. Floaty se čtou přesně (round_trip), navázání je pak bitově stejné.
+    """
+    if not path or not exists(path):
+        return None
+    return read_table(path, parse_dates=["datetime"], float_precision="round_trip")
+
+def init_state_for(args, own_state: str | Path) -> Optional[pd.DataFrame]:
+    """Počáteční stav bateriového kroku: --init_state_csv, u --incremental vlastní *_state, jinak None."""
+    if args.init_state_csv:
+        state = read_battery_state(args.init_state_csv)
+        if state is None:
+            raise SystemExit(f"--init_state_csv {args.init_state_csv} neexistuje")
+        return state
+    return read_battery_state(own_state) if args.incremental else None
+
+def producer_batch(csvdir: str | Path, producer: str) -> int:
+    return int(load_state(csvdir, producer).get("batch", 0))
+
+def next_batch(csvdir: str | Path, step: str, producer: str) -> Optional[int]:
+    """Dávka z delt kroku `producer`, kterou má `step` zpracovat; None = nic nového."""
+    b = load_state(csvdir, producer).get("delta")
+    if b is None:
+        raise SystemExit(f"{step} --incremental: chybí delta kroku {producer} – spusť nejdřív {producer} --incremental")
+    done = int(load_state(csvdir, step).get("batch", 0))
+    if b <= done:
+        print(f"[i] {step}: dávka {b} už je zpracovaná – nic nového")
+        return None
+    if b != done + 1:
+        raise SystemExit(f"{step} --incremental: vynechané dávky {done + 1}..{b - 1} "
+                         f"(zpracováno {done}, delta {producer} = {b}) – přepočti krok bez --incremental")
+    return int(b)
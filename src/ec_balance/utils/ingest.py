@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Krok 1 z více dodávek (měsíční exporty po distributorech, dávky z datacenter).
+
+--eano_wide/--eand_wide přijmou cestu, glob (data/2024-*_O.csv) i seznam oddělený čárkou
+(z configu i YAML seznam); existující soubor s čárkou či [ v názvu se bere doslova. Pořadí dodávek = pořadí v seznamu, glob uvnitř seřazený podle názvu.
+V překryvu platí poslední dodávka (latest_wins) – po (datetime, ean), takže EAN, který pozdější
+soubor nemá, zůstane z dřívější. Hlavičky site/kWp se sjednotí stejně (merge_headers).
+"""
+from __future__ import annotations
+import glob
+import os
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+GLOB_CHARS = "*?["
+
+def is_pattern(spec: str) -> bool:
+    spec = str(spec)
+    if os.path.exists(spec):
+        return False
+    return "," in spec or any(ch in spec for ch in GLOB_CHARS)
+
+def expand_inputs(spec: str) -> List[str]:
+    """
+    Seznam souborů z cesty / globu / seznamu odděleného čárkou. Existující cesta se bere celá
+    (i s čárkou v názvu); ValueError, když vzor nic nenajde nebo soubor ze seznamu neexistuje.
+    """
+    if os.path.exists(str(spec)):
+        return [str(spec)]
+    out: List[str] = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if any(ch in part for ch in GLOB_CHARS):
+            hits = sorted(glob.glob(part, recursive=True))
+            if not hits:
+                raise ValueError(f"vzor '{part}' neodpovídá žádnému souboru")
+            out.extend(hits)
+        elif not os.path.exists(part):
+            raise ValueError(f"soubor '{part}' neexistuje")
+        else:
+            out.append(part)
+    if not out:
+        raise ValueError(f"prázdný seznam vstupů: '{spec}'")
+    return out
+
+def merge_headers(maps: Sequence[Dict]) -> Tuple[Dict, List]:
+    """Sjednocení ean → site/kWp z hlaviček souborů (pozdější vyhrává); vrací (mapa, EAN s rozporem)."""
+    merged: Dict = {}
+    conflicts = set()
+    for m in maps:
+        for k, v in m.items():
+            if k in merged and merged[k] != v and not (pd.isna(merged[k]) and pd.isna(v)):
+                conflicts.add(k)
+            merged[k] = v
+    return merged, sorted(conflicts)
+
+def latest_wins(frames: Sequence[pd.DataFrame], keys=("datetime", "ean")) -> Tuple[pd.DataFrame, int]:
+    """
+    Long tabulky dodávek v pořadí → jedna tabulka; u klíče z více dodávek zůstanou jen řádky
+    poslední z nich (duplicity uvnitř jedné dodávky se nemění). Vrací (tabulka, zahozené řádky).
+    """
+    if len(frames) == 1:
+        return frames[0], 0
+    src = np.repeat(np.arange(len(frames)), [len(f) for f in frames])
+    df = pd.concat(frames, ignore_index=True)
+    last = pd.Series(src).groupby([df[k] for k in keys], observed=True, sort=False).transform("max").to_numpy()
+    keep = src == last
+    return df[keep].reset_index(drop=True), int((~keep).sum())
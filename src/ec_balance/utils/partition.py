@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Dělené zpracování dlouhých řad po kalendářních oddílech (`run-all --partition year|month`).
+
+Párování (krok 2) i sdílení (krok 3) jsou po hodinách nezávislé, takže long data z kroku 1
+se rozdělí po roce/měsíci do <outdir>/partitions/<oddíl>/csv/, každý oddíl projde kroky 2–3
+ve vlastním procesu (ProcessPoolExecutor) a výsledky se sloučí zpět do <outdir>/csv/
+(časové tabulky za sebou, by_site_after součtem po site). Bateriové kroky 4a/5a pak běží
+nad sloučenými daty po stejných oknech souběžně se sladěním SoC na hranicích
+(battery_kernel.run_windows) – stav baterie tak přechází z oddílu do oddílu.
+"""
+from __future__ import annotations
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import pandas as pd
+
+from .alloc_store import AllocStore, write_alloc_store
+from .artifacts import ArtifactRegistry, use_registry
+from .store import exists, read_table, write_table
+
+PARTITIONS = ("none", "year", "month")
+PART_DIR = "partitions"
+PARTITION_STEPS = ("step2", "step3")
+
+# vstupy oddílu: long data se dělí, mapy se kopírují celé
+_SPLIT = ("ean_o_long", "ean_d_long")
+_COPY = ("site_map", "kwp_by_site", "time_grid")
+# výstupy kroků 2–3: časové tabulky za sebou, souhrn po site součtem
+_CONCAT = ("eano_after_pv", "eand_after_pv", "local_selfcons", "by_hour_after", "allocations", "imp_wide", "exp_wide")
+_SUM_BY_SITE = ("by_site_after",)
+
+def partition_keys(dt: pd.Series, by: str) -> pd.Series:
+    """Klíč oddílu pro každý řádek: '2024' (year) nebo '2024-03' (month)."""
+    if by not in ("year", "month"):
+        raise ValueError(f"Neznámé dělení '{by}' (povoleno: {PARTITIONS})")
+    dt = pd.to_datetime(dt, errors="coerce")
+    return dt.dt.strftime("%Y" if by == "year" else "%Y-%m")
+
+def workers_count(workers: int) -> int:
+    return workers if workers and workers > 0 else (os.cpu_count() or 1)
+
+def split_long(csvdir: Path, by: str) -> List[Path]:
+    """Rozděl long data kroku 1 do partitions/<oddíl>/csv/; vrací seřazené kořeny oddílů."""
+    tables = {name: read_table(csvdir / f"{name}.csv", parse_dates=["datetime"], float_precision="round_trip")
+              for name in _SPLIT}
+    keys = sorted(set().union(*(set(partition_keys(df["datetime"], by).dropna()) for df in tables.values())))
+    root = csvdir.parent / PART_DIR
+    shutil.rmtree(root, ignore_errors=True)
+    roots = [root / k for k in keys]
+    # oddíly jen na disk – do registru run-all patří až sloučené výsledky
+    with use_registry(ArtifactRegistry(persist=True)):
+        for name, df in tables.items():
+            for k, part in df.groupby(partition_keys(df["datetime"], by), sort=True):
+                write_table(part, root / k / "csv" / f"{name}.csv")
+        for name in _COPY:
+            if exists(csvdir / f"{name}.csv"):
+                m = read_table(csvdir / f"{name}.csv")
+                for r in roots:
+                    write_table(m, r / "csv" / f"{name}.csv")
+    return roots
+
+def run_partitions(fn: Callable[[Path], object], roots: Sequence[Path], *, workers: int = 0) -> None:
+    """fn(kořen oddílu) pro všechny oddíly v procesech (workers=0 → počet CPU, 1 → postupně)."""
+    n = min(workers_count(workers), len(roots))
+    if n <= 1:
+        for r in roots:
+            fn(r)
+        return
+    with ProcessPoolExecutor(n) as ex:
+        list(ex.map(fn, roots))
+
+def _alloc_parts(roots: Sequence[Path]):
+    parts = [r / "csv" / "allocations.npz" for r in roots]
+    if not all(p.exists() for p in parts):
+        return None
+    store = AllocStore.load(parts[0])
+    for p in parts[1:]:
+        store = store.extend(AllocStore.load(p))
+    return store
+
+def merge_partitions(roots: Sequence[Path], csvdir: Path) -> Dict[str, int]:
+    """Slouč výstupy kroků 2–3 z oddílů do csvdir; vrací {tabulka: řádků}."""
+    merged: Dict[str, int] = {}
+    for name in _CONCAT + _SUM_BY_SITE:
+        paths = [r / "csv" / f"{name}.csv" for r in roots]
+        if not all(exists(p) for p in paths):
+            continue
+        dates = [] if name in _SUM_BY_SITE else ["datetime"]  # v registru typovaně jako výstupy kroků
+        parts = [read_table(p, parse_dates=dates, float_precision="round_trip") for p in paths]  # bitově jako celý běh
+        if name in _SUM_BY_SITE:
+            df = pd.concat(parts, ignore_index=True).groupby("site", as_index=False).sum()
+        else:
+            df = pd.concat(parts, ignore_index=True)
+            if name in ("imp_wide", "exp_wide"):  # site bez dat v oddílu = 0, sloupce jako u celého běhu
+                df = df.fillna(0.0)[["datetime"] + sorted(c for c in df.columns if c != "datetime")]
+        write_table(df, csvdir / f"{name}.csv")
+        merged[name] = len(df)
+    store = _alloc_parts(roots)
+    if store is not None:
+        write_alloc_store(store.to_frame(), csvdir / "allocations.npz")
+        merged["allocations.npz"] = len(store)
+    return merged
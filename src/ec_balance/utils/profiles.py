@@ -0,0 +1,70 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Typické profily hodinové řady v jednom průchodu (bez smyček přes měsíce):
+
+  day    – průměr podle (měsíc, hodina)              sloupce: month, hour, <cols>
+  week   – průměr podle (měsíc, hodina týdne 0–167)  sloupce: month, hweek, <cols>
+  month  – součet podle měsíce                       sloupce: month, <cols>
+
+Vše se spočítá z jednoho np.bincount přes klíč (měsíc, hodina týdne): součty a počty
+ne-NaN hodnot; den a měsíc jsou jen jejich další součty. Měsíc = měsíc v roce (víceleté
+řady se slučují), v tabulkách jsou jen měsíce/hodiny, které v datech jsou.
+Používá step6 (_profiles), step5_excel_econ a služba (/api/profiles).
+"""
+from __future__ import annotations
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_SKIP = ("datetime", "month", "hour", "hweek", "dow", "doy")
+
+def typical_profiles(df: pd.DataFrame | None, cols: Optional[Sequence[str]] = None, *,
+                     floor: Optional[str] = None) -> Tuple[Optional[pd.DataFrame], ...]:
+    """(day, week, month) pro sloupce `cols` (default všechny číselné); `floor` = zaokrouhlení času."""
+    if df is None or df.empty:
+        return None, None, None
+    if cols is None:
+        cols = [c for c in df.columns if c not in _SKIP and pd.api.types.is_numeric_dtype(df[c])]
+    cols = list(cols)
+    dt = pd.to_datetime(df["datetime"])
+    if floor:
+        dt = dt.dt.floor(floor)
+    ok = dt.notna().to_numpy()
+    dt = dt[ok]
+    month = dt.dt.month.to_numpy(np.int64)
+    hweek = (dt.dt.dayofweek * 24 + dt.dt.hour).to_numpy(np.int64)
+    key = (month - 1) * 168 + hweek
+
+    vals = df.loc[ok, cols].apply(pd.to_numeric, errors="coerce").to_numpy(float)
+    valid = ~np.isnan(vals)
+    vals = np.where(valid, vals, 0.0)
+    n = 12 * 168
+    rows = np.bincount(key, minlength=n).reshape(12, 7, 24)
+    sums, cnts = np.zeros((n, len(cols))), np.zeros((n, len(cols)))
+    for j in range(len(cols)):
+        sums[:, j] = np.bincount(key, weights=vals[:, j], minlength=n)
+        cnts[:, j] = np.bincount(key, weights=valid[:, j], minlength=n)
+    sums, cnts = sums.reshape(12, 7, 24, -1), cnts.reshape(12, 7, 24, -1)
+
+    def _frame(keys: dict, values: np.ndarray) -> pd.DataFrame:
+        out = pd.DataFrame({k: v.astype(np.int32) for k, v in keys.items()})
+        for j, c in enumerate(cols):
+            out[c] = values[:, j]
+        return out
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # týden: (měsíc, dow, hodina) → hweek
+        m_i, d_i, h_i = np.nonzero(rows)
+        week = _frame({"month": m_i + 1, "hweek": d_i * 24 + h_i},
+                      sums[m_i, d_i, h_i] / cnts[m_i, d_i, h_i])
+        # den: součet přes dny v týdnu
+        rows_d, sums_d, cnts_d = rows.sum(axis=1), sums.sum(axis=1), cnts.sum(axis=1)
+        m_i, h_i = np.nonzero(rows_d)
+        day = _frame({"month": m_i + 1, "hour": h_i}, sums_d[m_i, h_i] / cnts_d[m_i, h_i])
+    m_i = np.nonzero(rows_d.sum(axis=1))[0]
+    month_tab = _frame({"month": m_i + 1}, sums.sum(axis=(1, 2))[m_i])
+    return day, week, month_tab
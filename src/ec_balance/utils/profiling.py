@@ -0,0 +1,214 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Profilování kroků: fáze load / compute / write, paměť a cProfile hot funkcí.
+
+Zapnutí: ECB_PROFILE=1 (config `global.profile: true`, CLI `ecb --profile`).
+  - fáze: utils.store měří čtení (load) a zápis (write) tabulek, zbytek je compute;
+  - paměť: RSS vzorkované na pozadí, špička celkem i po fázích;
+  - @profiled funkce (share_pool_degree_limited, local_pairing, _write_dashboard_finance, …):
+    počet volání a čas; s ECB_PROFILE_FUNCS=a,b (nebo `all`) navíc cProfile → <outdir>/profile/*.prof.
+Výsledek kroku se připíše do <outdir>/profile.json (klíč = název kroku).
+"""
+from __future__ import annotations
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROFILE_FILE = "profile.json"
+PHASES = ("load", "compute", "write")
+
+def enabled() -> bool:
+    return os.getenv("ECB_PROFILE", "0").strip().lower() not in ("", "0", "false", "no")
+
+def _cprofile_funcs() -> set:
+    return {f.strip() for f in os.getenv("ECB_PROFILE_FUNCS", "").split(",") if f.strip()}
+
+def rss_mb() -> Optional[float]:
+    """Aktuální RSS procesu v MB (psutil, jinak /proc; jinde None)."""
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().rss / 2**20
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except Exception:
+        return None
+
+class PeakSampler(threading.Thread):
+    """Vzorkuje RSS na pozadí; špička celkem i podle aktuálního štítku (`label`)."""
+    def __init__(self, interval: float = 0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.base = self.peak = rss_mb()
+        self.label: Optional[str] = None
+        self.by_label: Dict[str, float] = {}
+        self._stop_evt = threading.Event()
+
+    def _sample(self) -> None:
+        v = rss_mb()
+        if v is None:
+            return
+        if self.peak is None or v > self.peak:
+            self.peak = v
+        lb = self.label
+        if lb is not None and v > self.by_label.get(lb, 0.0):
+            self.by_label[lb] = v
+
+    def run(self):
+        while not self._stop_evt.wait(self.interval):
+            self._sample()
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self.join()
+        self._sample()
+
+class StepProfile:
+    def __init__(self, step: str):
+        self.step = step
+        self.phase_s = {p: 0.0 for p in PHASES}
+        self.phase_calls = {p: 0 for p in PHASES}
+        self.functions: Dict[str, dict] = {}
+        self.cprofiles: Dict[str, cProfile.Profile] = {}
+        self.cprofile_names = _cprofile_funcs()
+        self.sampler = PeakSampler() if rss_mb() is not None else None
+        self.cached = False  # krok obnoven z cache (utils.cache)
+        self._phase: Optional[str] = None
+
+    def wants_cprofile(self, name: str) -> bool:
+        return "all" in self.cprofile_names or name in self.cprofile_names
+
+_ACTIVE: Optional[StepProfile] = None
+
+def active() -> Optional[StepProfile]:
+    return _ACTIVE
+
+@contextmanager
+def phase(name: str):
+    """Započti blok do fáze kroku (load/write); vnořené fáze se nepočítají dvakrát."""
+    prof = _ACTIVE
+    if prof is None or prof._phase is not None:
+        yield
+        return
+    prof._phase = name
+    if prof.sampler:
+        prof.sampler.label = name
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        prof.phase_s[name] += time.perf_counter() - t0
+        prof.phase_calls[name] += 1
+        prof._phase = None
+        if prof.sampler:
+            prof.sampler.label = "compute"
+
+def profiled(fn=None, *, phase_name: Optional[str] = None):
+    """Dekorátor hot funkce: bez profilování jen průchod; jinak čas/počet volání (+ cProfile)."""
+    def deco(f):
+        name = f.__name__
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            prof = _ACTIVE
+            if prof is None:
+                return f(*args, **kwargs)
+            rec = prof.functions.setdefault(name, {"calls": 0, "seconds": 0.0})
+            cp = None
+            if prof.wants_cprofile(name):
+                cp = prof.cprofiles.setdefault(name, cProfile.Profile())
+            t0 = time.perf_counter()
+            try:
+                with phase(phase_name) if phase_name else nullcontext():
+                    if cp is not None:
+                        return cp.runcall(f, *args, **kwargs)
+                    return f(*args, **kwargs)
+            finally:
+                rec["calls"] += 1
+                rec["seconds"] += time.perf_counter() - t0
+        return wrapper
+    return deco(fn) if fn is not None else deco
+
+def _top(cp: cProfile.Profile, n: int = 15) -> List[dict]:
+    st = pstats.Stats(cp, stream=io.StringIO())
+    rows = []
+    for (file, line, func), (cc, nc, tt, ct, _) in st.stats.items():
+        rows.append({"function": f"{Path(file).name}:{line}({func})", "calls": nc,
+                     "tottime": round(tt, 4), "cumtime": round(ct, 4)})
+    return sorted(rows, key=lambda r: r["cumtime"], reverse=True)[:n]
+
+def _round(x: Optional[float], nd: int = 4):
+    return None if x is None else round(x, nd)
+
+def _write(outdir: Path, prof: StepProfile, total_s: float) -> Path:
+    outdir.mkdir(parents=True, exist_ok=True)
+    phases = {}
+    io_s = prof.phase_s["load"] + prof.phase_s["write"]
+    for p in PHASES:
+        s = max(total_s - io_s, 0.0) if p == "compute" else prof.phase_s[p]
+        phases[p] = {"seconds": _round(s), "calls": prof.phase_calls[p] if p != "compute" else None}
+        if prof.sampler:
+            phases[p]["peak_rss_mb"] = _round(prof.sampler.by_label.get(p), 1)
+    rec = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - total_s)),
+        "total_s": _round(total_s),
+        "cached": prof.cached,
+        "phases": phases,
+        "functions": {k: {"calls": v["calls"], "seconds": _round(v["seconds"])} for k, v in prof.functions.items()},
+    }
+    if prof.sampler:
+        rec["rss_start_mb"] = _round(prof.sampler.base, 1)
+        rec["rss_peak_mb"] = _round(prof.sampler.peak, 1)
+    if prof.cprofiles:
+        pdir = outdir / "profile"
+        pdir.mkdir(exist_ok=True)
+        rec["cprofile"] = {}
+        for name, cp in prof.cprofiles.items():
+            f = pdir / f"{prof.step}.{name}.prof"
+            cp.dump_stats(str(f))
+            rec["cprofile"][name] = {"file": f.relative_to(outdir).as_posix(), "top": _top(cp)}
+
+    path = outdir / PROFILE_FILE
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("steps", {})[prof.step] = rec
+    path.write_text(json.dumps(data, indent=1, ensure_ascii=False), encoding="utf-8")
+    return path
+
+@contextmanager
+def profile_step(step: str, outdir: str | Path | None):
+    """Profiluj krok (je-li ECB_PROFILE zapnuto) a zapiš výsledek do <outdir>/profile.json."""
+    global _ACTIVE
+    if not enabled() or _ACTIVE is not None or outdir is None:
+        yield None
+        return
+    prof = StepProfile(step)
+    if prof.sampler:
+        prof.sampler.label = "compute"
+        prof.sampler.start()
+    _ACTIVE = prof
+    t0 = time.perf_counter()
+    try:
+        yield prof
+    finally:
+        total = time.perf_counter() - t0
+        _ACTIVE = None
+        if prof.sampler:
+            prof.sampler.stop()
+        p = _write(Path(outdir), prof, total)
+        print(f"[OK] profile {step}: {total:.2f} s → {p}")
@@ -4,10 +4,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 import re
 import numpy as np
 import pandas as pd
+from .store import write_table, append_table, TableAppender, persisting
+from .alloc_store import write_alloc_store, append_alloc_store
+from .incremental import write_delta
+from .profiling import profiled
+from .compact import compact_long, compact_on, long_from_wide, recode, unify_categories, value_dtype
 
 # ---------------- I/O ----------------
 def ensure_csv_dir(outdir: Path) -> Path:
@@ -15,18 +20,8 @@ def ensure_csv_dir(outdir: Path) -> Path:
     (outdir / "csv").mkdir(parents=True, exist_ok=True)
     return outdir / "csv"
 
-# v sharing_lib.py nahraď původní safe_to_csv touto verzí
-def safe_to_csv(df, outroot, name, *, strict: bool | None = None):
-    """
-    Ulož CSV bez překvapení:
-      - Pokud strict=True (nebo ENERGO_STRICT_OUTDIR=1), ukládá **přesně** do outroot.
-      - Jinak (kvůli zpětné kompatibilitě) přidá podadresář 'csv' jen tehdy,
-        když outroot NEkončí na 'csv'.
-    Vrací plnou cestu k výslednému souboru.
-    """
+def _safe_target_dir(outroot, strict: bool | None) -> Path:
     import os
-    from pathlib import Path
-
     if strict is None:
         strict = os.getenv("ENERGO_STRICT_OUTDIR", "0") == "1"
 
@@ -37,9 +32,51 @@ def safe_to_csv(df, outroot, name, *, strict: bool | None = None):
         target_dir = outroot if outroot.name.lower() == "csv" else (outroot / "csv")
 
     target_dir.mkdir(parents=True, exist_ok=True)
-    out_path = target_dir / f"{name}.csv"
-    df.to_csv(out_path, index=False)
-    print(f"[OK] {name}: {out_path}")
+    return target_dir
+
+# v sharing_lib.py nahraď původní safe_to_csv touto verzí
+def safe_to_csv(df, outroot, name, *, strict: bool | None = None):
+    """
+    Ulož tabulku bez překvapení (formát dle utils.store: CSV, nebo Parquet přes ECB_STORE_FORMAT):
+      - Pokud strict=True (nebo ENERGO_STRICT_OUTDIR=1), ukládá **přesně** do outroot.
+      - Jinak (kvůli zpětné kompatibilitě) přidá podadresář 'csv' jen tehdy,
+        když outroot NEkončí na 'csv'.
+    Vrací plnou cestu k výslednému souboru.
+    """
+    out_path = write_table(df, _safe_target_dir(outroot, strict) / f"{name}.csv")
+    print(f"[OK] {name}: {out_path}" + ("" if persisting() else " (jen v paměti)"))
+    return out_path
+
+def safe_alloc_store(df, outroot, name="allocations", *, strict: bool | None = None):
+    """Jako safe_to_csv, ale alokace kroku 3 v řídkém binárním formátu (utils.alloc_store → <name>.npz)."""
+    out_path = write_alloc_store(df, _safe_target_dir(outroot, strict) / f"{name}.npz")
+    print(f"[OK] {name}: {out_path} ({len(df):,} alokací)" + ("" if persisting() else " (jen v paměti)"))
+    return out_path
+
+def safe_appender(outroot, name, *, strict: bool | None = None) -> TableAppender:
+    """Jako safe_to_csv, ale pro zápis po částech (with safe_appender(...) as w: w.append(df))."""
+    return TableAppender(_safe_target_dir(outroot, strict) / f"{name}.csv")
+
+def csv_target(outroot, *, strict: bool | None = None) -> Path:
+    """Složka, kam safe_to_csv & spol. ukládají (outroot nebo outroot/csv)."""
+    return _safe_target_dir(outroot, strict)
+
+def safe_append(df, outroot, name, *, delta: bool = False, fill_value=None, strict: bool | None = None):
+    """
+    Inkrementální běh (utils.incremental): připiš řádky k tabulce <name> (store.append_table);
+    delta=True je zapíše i jako deltu pro navazující krok (csv/incremental/<name>).
+    """
+    target = _safe_target_dir(outroot, strict)
+    out_path = append_table(df, target / f"{name}.csv", fill_value=fill_value)
+    if delta:
+        write_delta(df, target, name)
+    print(f"[OK] {name}: {out_path} (+{len(df):,} řádků)" + ("" if persisting() else " (jen v paměti)"))
+    return out_path
+
+def safe_alloc_append(df, outroot, name="allocations", *, strict: bool | None = None):
+    """Jako safe_append pro řídké alokace (<name>.npz)."""
+    out_path = append_alloc_store(df, _safe_target_dir(outroot, strict) / f"{name}.npz")
+    print(f"[OK] {name}: {out_path} (+{len(df):,} alokací)" + ("" if persisting() else " (jen v paměti)"))
     return out_path
 
 
@@ -86,15 +123,23 @@ def read_wide_to_long(path: str | Path, *, sep: str = ",", header_rows: int = 1,
     if not value_cols:
         raise ValueError("Wide vstup nemá žádné datové sloupce.")
 
+    if units.lower() not in ("mwh", "kwh"):
+        raise ValueError("units musí být 'mwh' nebo 'kwh'")
+    if compact_on():  # bez melt, site/ean jako category (utils.compact)
+        scale = 1000.0 if units.lower() == "mwh" else 1.0
+        values = np.column_stack([pd.to_numeric(df.iloc[:, i], errors="coerce").to_numpy(dtype=float) * scale
+                                  for i, c in enumerate(df.columns) if c != "datetime"])
+        names = [str(c) for c in value_cols]
+        long_df = long_from_wide(df["datetime"], names, names, values)
+        return long_df.dropna(subset=["datetime"]).sort_values(["datetime", "site"]).reset_index(drop=True)
+
     long_df = df.melt(id_vars=["datetime"], value_vars=value_cols, var_name="site", value_name="value")
     long_df["ean"] = long_df["site"].astype(str)
 
     if units.lower() == "mwh":
         long_df["value_kwh"] = pd.to_numeric(long_df["value"], errors="coerce") * 1000.0
-    elif units.lower() == "kwh":
-        long_df["value_kwh"] = pd.to_numeric(long_df["value"], errors="coerce")
     else:
-        raise ValueError("units musí být 'mwh' nebo 'kwh'")
+        long_df["value_kwh"] = pd.to_numeric(long_df["value"], errors="coerce")
 
     long_df = long_df.drop(columns=["value"])
     long_df = long_df.dropna(subset=["datetime"]).sort_values(["datetime", "site"]).reset_index(drop=True)
@@ -115,11 +160,19 @@ def apply_site_key(df: pd.DataFrame) -> pd.DataFrame:
     out = df.copy()
     if "site" not in out.columns:
         raise ValueError("Očekávám sloupec 'site'.")
+    if isinstance(out["site"].dtype, pd.CategoricalDtype):  # klíč stačí spočítat pro kategorie
+        out["site"] = recode(out["site"], _site_key)
+        return out
     digits = out["site"].astype(str).str.replace(r"\D", "", regex=True)
     has_ean = digits.str.len() >= 8
     out["site"] = np.where(has_ean, digits, out["site"].apply(_canonical_site_text))
     return out
 
+def _site_key(s: str) -> str:
+    """apply_site_key pro jednu hodnotu."""
+    digits = re.sub(r"\D", "", str(s))
+    return digits if len(digits) >= 8 else _canonical_site_text(s)
+
 # ------- binning O/D a pairing --------
 def _sum_by_site_bin(df: pd.DataFrame, value_col: str = "value_kwh", freq: str = "H") -> pd.DataFrame:
     if df is None or df.empty:
@@ -129,7 +182,7 @@ def _sum_by_site_bin(df: pd.DataFrame, value_col: str = "value_kwh", freq: str =
     tmp = tmp.dropna(subset=["datetime"])
     tmp["tbin"] = tmp["datetime"].dt.floor(freq)
     out = (
-        tmp.groupby(["tbin", "site"], as_index=False)[value_col]
+        tmp.groupby(["tbin", "site"], as_index=False, observed=True)[value_col]
            .sum()
            .rename(columns={"tbin":"datetime"})
            .sort_values(["datetime","site"])
@@ -137,6 +190,7 @@ def _sum_by_site_bin(df: pd.DataFrame, value_col: str = "value_kwh", freq: str =
     )
     return out
 
+@profiled
 def local_pairing(
     eano_long: pd.DataFrame,
     eand_long: pd.DataFrame,
@@ -153,7 +207,10 @@ def local_pairing(
     O = _sum_by_site_bin(Oin, value_col="value_kwh", freq=freq).rename(columns={"value_kwh":"cons_kwh"})
     D = _sum_by_site_bin(Din, value_col="value_kwh", freq=freq).rename(columns={"value_kwh":"prod_kwh"})
 
-    df = pd.merge(O, D, on=["datetime","site"], how="outer").fillna(0.0)
+    if isinstance(O["site"].dtype, pd.CategoricalDtype) and isinstance(D["site"].dtype, pd.CategoricalDtype):
+        unify_categories(O, D)  # outer merge pak drží category
+
+    df = pd.merge(O, D, on=["datetime","site"], how="outer").fillna({"cons_kwh": 0.0, "prod_kwh": 0.0})
     df["local_selfcons_kwh"] = np.minimum(df["cons_kwh"], df["prod_kwh"])
     df["import_after_kwh"]   = np.maximum(df["cons_kwh"] - df["prod_kwh"], 0.0)
     df["export_after_kwh"]   = np.maximum(df["prod_kwh"] - df["cons_kwh"], 0.0)
@@ -163,6 +220,115 @@ def local_pairing(
     local_self = df[["datetime","site","local_selfcons_kwh"]].copy()
     return eano_after, eand_after, local_self
 
+# ------- pairing přímo z wide (bez melt) --------
+LAYOUTS = ("long", "wide", "both")  # co krok 1 zapisuje (krok 2 páruje z wide, je-li k dispozici)
+
+def _site_layers(site: List[str], orig: List[str], ean: List[str]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Řídká příslušnost EAN sloupců k site (bez scipy): site seřazené podle počtu sloupců sestupně,
+    `perm` = sloupce po vrstvách – vrstva q = q-tý sloupec každé site, která jich má víc než q
+    (to je prvních n[q] site). Uvnitř site pořadí (původní site, ean) jako v long tabulce.
+    """
+    m = pd.DataFrame({"site": site, "orig": orig, "ean": ean, "pos": np.arange(len(ean))})
+    m = m.sort_values(["site", "orig", "ean", "pos"], kind="stable")
+    m["q"] = m.groupby("site", sort=False).cumcount().to_numpy()
+    size = m["site"].value_counts(sort=False).sort_values(ascending=False, kind="stable")
+    sites = list(size.index)
+    m["g"] = pd.Index(sites).get_indexer(m["site"])
+    m = m.sort_values(["q", "g"], kind="stable")
+    return sites, m["pos"].to_numpy(), np.bincount(m["q"].to_numpy(), minlength=1) if len(m) else np.zeros(0, int)
+
+def _binned_site_sums(X: np.ndarray, tstart: np.ndarray, tlen: np.ndarray, bstart: np.ndarray, blen: np.ndarray,
+                      perm: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """
+    Součty bin × site z řádků seřazených podle času: bin = úsek časů (bstart/blen), čas = úsek
+    řádků (tstart/tlen, víc řádků = duplicitní čas), site = vrstvy sloupců (_site_layers). Sčítá
+    v pořadí long tabulky (čas → sloupec → duplicita) s kompenzací (Kahan) jako pandas groupby.sum
+    → bitově shodné s long cestou.
+    """
+    B, G = len(bstart), int(n[0]) if len(n) else 0
+    S = np.zeros((B, G), dtype=X.dtype)
+    C = np.zeros_like(S)
+    Xo = X[:, perm]
+    offs = np.r_[0, np.cumsum(n)]
+    for p in range(int(blen.max()) if B else 0):
+        u = np.minimum(bstart + p, len(tstart) - 1)
+        on = blen > p
+        dups = [(Xo[np.minimum(tstart[u] + r, len(X) - 1)], (on & (tlen[u] > r))[:, None])
+                for r in range(int(tlen[u[on]].max()) if on.any() else 0)]
+        for q, k in enumerate(n):
+            for blk, act in dups:
+                v = blk[:, offs[q]:offs[q] + k]
+                s = S[:, :k]
+                y = v - C[:, :k]
+                t = s + y
+                c = t - s - y
+                c[np.isnan(c)] = 0.0  # ±inf: kompenzace NaN by výsledek zkazila
+                ok = act & ~np.isnan(v)
+                np.copyto(C[:, :k], c, where=ok)
+                np.copyto(S[:, :k], t, where=ok)
+    return S
+
+def _wide_site_bins(wide: pd.DataFrame, site_of: Dict[str, str], group_of: Dict[str, str], freq: str,
+                    use_canonical: bool) -> Tuple[pd.DatetimeIndex, List[str], np.ndarray]:
+    """Wide [datetime, <EAN>...] → (časové biny, site, matice bin × site)."""
+    cols = [c for c in wide.columns if c != "datetime"]
+    dt = pd.to_datetime(wide["datetime"], errors="coerce")
+    keep = np.flatnonzero(dt.notna().to_numpy())
+    order = keep[np.argsort(dt.to_numpy()[keep], kind="stable")]
+    ts = pd.DatetimeIndex(dt.to_numpy()[order])
+    tstart = np.flatnonzero(np.r_[True, ts[1:] != ts[:-1]]) if len(ts) else np.zeros(0, int)
+    tb = ts[tstart].floor(freq)
+    bstart = np.flatnonzero(np.r_[True, tb[1:] != tb[:-1]]) if len(tb) else np.zeros(0, int)
+    orig = [str(site_of.get(str(c), c)) for c in cols]
+    site = [str(group_of.get(o, o)) for o in orig]
+    if use_canonical:
+        site = [_site_key(x) for x in site]
+    sites, perm, n = _site_layers(site, orig, [str(c) for c in cols])
+    X = wide[cols].to_numpy(dtype=value_dtype())[order] if cols else np.empty((len(order), 0))
+    S = _binned_site_sums(X, tstart, np.diff(np.r_[tstart, len(ts)]), bstart, np.diff(np.r_[bstart, len(tb)]), perm, n)
+    o = np.argsort(sites, kind="stable")
+    return tb[bstart], [sites[i] for i in o], S[:, o]
+
+@profiled
+def local_pairing_wide(
+    eano_wide: pd.DataFrame,
+    eand_wide: pd.DataFrame,
+    site_of: Dict[str, str] | None = None,
+    *,
+    group_of: Dict[str, str] | None = None,
+    freq: str = "H",
+    use_canonical: bool = True
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    local_pairing přímo z wide tabulek kroku 1 (--layout wide) bez melt: EAN sloupce → site
+    (`site_of` EAN→site, `group_of` site→site_group) přes řídkou příslušnost, biny = souvislé
+    úseky řádků seřazených podle času, párování O↔D maticově. Výstup stejný jako local_pairing
+    nad long tabulkami (řádky jen pro bin × site, které O nebo D má).
+    """
+    site_of, group_of = site_of or {}, group_of or {}
+    tO, sO, cons_o = _wide_site_bins(eano_wide, site_of, group_of, freq, use_canonical)
+    tD, sD, prod_d = _wide_site_bins(eand_wide, site_of, group_of, freq, use_canonical)
+    times = tO.union(tD)
+    sites = sorted(set(sO) | set(sD))
+    cons = np.zeros((len(times), len(sites)), dtype=cons_o.dtype)
+    prod = np.zeros((len(times), len(sites)), dtype=prod_d.dtype)
+    has = np.zeros(cons.shape, dtype=bool)
+    for t, s, M, out in ((tO, sO, cons_o, cons), (tD, sD, prod_d, prod)):
+        ix = np.ix_(times.get_indexer(t), pd.Index(sites).get_indexer(s))
+        out[ix] = M
+        has[ix] = True
+    r, g = np.nonzero(has)  # pořadí (čas, site) jako outer merge
+    c, p = cons[r, g], prod[r, g]
+    dt, site = times[r], np.asarray(sites, dtype=object)[g]
+
+    def frame(col: str, v: np.ndarray) -> pd.DataFrame:
+        return compact_long(pd.DataFrame({"datetime": dt, "site": site, col: v}))
+
+    return (frame("import_after_kwh", np.maximum(c - p, 0.0)),
+            frame("export_after_kwh", np.maximum(p - c, 0.0)),
+            frame("local_selfcons_kwh", np.minimum(c, p)))
+
 # ------- Ekonomika z citlivostí (NPV/payback) -------
 def econ_from_sensitivity(
     df: pd.DataFrame, *,
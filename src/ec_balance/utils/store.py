@@ -0,0 +1,282 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Mezikrokové úložiště tabulek (CSV nebo Parquet).
+
+Formát volí ECB_STORE_FORMAT=csv|parquet (v configu `global.store_format`, v CLI
+`ecb --store-format`). Kroky dál pracují s cestami `*.csv` z CLI/configu – `resolve()`
+najde skutečný soubor (stejné jméno, přípona .csv/.parquet; při obou vyhraje novější,
+při shodě Parquet).
+
+Parquet drží typovaný datetime64, site/ean jako category a floaty beze ztráty (float64).
+Při čtení se category převádí zpět na object, aby se kroky chovaly stejně jako nad CSV.
+CSV na vyžádání: ECB_STORE_CSV=1 (zapisuje i CSV kopii) nebo `ecb export-csv --dir ...`.
+"""
+from __future__ import annotations
+import os
+import argparse
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterable, List
+import pandas as pd
+from . import artifacts
+from .profiling import phase
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet"}
+CATEGORICAL_COLS = ("site", "ean", "from_site", "to_site", "central_site")
+
+def store_format() -> str:
+    fmt = os.getenv("ECB_STORE_FORMAT", "csv").strip().lower() or "csv"
+    if fmt not in FORMATS:
+        raise ValueError(f"ECB_STORE_FORMAT='{fmt}' není podporován (povoleno: {sorted(FORMATS)})")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except Exception:
+            raise SystemExit("ECB_STORE_FORMAT=parquet vyžaduje pyarrow (pip install pyarrow)")
+    return fmt
+
+def _csv_export() -> bool:
+    return os.getenv("ECB_STORE_CSV", "0") == "1"
+
+def _candidates(path: str | Path) -> List[Path]:
+    p = Path(path)
+    stem = p.with_suffix("") if p.suffix.lower() in FORMATS.values() else p
+    return [stem.with_suffix(sfx) for sfx in FORMATS.values()]
+
+def resolve(path: str | Path) -> Path:
+    """Skutečný soubor k cestě bez ohledu na příponu (.csv/.parquet); neexistuje-li, vrací vstup."""
+    p = Path(path)
+    found = [c for c in _candidates(p) if c.exists()]
+    if not found:
+        return p
+    if len(found) == 1:
+        return found[0]
+    # novější vyhrává; při shodě Parquet (CSV export nese mtime svého Parquetu)
+    return max(found, key=lambda c: (c.stat().st_mtime, c.suffix.lower() == ".parquet"))
+
+def exists(path: str | Path) -> bool:
+    reg = artifacts.active()
+    return (reg is not None and path in reg) or resolve(path).exists()
+
+_RECORDERS: List[List[Path]] = []
+
+@contextmanager
+def recording_writes():
+    """Seznam souborů zapsaných přes write_table/TableAppender uvnitř bloku (pro utils.cache)."""
+    written: List[Path] = []
+    _RECORDERS.append(written)
+    try:
+        yield written
+    finally:
+        _RECORDERS.remove(written)
+
+def _note_written(*paths: Path) -> None:
+    for rec in _RECORDERS:
+        for p in paths:
+            if p not in rec:
+                rec.append(p)
+
+def persisting() -> bool:
+    """Zapisuje se na disk? (ne při `run-all --no-persist`, kdy tabulky žijí jen v registru)"""
+    reg = artifacts.active()
+    return reg is None or reg.persist
+
+def _to_parquet_frame(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy(deep=False)
+    if not all(isinstance(c, str) for c in out.columns):
+        out.columns = [str(c) for c in out.columns]
+    for c in CATEGORICAL_COLS:
+        if c in out.columns and out[c].dtype == object:
+            out[c] = out[c].astype("category")
+    return out
+
+def _from_parquet_frame(df: pd.DataFrame) -> pd.DataFrame:
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(object)
+    return df
+
+def write_table(df: pd.DataFrame, path: str | Path, *, fmt: str | None = None) -> Path:
+    """Zapiš tabulku (bez indexu) ve zvoleném formátu; přípona cesty se nahradí. Vrací cestu."""
+    fmt = fmt or store_format()
+    p = Path(path)
+    p = (p.with_suffix("") if p.suffix.lower() in FORMATS.values() else p).with_suffix(FORMATS[fmt])
+    reg = artifacts.active()
+    if reg is not None:
+        reg.put(p, df)
+        if not reg.persist:
+            return p
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with phase("write"):
+        if fmt == "parquet":
+            if _csv_export():  # CSV dřív → Parquet zůstane novější a resolve() ho preferuje
+                df.to_csv(p.with_suffix(".csv"), index=False)
+                _note_written(p.with_suffix(".csv"))
+            _to_parquet_frame(df).to_parquet(p, index=False)
+        else:
+            df.to_csv(p, index=False)
+    _note_written(p)
+    return p
+
+def append_table(df: pd.DataFrame, path: str | Path, *, fill_value=None) -> Path:
+    """
+    Připiš řádky k existující tabulce (inkrementální běh, utils.incremental); jinak jako write_table.
+    CSV se připisuje na konec souboru (cena úměrná novým datům), Parquet, tabulka v registru
+    nebo nové sloupce = přepis celé tabulky. Chybějící sloupce se doplní `fill_value` (None = přepis).
+    """
+    if not exists(path):
+        return write_table(df, path)
+    reg = artifacts.active()
+    p = resolve(path)
+    in_memory = reg is not None and (path in reg or not reg.persist)
+    if not in_memory and p.suffix.lower() == ".csv" and store_format() == "csv":
+        header = pd.read_csv(p, nrows=0).columns.tolist()
+        extra = [c for c in df.columns if c not in header]
+        missing = [c for c in header if c not in df.columns]
+        if not extra and (not missing or fill_value is not None):
+            with phase("write"):
+                df.reindex(columns=header, fill_value=fill_value).to_csv(
+                    p, mode="a", header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+            _note_written(p)
+            return p
+    old = read_table(path)
+    if "datetime" in old.columns:
+        old["datetime"] = pd.to_datetime(old["datetime"], errors="coerce")
+    out = pd.concat([old, df], ignore_index=True)
+    if fill_value is not None:
+        out = out.fillna(fill_value)
+    return write_table(out, path)
+
+class TableAppender:
+    """
+    Zápis tabulky po částech (streaming): CSV se připisuje (hlavička jen jednou),
+    Parquet jde přes pyarrow.ParquetWriter se schématem z první části.
+    Datetime se v CSV formátuje pevně, aby vzhled nezávisel na obsahu jednotlivé části.
+    Při aktivním registru bez ukládání (run-all --no-persist) se části jen sbírají a v close()
+    se celá tabulka zapíše do registru – jako u write_table.
+    """
+    def __init__(self, path: str | Path, *, fmt: str | None = None):
+        self.fmt = fmt or store_format()
+        p = Path(path)
+        self.path = (p.with_suffix("") if p.suffix.lower() in FORMATS.values() else p).with_suffix(FORMATS[self.fmt])
+        self.rows = 0
+        self._csv_paths: List[Path] = []
+        self._pq_writer = None
+        self._pq_schema = None
+        reg = artifacts.active()
+        self._parts: List[pd.DataFrame] | None = [] if reg is not None and not reg.persist else None
+        if self._parts is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.fmt == "csv":
+            self._csv_paths = [self.path]
+        elif _csv_export():
+            self._csv_paths = [self.path.with_suffix(".csv")]
+        _note_written(*self._csv_paths, self.path)
+
+    def append(self, df: pd.DataFrame) -> None:
+        if self._parts is not None:
+            self._parts.append(df)
+            self.rows += len(df)
+            return
+        with phase("write"):
+            self._append(df)
+        self.rows += len(df)
+
+    def _append(self, df: pd.DataFrame) -> None:
+        for cp in self._csv_paths:
+            df.to_csv(cp, index=False, mode="a" if self.rows else "w", header=not self.rows,
+                      date_format="%Y-%m-%d %H:%M:%S")
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(_to_parquet_frame(df), preserve_index=False)
+            if self._pq_writer is None:
+                # slovníkové sloupce s jednotným indexem, ať schéma sedí pro všechny části
+                self._pq_schema = pa.schema([
+                    pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+                    for f in table.schema
+                ], metadata=table.schema.metadata)
+                self._pq_writer = pq.ParquetWriter(self.path, self._pq_schema)
+            self._pq_writer.write_table(table.cast(self._pq_schema))
+
+    def close(self) -> Path:
+        if self._parts:
+            artifacts.active().put(self.path, pd.concat(self._parts, ignore_index=True))
+            self._parts = []
+        if self._pq_writer is not None:
+            self._pq_writer.close()
+            self._pq_writer = None
+        return self.path
+
+    def __enter__(self) -> "TableAppender":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def read_table(path: str | Path, *, parse_dates: Iterable[str] | None = None, **csv_kwargs) -> pd.DataFrame:
+    """
+    Načti tabulku z CSV i Parquetu (při aktivním registru artefaktů z paměti).
+    `parse_dates` se u CSV předá do read_csv (u Parquetu/registru je datetime už
+    typovaný). Ostatní kwargs jdou jen do read_csv.
+    """
+    reg = artifacts.active()
+    if reg is not None:
+        df = reg.get(path)
+        if df is not None:
+            return df
+    p = resolve(path)
+    with phase("load"):
+        if p.suffix.lower() == ".parquet":
+            return _from_parquet_frame(pd.read_parquet(p))
+        if parse_dates:
+            csv_kwargs["parse_dates"] = list(parse_dates)
+        return pd.read_csv(p, **csv_kwargs)
+
+def ensure_csv(path: str | Path, *, overwrite: bool = False) -> Path:
+    """CSV podoba tabulky; z Parquetu se (pře)vytvoří, je-li CSV starší nebo chybí."""
+    p = resolve(path)
+    target = p.with_suffix(".csv")
+    if p.suffix.lower() != ".parquet":
+        return p
+    if target.exists() and not overwrite and target.stat().st_mtime >= p.stat().st_mtime:
+        return target
+    read_table(p).to_csv(target, index=False)
+    st = p.stat()
+    os.utime(target, (st.st_atime, st.st_mtime))  # stejný mtime → resolve() dál volí Parquet
+    return target
+
+def export_csv(directory: str | Path, *, overwrite: bool = False) -> List[Path]:
+    """Převeď všechny *.parquet (a *.npz alokace) v adresáři na CSV (pro Excel/ruční kontrolu). Vrací zapsané."""
+    out = []
+    for p in sorted(Path(directory).glob("*.parquet")):
+        target = p.with_suffix(".csv")
+        if not overwrite and target.exists() and target.stat().st_mtime >= p.stat().st_mtime:
+            continue
+        out.append(ensure_csv(p, overwrite=True))
+    for p in sorted(Path(directory).glob("*.npz")):  # řídké alokace kroku 3 (utils.alloc_store)
+        target = p.with_suffix(".csv")
+        if not overwrite and target.exists() and target.stat().st_mtime >= p.stat().st_mtime:
+            continue
+        from .alloc_store import AllocStore
+        AllocStore.load(p).to_frame().to_csv(target, index=False)
+        out.append(target)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Export mezivýsledků z Parquetu do CSV")
+    ap.add_argument("--dir", default=None, help="Složka s *.parquet (default <outdir>/csv)")
+    ap.add_argument("--outdir", default="./out")
+    ap.add_argument("--overwrite", action="store_true", help="Přepsat i aktuální CSV")
+    args = ap.parse_args()
+    written = export_csv(args.dir or Path(args.outdir) / "csv", overwrite=args.overwrite)
+    for p in written:
+        print(f"[OK] {p}")
+    print(f"[OK] export-csv: {len(written)} souborů")
+
+if __name__ == "__main__":
+    main()
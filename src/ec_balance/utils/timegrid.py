@@ -0,0 +1,130 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Společná časová mřížka pipeline (artefakt csv/time_grid z kroku 1).
+
+time_grid = jeden řádek: start, end, freq (rozlišení dat), tz, slots (počet časů mřížky),
+missing (časy mřížky bez dat). Mřížka je pravidelná řada start..end po freq v místním čase;
+s tz (např. Europe/Prague) bez neexistujících časů jarního přechodu (podzimní hodina je
+v naivním místním čase jednou). Krok 1 ji zapíše jednou (--grid_freq, --tz), navazující kroky
+si vezmou osu v rozlišení svých dat (hodinová data → mřížka zaokrouhlená na hodiny), oříznutou
+na rozsah dat (step_axis), a data na ni kladou po pozicích (dense). Časy bez dat jsou tak
+v osách explicitně jako nuly, místo aby z výsledků tiše vypadly. Bez time_grid (starší výstupy)
+je osa jako dřív sjednocení časů v datech.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from .store import exists, read_table
+
+GRID = "time_grid"
+GRID_COLS = ("start", "end", "freq", "tz", "slots", "missing")
+
+def _unique_times(*times) -> np.ndarray:
+    parts = [pd.to_datetime(pd.Series(np.asarray(t)), errors="coerce").dropna().to_numpy() for t in times]
+    parts = [p for p in parts if len(p)]
+    return np.unique(np.concatenate(parts)) if parts else np.array([], dtype="datetime64[ns]")
+
+def infer_freq(times) -> Optional[pd.Timedelta]:
+    """Nejčastější kladný rozestup časů (None = méně než dva různé časy)."""
+    ts = _unique_times(times)
+    if len(ts) < 2:
+        return None
+    vals, counts = np.unique(np.diff(ts), return_counts=True)
+    return pd.Timedelta(vals[np.argmax(counts)])
+
+def _freq_str(freq) -> str:
+    return to_offset(pd.Timedelta(freq) if isinstance(freq, (pd.Timedelta, np.timedelta64)) else freq).freqstr
+
+def _tz(meta) -> str:
+    tz = meta.get("tz") if hasattr(meta, "get") else None
+    return "" if tz is None or pd.isna(tz) else str(tz)
+
+def _regular(start, end, freq: str, tz: str) -> pd.DatetimeIndex:
+    rng = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq)
+    if tz:  # neexistující místní časy (jarní přechod) vypadnou, podzimní hodina zůstane jednou
+        loc = rng.tz_localize(tz, ambiguous=np.ones(len(rng), dtype=bool), nonexistent="NaT")
+        rng = rng[~loc.isna()]
+    return rng
+
+def grid_meta(*times, freq: str = "auto", tz: str = "") -> pd.DataFrame:
+    """Tabulka time_grid z časů v datech (freq='auto' = nejčastější rozestup, jinak pandas freq)."""
+    ts = _unique_times(*times)
+    if not len(ts):
+        raise ValueError("time_grid: data nemají žádný platný čas")
+    if freq == "auto":
+        f = infer_freq(ts)
+        freq = _freq_str(f) if f is not None else "h"
+    else:
+        freq = _freq_str(freq)
+    grid = _regular(ts[0], ts[-1], freq, tz)
+    return pd.DataFrame([{"start": pd.Timestamp(ts[0]).isoformat(), "end": pd.Timestamp(ts[-1]).isoformat(),
+                          "freq": freq, "tz": tz or "", "slots": len(grid),
+                          "missing": int((~grid.isin(ts)).sum())}], columns=list(GRID_COLS))
+
+def merge_meta(old: Optional[pd.DataFrame], new: pd.DataFrame) -> pd.DataFrame:
+    """time_grid po připsání nového období (--incremental): rozsah se prodlouží, rozlišení zůstává."""
+    if old is None or not len(old):
+        return new
+    o, n = old.iloc[0], new.iloc[0]
+    if str(n["freq"]) != str(o["freq"]) or _tz(n) != _tz(o):
+        print(f"[WARN] time_grid: nová data mají {n['freq']}/{_tz(n) or '-'}, mřížka zůstává {o['freq']}/{_tz(o) or '-'}")
+    start, end = min(pd.Timestamp(o["start"]), pd.Timestamp(n["start"])), max(pd.Timestamp(o["end"]), pd.Timestamp(n["end"]))
+    slots = len(_regular(start, end, str(o["freq"]), _tz(o)))
+    have = (int(o["slots"]) - int(o["missing"])) + (int(n["slots"]) - int(n["missing"]))
+    return pd.DataFrame([{"start": start.isoformat(), "end": end.isoformat(), "freq": o["freq"], "tz": _tz(o),
+                          "slots": slots, "missing": max(slots - have, 0)}], columns=list(GRID_COLS))
+
+def load_meta(csvdir: str | Path) -> Optional[dict]:
+    p = Path(csvdir) / f"{GRID}.csv"
+    if not exists(p):
+        return None
+    df = read_table(p)
+    return None if df.empty else df.iloc[0].to_dict()
+
+def grid_index(meta: dict, freq=None) -> pd.DatetimeIndex:
+    """Časy mřížky; s `freq` hrubším než mřížka zaokrouhlené dolů (např. 15min → h)."""
+    grid = _regular(meta["start"], meta["end"], str(meta["freq"]), _tz(meta))
+    if freq is not None and pd.Timedelta(to_offset(freq)) > pd.Timedelta(to_offset(str(meta["freq"]))):
+        grid = grid.floor(freq).unique()
+    return grid
+
+def step_axis(csvdir: str | Path | None, *times, freq=None, label: str = "") -> pd.DatetimeIndex:
+    """
+    Časová osa kroku: mřížka time_grid v rozlišení dat (`freq`, jinak odvozené z časů), oříznutá
+    na rozsah dat. Časy mimo mřížku se přidají s [WARN]; bez time_grid = sjednocené časy dat.
+    """
+    ts = _unique_times(*times)
+    meta = load_meta(csvdir) if csvdir is not None else None
+    if meta is None or not len(ts):
+        return pd.DatetimeIndex(ts, name="datetime")
+    f = freq or infer_freq(ts) or str(meta["freq"])
+    grid = grid_index(meta, f)
+    grid = grid[(grid >= ts[0]) & (grid <= ts[-1])]
+    off = ~pd.DatetimeIndex(ts).isin(grid)
+    if off.any():
+        print(f"[WARN] {label or 'time_grid'}: {int(off.sum())} časů mimo mřížku ({meta['freq']}) – přidány do osy")
+        grid = grid.union(pd.DatetimeIndex(ts[off]))
+    gaps = len(grid) - len(ts)
+    if gaps > 0:
+        print(f"[i] {label or 'time_grid'}: {gaps} časů bez dat (v ose jako nuly)")
+    return pd.DatetimeIndex(grid, name="datetime")
+
+def dense(df: pd.DataFrame, val: str, times: pd.Index, sites: Sequence, dt: str = "datetime",
+          site_col: str = "site") -> np.ndarray:
+    """Pole časy × site z tabulky s unikátními (čas, site) – po pozicích na ose; chybějící = 0."""
+    out = np.zeros((len(times), len(sites)))
+    if df is None or df.empty:
+        return out
+    r = pd.Index(times).get_indexer(df[dt])
+    c = pd.Index(sites).get_indexer(df[site_col])
+    ok = (r >= 0) & (c >= 0)
+    out[r[ok], c[ok]] = pd.to_numeric(df[val], errors="coerce").fillna(0.0).to_numpy(dtype=float)[ok]
+    return out
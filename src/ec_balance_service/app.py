@@ -1,12 +1,16 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Header, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
-import contextlib, io, sys, importlib, shutil
+import asyncio, json, os, shutil
 import pandas as pd
+from ec_balance.utils.store import read_table, resolve, exists, ensure_csv
+from ec_balance.utils.profiles import typical_profiles
+from ec_balance_service.jobs import JobManager
+from ec_balance_service.workspaces import Workspace, WorkspaceStore
 
 app = FastAPI(title="ec-balance service", version="0.1")
 
@@ -66,85 +70,199 @@ def _save_upload_to_csv(dest_dir: Path, desired_name: str, up: UploadFile) -> Pa
             shutil.copyfileobj(up.file, f)
     return out_path
 
+# --- workspaces: izolované uploads/out pro každou relaci (bez workspace = sdílené OUT_DIR) ---
+WORKSPACES_DIR = Path(os.getenv("ECB_SERVICE_WORKSPACES_DIR", "") or (BASE / "data" / "workspaces"))
+GC_INTERVAL_S = 600
+_store: WorkspaceStore | None = None
+
+def _workspaces() -> WorkspaceStore:
+    global _store
+    if _store is None:
+        _store = WorkspaceStore(WORKSPACES_DIR)
+    return _store
+
+def _workspace(x_workspace: str | None = Header(default=None),
+               workspace: str | None = Query(default=None)) -> Workspace | None:
+    # workspace z ?workspace=… nebo hlavičky X-Workspace; bez něj sdílené adresáře (web UI)
+    ws_id = workspace or x_workspace
+    if not ws_id:
+        return None
+    ws = _workspaces().get(ws_id)
+    if ws is None:
+        raise HTTPException(status_code=404, detail=f"workspace {ws_id} not found (expired?)")
+    return ws
+
+def _csv_dir(ws: Workspace | None) -> Path:
+    return ws.csv_dir if ws else CSV_DIR
+
+@api.post("/workspaces")
+def create_workspace():
+    _workspaces().gc(_jobs().busy)
+    ws = _workspaces().create()
+    return {"id": ws.id, "ttl_hours": _workspaces().ttl_s / 3600.0}
+
+@api.get("/workspaces/{ws_id}")
+def get_workspace(ws_id: str):
+    ws = _workspace(workspace=ws_id)
+    return {"id": ws.id, "last_used": _workspaces().last_used(ws),
+            "jobs": [j.id for j in _jobs().list(ws.root)], "csv": sorted(_output_names(ws.csv_dir))}
+
+@api.delete("/workspaces/{ws_id}")
+def delete_workspace(ws_id: str):
+    ws = _workspace(workspace=ws_id)
+    if _jobs().busy(ws.root):
+        raise HTTPException(status_code=409, detail="workspace has running jobs")
+    _workspaces().delete(ws)
+    return {"ok": True}
+
+@app.on_event("startup")
+async def _start_workspace_gc():
+    async def _loop():
+        while True:
+            removed = _workspaces().gc(_jobs().busy)
+            if removed:
+                print(f"[i] workspace GC: smazáno {len(removed)}")
+            await asyncio.sleep(GC_INTERVAL_S)
+    app.state.workspace_gc = asyncio.create_task(_loop())
+
 # --- vĂ˝pis/stahovĂˇnĂ­ vĂ˝stupĹŻ ---
 @api.get("/outputs")
-def list_outputs():
-    return {"root": OUT_DIR.name, "csv": sorted(p.name for p in CSV_DIR.glob("*.csv"))}
+def list_outputs(ws: Workspace | None = Depends(_workspace)):
+    out_dir = ws.out if ws else OUT_DIR
+    return {"root": out_dir.name, "workspace": ws.id if ws else None, "csv": sorted(_output_names(_csv_dir(ws)))}
+
+def _output_names(csv_dir: Path = CSV_DIR) -> set[str]:
+    # výstupy v Parquetu hlásíme pod CSV jménem – CSV se vytvoří při stažení
+    return {p.with_suffix(".csv").name for p in csv_dir.glob("*.csv")} | \
+           {p.with_suffix(".csv").name for p in csv_dir.glob("*.parquet")}
 
 @api.get("/outputs/{name}")
-def get_output_file(name: str):
-    p = CSV_DIR / name
+def get_output_file(name: str, ws: Workspace | None = Depends(_workspace)):
+    p = resolve(_csv_dir(ws) / Path(name).name)
     if not p.exists():
         return {"error": f"{name} not found"}
+    if name.endswith(".csv"):
+        p = ensure_csv(p)  # Parquet → CSV export na vyžádání
     return FileResponse(str(p), media_type="text/csv", filename=name)
 
 # --- upload vstupĹŻ (klĂ­ÄŤ = nĂˇzev parametru, napĹ™. eano_after_pv_csv) ---
 @api.post("/upload")
-async def upload_input(key: str = Form(...), file: UploadFile = File(...)):
+async def upload_input(key: str = Form(...), file: UploadFile = File(...),
+                       ws: Workspace | None = Depends(_workspace)):
     safe_key = key.strip().replace("/", "_").replace("\\", "_")
     desired_name = f"{safe_key}.csv"
-    saved = _save_upload_to_csv(UPLOAD_DIR, desired_name, file)
+    saved = _save_upload_to_csv(ws.uploads if ws else UPLOAD_DIR, desired_name, file)
     return {"ok": True, "key": safe_key, "path": str(saved)}
 
-# --- mapovĂˇnĂ­ krok -> modul ---
-_STEP_TO_MODULE = {
-    "step3":  "ec_balance.pipeline.step3_sharing",
-    "step4a": "ec_balance.pipeline.step4a_batt_local_byhour",
-    "step4b-econ": "ec_balance.pipeline.step4b_batt_econ",
-    "step5a": "ec_balance.pipeline.step5a_batt_central_byhour",
-    "step5":  "ec_balance.pipeline.step5_batt_central",
-    "step6":  "ec_balance.pipeline.step6_excel_scenarios",
-}
-
-def _kv_to_argv(d: dict | None) -> list[str]:
-    argv: list[str] = []
-    for k, v in (d or {}).items():
-        if v is None:
-            continue
-        k = str(k).replace("_", "-")
-        if isinstance(v, bool):
-            v = "true" if v else "false"
-        argv += [f"--{k}", str(v)]
-    return argv
-
-def _run_step(step: str, args: dict) -> dict:
-    if step not in _STEP_TO_MODULE:
-        return {"ok": False, "error": f"Unknown step: {step}"}
-    module_path = _STEP_TO_MODULE[step]
-    mod = importlib.import_module(module_path)
-
-    before = set(p.name for p in CSV_DIR.glob("*.csv"))
-    buf = io.StringIO()
-    rc = 0
-    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
-        old_argv = sys.argv[:]
-        try:
-            sys.argv = ["ecb"] + _kv_to_argv(args)
-            mod.main()
-        except SystemExit as e:
-            rc = int(getattr(e, "code", 1) or 0)
-        except Exception as e:
-            rc = 1
-            print(f"[ERROR] {type(e).__name__}: {e}")
-        finally:
-            sys.argv = old_argv
-
-    after = set(p.name for p in CSV_DIR.glob("*.csv"))
-    new_files = sorted(list(after - before))
-    return {"ok": rc == 0, "return_code": rc, "log": buf.getvalue(), "new_csv": new_files}
+# --- úlohy: kroky běží v pracovních procesech (jobs.py), request handler neblokují ---
+JOBS_DIR = Path(os.getenv("ECB_SERVICE_JOBS_DIR", "") or (BASE / "data" / "jobs"))
+_manager: JobManager | None = None
+
+def _jobs() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(JOBS_DIR)
+    return _manager
+
+@app.on_event("shutdown")
+def _shutdown_jobs():
+    if _manager is not None:
+        _manager.shutdown(wait=False)
+
+def _job_or_404(job_id: str):
+    job = _jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+    return job
+
+@api.post("/jobs")
+def submit_job(body: dict, ws: Workspace | None = Depends(_workspace)):
+    # Body JSON: {"step": "step3", "args": {...CLI parametry...}}; pro "run-all" je args celý config.
+    # S workspace běží úloha v něm (relativní cesty vůči workspace), jinak ve vlastním adresáři.
+    try:
+        job = _jobs().submit(str(body.get("step", "")), body.get("args") or {},
+                             workdir=ws.root if ws else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.status()
+
+@api.get("/jobs")
+def list_jobs(ws: Workspace | None = Depends(_workspace)):
+    return {"jobs": [j.status() for j in _jobs().list(ws.root if ws else None)]}
+
+@api.get("/jobs/{job_id}")
+def get_job(job_id: str, log_offset: int = 0):
+    job = _job_or_404(job_id)
+    text, offset = job.read_log(log_offset)
+    return {**job.status(), "log": text, "log_offset": offset}
+
+@api.get("/jobs/{job_id}/log")
+async def stream_job_log(job_id: str):
+    job = _job_or_404(job_id)
+
+    async def _tail():
+        offset = 0
+        while True:
+            done = job.finished  # stav před čtením → po dokončení se dočte celý log
+            text, offset = job.read_log(offset)
+            if text:
+                yield text
+            if done:
+                break
+            await asyncio.sleep(0.5)
+    return StreamingResponse(_tail(), media_type="text/plain; charset=utf-8")
+
+@api.get("/jobs/{job_id}/files/{path:path}")
+def get_job_file(job_id: str, path: str):
+    job = _job_or_404(job_id)
+    p = (job.workdir / path).resolve()
+    if job.workdir not in p.parents or not p.is_file():
+        raise HTTPException(status_code=404, detail=f"{path} not found")
+    return FileResponse(str(p), filename=p.name)
+
+@api.get("/jobs/{job_id}/profile")
+def get_job_profile(job_id: str):
+    # profile.json úlohy spuštěné s global.profile / "profile": true v args
+    job = _job_or_404(job_id)
+    p = job.profile_path
+    if not p.is_file():
+        raise HTTPException(status_code=404, detail=f"job {job_id} has no profile (enable 'profile')")
+    return json.loads(p.read_text(encoding="utf-8"))
+
+_PATH_KEYS = ("outdir", "csv_dir")
+
+def _absolutize(args: dict) -> dict:
+    # /run/{step} zachovává dřívější chování: relativní cesty vůči adresáři serveru
+    out = dict(args)
+    for k, v in args.items():
+        if isinstance(v, str) and v and (k in _PATH_KEYS or k.endswith(("_csv", "_wide"))):
+            if not Path(v).is_absolute():
+                out[k] = str(Path.cwd() / v)
+    return out
 
 @api.post("/run/{step}")
-async def run_step(step: str, args: dict):
-    # Body JSON = map CLI parametrĹŻ (viz README/CLI)
-    return _run_step(step, args or {})
+async def run_step(step: str, args: dict, ws: Workspace | None = Depends(_workspace)):
+    # Body JSON = map CLI parametrů (viz README/CLI); čeká na dokončení úlohy, server neblokuje
+    csv_dir = _csv_dir(ws)
+    before = _output_names(csv_dir)
+    try:
+        if ws:
+            job = _jobs().submit(step, args or {}, workdir=ws.root)
+        else:
+            job = _jobs().submit(step, _absolutize(args or {}))
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    rc = await asyncio.wrap_future(job.future)
+    new_files = sorted(_output_names(csv_dir) - before)
+    return {"ok": rc == 0, "return_code": rc, "log": job.read_log()[0], "new_csv": new_files, "job_id": job.id}
 
 # --- jednoduchĂ© summary pro step3 (ukĂˇzka) ---
 @api.get("/summary/step3")
-def summary_step3():
-    by_hour = CSV_DIR / "by_hour_after.csv"
-    if not by_hour.exists():
+def summary_step3(ws: Workspace | None = Depends(_workspace)):
+    by_hour = _csv_dir(ws) / "by_hour_after.csv"
+    if not exists(by_hour):
         return {"ok": False, "error": "by_hour_after.csv not found"}
-    df = pd.read_csv(by_hour)
+    df = read_table(by_hour)
     cols = df.columns.str.lower()
     def _sum(col_like: str) -> float:
         idx = [i for i, c in enumerate(cols) if col_like in c]
@@ -157,6 +275,25 @@ def summary_step3():
         "note": "orientaÄŤnĂ­ metrika; nĂˇzvy sloupcĹŻ pĹ™Ă­padnÄ› doladĂ­me",
     }
 
+# --- typické profily (den/týden/měsíc) libovolné hodinové tabulky bez stavby Excelu ---
+@api.get("/profiles/{name}")
+def get_profiles(name: str, kind: str = Query("day", pattern="^(day|week|month)$"), cols: str = "",
+                 ws: Workspace | None = Depends(_workspace)):
+    p = _csv_dir(ws) / Path(name).with_suffix(".csv").name
+    if not exists(p):
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+    df = read_table(p)
+    if "datetime" not in df.columns:
+        raise HTTPException(status_code=400, detail=f"{name} has no datetime column")
+    wanted = [c.strip() for c in cols.split(",") if c.strip()] or None
+    missing = [c for c in wanted or [] if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"unknown columns: {missing}")
+    day, week, month = typical_profiles(df, wanted, floor="h")
+    tab = {"day": day, "week": week, "month": month}[kind]
+    rows = [] if tab is None else tab.astype(object).where(tab.notna(), None).to_dict(orient="records")
+    return {"name": name, "kind": kind, "rows": rows}  # NaN (sloupec bez hodnot) → null
+
 app.include_router(api)
 
 app.mount('/ui', StaticFiles(directory='webui', html=True), name='ui')
@@ -0,0 +1,220 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Fronta úloh služby: kroky pipeline běží v pracovních procesech (ProcessPoolExecutor),
+ne v request handleru. Každá úloha má pracovní adresář (cwd procesu, výchozí --outdir;
+vlastní, nebo workspace – viz workspaces.py) a vlastní adresář se stavem a logem;
+sys.argv/stdout se mění jen uvnitř pracovního procesu, takže souběžné požadavky se
+neovlivňují a event loop serveru neblokují.
+
+Stav úlohy: queued → running → done | failed. Pracovní proces zapisuje `status.json`
+(začátek, konec, return code) a `job.log` průběžně, API je jen čte.
+
+Prostředí: ECB_SERVICE_WORKERS (počet procesů, default 2), ECB_SERVICE_JOBS_DIR (kořen adresářů úloh).
+"""
+from __future__ import annotations
+import contextlib
+import importlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ec_balance.utils.config import kv_to_argv, pop_env_keys
+from ec_balance.utils.profiling import PROFILE_FILE, profile_step
+
+STEP_TO_MODULE = {
+    "step1":  "ec_balance.pipeline.step1_wide_to_long",
+    "step2":  "ec_balance.pipeline.step2_local_pv",
+    "step3":  "ec_balance.pipeline.step3_sharing",
+    "step4":  "ec_balance.pipeline.step4_batt_local",
+    "step4a": "ec_balance.pipeline.step4a_batt_local_byhour",
+    "step4b-econ": "ec_balance.pipeline.step4b_batt_econ",
+    "step5a": "ec_balance.pipeline.step5a_batt_central_byhour",
+    "step5":  "ec_balance.pipeline.step5_batt_central",
+    "step6":  "ec_balance.pipeline.step6_excel_scenarios",
+    "run-all": "ec_balance.pipeline.run_all",  # args = celý config (global + sekce kroků)
+}
+
+STATES = ("queued", "running", "done", "failed")
+JOBS_SUBDIR = ".jobs"            # záznamy úloh uvnitř workspace
+_NOT_OUTPUTS = ("uploads", JOBS_SUBDIR)
+
+def _write_status(workdir: Path, **fields) -> None:
+    p = workdir / "status.json"
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    data.update(fields)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(p)
+
+def _execute(step: str, args: dict, workdir: str, jobdir: str, env: Dict[str, str]) -> int:
+    """Tělo úlohy v pracovním procesu; vrací return code (0 = OK)."""
+    wd, jd = Path(workdir), Path(jobdir)
+    _write_status(jd, state="running", started=time.time(), pid=os.getpid())
+    old_env = {k: os.environ.get(k) for k in env}
+    old_cwd, old_argv = os.getcwd(), sys.argv[:]
+    rc = 0
+    with open(jd / "job.log", "a", encoding="utf-8", buffering=1) as log, \
+            contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            os.environ.update(env)
+            os.chdir(wd)
+            if step == "run-all":
+                from ec_balance.pipeline.run_all import run_all
+                run_all(args)
+            else:
+                mod = importlib.import_module(STEP_TO_MODULE[step])
+                sys.argv = [f"ecb {step}"] + kv_to_argv(None, args)
+                with profile_step(step, args.get("outdir", ".")):
+                    mod.main()
+        except SystemExit as e:
+            code = e.code
+            rc = code if isinstance(code, int) else (0 if code is None else 1)
+            if not isinstance(code, (int, type(None))):
+                print(f"[ERROR] {code}")
+        except Exception as e:
+            rc = 1
+            print(f"[ERROR] {type(e).__name__}: {e}")
+            traceback.print_exc()
+        finally:
+            sys.argv = old_argv
+            os.chdir(old_cwd)
+            for k, v in old_env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+    _write_status(jd, state="done" if rc == 0 else "failed", finished=time.time(), return_code=rc)
+    return rc
+
+@dataclass
+class Job:
+    id: str
+    step: str
+    args: dict
+    workdir: Path
+    jobdir: Path
+    created: float = field(default_factory=time.time)
+    future: Optional[Future] = None
+
+    def status(self) -> dict:
+        try:
+            st = json.loads((self.jobdir / "status.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            st = {}
+        state = st.get("state", "queued")
+        if self.future is not None and self.future.done() and state not in ("done", "failed"):
+            # pracovní proces spadl dřív, než stihl zapsat stav
+            exc = self.future.exception()
+            state, st["error"] = "failed", f"{type(exc).__name__}: {exc}" if exc else "worker ended"
+        return {
+            "id": self.id, "step": self.step, "state": state,
+            "created": self.created, "started": st.get("started"), "finished": st.get("finished"),
+            "return_code": st.get("return_code"), "error": st.get("error"),
+            "outputs": self.outputs(),
+        }
+
+    def outputs(self) -> List[str]:
+        out = []
+        for p in self.workdir.rglob("*"):
+            rel = p.relative_to(self.workdir)
+            if p.is_file() and p.parent != self.jobdir and rel.parts[0] not in _NOT_OUTPUTS:
+                out.append(rel.as_posix())
+        return sorted(out)
+
+    @property
+    def profile_path(self) -> Path:
+        """<outdir>/profile.json úlohy (zapisuje se jen s ECB_PROFILE / global.profile)."""
+        args = (self.args.get("global") or {}) if self.step == "run-all" else self.args
+        return self.workdir / str(args.get("outdir", ".")) / PROFILE_FILE
+
+    def read_log(self, offset: int = 0) -> tuple[str, int]:
+        """Log od bajtu `offset`; vrací (text, nový offset) – pro polling i streaming."""
+        p = self.jobdir / "job.log"
+        if not p.exists():
+            return "", offset
+        with open(p, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        return data.decode("utf-8", errors="replace"), offset + len(data)
+
+    @property
+    def finished(self) -> bool:
+        return self.status()["state"] in ("done", "failed")
+
+class JobManager:
+    def __init__(self, root: str | Path, *, max_workers: Optional[int] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or int(os.getenv("ECB_SERVICE_WORKERS", "2") or 2)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: žádné zděděné vlákna/sockety serveru v pracovních procesech
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=mp.get_context("spawn"))
+        return self._pool
+
+    def submit(self, step: str, args: dict | None = None, *, workdir: str | Path | None = None) -> Job:
+        """workdir = cwd úlohy (např. workspace); bez něj dostane úloha vlastní adresář."""
+        if step not in STEP_TO_MODULE:
+            raise ValueError(f"Neznámý krok: {step} (povoleno: {sorted(STEP_TO_MODULE)})")
+        args = {k: (dict(v) if isinstance(v, dict) else v) for k, v in (args or {}).items()}
+        job_id = uuid.uuid4().hex
+        if workdir is None:
+            wd = jd = self.root / job_id
+        else:
+            wd = Path(workdir)
+            jd = wd / JOBS_SUBDIR / job_id
+        jd.mkdir(parents=True, exist_ok=True)
+        if step == "run-all":
+            env = pop_env_keys(args.get("global"))
+            args.setdefault("global", {}).setdefault("outdir", "out")
+        else:
+            env = pop_env_keys(args)
+            args.setdefault("outdir", "out")
+        job = Job(id=job_id, step=step, args=args, workdir=wd.resolve(), jobdir=jd.resolve())
+        _write_status(job.jobdir, state="queued", id=job_id, step=step)
+        job.future = self._executor().submit(_execute, step, args, str(job.workdir), str(job.jobdir), env)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.jobdir.exists():  # smazáno (GC workspace)
+                del self._jobs[job_id]
+                job = None
+            return job
+
+    def list(self, workdir: str | Path | None = None) -> List[Job]:
+        wd = Path(workdir).resolve() if workdir is not None else None
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.jobdir.exists() and (wd is None or j.workdir == wd)]
+        return sorted(jobs, key=lambda j: j.created)
+
+    def busy(self, workdir: str | Path) -> bool:
+        """Běží/čeká v adresáři nějaká úloha? (GC workspace ho nesmí smazat)"""
+        return any(j.future is not None and not j.future.done() for j in self.list(workdir))
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+# -*- coding: utf-8 -*-
+"""
+Workspace = izolovaný strom jedné relace/komunity ve službě:
+
+    <root>/<id>/uploads/      nahrané vstupy
+    <root>/<id>/out/csv, xlsx výstupy kroků (úlohy běží s cwd = workspace, --outdir out)
+    <root>/<id>/.jobs/<job>/  stav a log úloh
+
+Každé použití workspace obnoví jeho `last_used`; `gc()` smaže workspace nepoužité
+déle než TTL (kromě těch, kde běží úloha).
+
+Prostředí: ECB_SERVICE_WORKSPACES_DIR (kořen), ECB_SERVICE_WORKSPACE_TTL_H (default 24 h).
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_META = "workspace.json"
+
+@dataclass(frozen=True)
+class Workspace:
+    id: str
+    root: Path
+
+    @property
+    def uploads(self) -> Path:
+        return self.root / "uploads"
+
+    @property
+    def out(self) -> Path:
+        return self.root / "out"
+
+    @property
+    def csv_dir(self) -> Path:
+        return self.out / "csv"
+
+class WorkspaceStore:
+    def __init__(self, root: str | Path, *, ttl_hours: Optional[float] = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        if ttl_hours is None:
+            ttl_hours = float(os.getenv("ECB_SERVICE_WORKSPACE_TTL_H", "24") or 24)
+        self.ttl_s = ttl_hours * 3600.0
+        self._lock = threading.Lock()
+
+    def _meta(self, ws: Workspace) -> Path:
+        return ws.root / _META
+
+    def create(self) -> Workspace:
+        ws_id = uuid.uuid4().hex
+        ws = Workspace(ws_id, self.root / ws_id)
+        for d in (ws.uploads, ws.csv_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        self._meta(ws).write_text(json.dumps({"id": ws.id, "created": now}), encoding="utf-8")
+        return ws
+
+    def get(self, ws_id: str, *, touch: bool = True) -> Optional[Workspace]:
+        if not _ID_RE.match(ws_id or ""):  # jen naše id → žádné ../ v cestě
+            return None
+        ws = Workspace(ws_id, self.root / ws_id)
+        meta = self._meta(ws)
+        if not meta.exists():
+            return None
+        if touch:
+            os.utime(meta)  # last_used = mtime metadat
+        return ws
+
+    def last_used(self, ws: Workspace) -> float:
+        try:
+            return self._meta(ws).stat().st_mtime
+        except OSError:
+            return 0.0
+
+    def list(self) -> List[Workspace]:
+        return [Workspace(p.parent.name, p.parent) for p in sorted(self.root.glob(f"*/{_META}"))]
+
+    def delete(self, ws: Workspace) -> None:
+        shutil.rmtree(ws.root, ignore_errors=True)
+
+    def gc(self, busy: Callable[[Path], bool] = lambda p: False, *, now: Optional[float] = None) -> List[str]:
+        """Smaž workspace nepoužité déle než TTL; `busy(root)` chrání ty s běžící úlohou."""
+        now = time.time() if now is None else now
+        removed = []
+        with self._lock:
+            for ws in self.list():
+                if now - self.last_used(ws) > self.ttl_s and not busy(ws.root):
+                    self.delete(ws)
+                    removed.append(ws.id)
+        return removed
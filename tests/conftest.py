@@ -0,0 +1,40 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+import pytest
+
+# hlavička wide vstupu kroku 1: EAN, site (--site_row_file 2), kWp (--kwp_row_file 3)
+WIDE_HEAD = ("cas;EAN1;EAN2;EAN3", ";Škola;Škola;Úřad", ";10,5;;4")
+
+def _cell(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        return v
+    return str(v) if isinstance(v, int) else f"{v:.2f}".replace(".", ",")
+
+@pytest.fixture
+def write_wide():
+    """
+    Zapíše wide CSV ve formátu vstupu kroku 1: řádky `head` a pod nimi `values` (čísla s desetinnou
+    čárkou). `times` = časy řádků, nebo hodiny od 1. 3. 2024 (default 0, 1, …). Vrací cestu jako str.
+    """
+    def write(path, values, times=None, *, head=WIDE_HEAD):
+        values = [list(r) for r in values]
+        times = range(len(values)) if times is None else times
+        if not isinstance(times, pd.DatetimeIndex):
+            times = pd.Timestamp("2024-03-01") + pd.to_timedelta(list(times), unit="h")
+        rows = [t.strftime("%d.%m.%Y %H:%M") + ";" + ";".join(map(_cell, r)) for t, r in zip(times, values)]
+        path.write_text("\n".join([*head, *rows]) + "\n", encoding="utf-8")
+        return str(path)
+    return write
+
+@pytest.fixture
+def community_wide(write_wide):
+    """O (prod=False) / D (prod=True) malé komunity; hodnoty závisí jen na hodině → dávky na sebe sedí."""
+    def write(path, hours, prod, times=None):
+        vals = [[(h * 7 % 5) * 1.5, (h % 4) * 0.5, 2 + h % 3] if prod else [1 + h % 3, 0.5, (h * 5 % 7) * 0.8]
+                for h in hours]
+        return write_wide(path, vals, hours if times is None else times)
+    return write
@@ -0,0 +1,45 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from ec_balance.utils.alloc_store import AllocStore, load_hourly_totals
+
+def _allocs(n=300, seed=5):
+    rng = np.random.default_rng(seed)
+    sites = [f"S{i:02d}" for i in range(8)]
+    return pd.DataFrame({
+        "datetime": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 48, n), unit="h"),
+        "from_site": rng.choice(sites[:4], n),
+        "to_site": rng.choice(sites[4:], n),
+        "shared_kwh": rng.random(n),
+    }).drop_duplicates(["datetime", "from_site", "to_site"])
+
+def test_roundtrip_and_slices(tmp_path):
+    df = _allocs()
+    s = AllocStore.load(AllocStore.from_frame(df).save(tmp_path / "allocations.csv"))
+    ref = df.sort_values(["datetime", "from_site", "to_site"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(s.to_frame(), ref)
+
+    h0, h1 = pd.Timestamp("2024-01-01 05:00"), pd.Timestamp("2024-01-01 09:00")
+    part = s.hours_between(h0, h1)
+    assert len(part) == ref["datetime"].between(h0, h1).sum()
+    assert len(s.site("S05", "to")) == (ref["to_site"] == "S05").sum()
+    assert len(s.site("S02")) == (ref["from_site"] == "S02").sum()
+    assert s.site("nope").empty
+
+    tot = ref.groupby("datetime", as_index=False)["shared_kwh"].sum()
+    pd.testing.assert_frame_equal(s.hourly_totals(), tot)
+
+def test_hourly_totals_prefers_newer_npz(tmp_path):
+    csv = tmp_path / "allocations.csv"
+    df = _allocs()
+    df.to_csv(csv, index=False)
+    AllocStore.from_frame(df.assign(shared_kwh=df["shared_kwh"] * 2)).save(csv)
+    os.utime(csv, (1, 1))  # csv starší než npz → čte se npz
+    assert np.isclose(load_hourly_totals(csv)["shared_kwh"].sum(), 2 * df["shared_kwh"].sum())
+    csv.touch()  # csv novější → groupby z tabulky
+    assert np.isclose(load_hourly_totals(csv)["shared_kwh"].sum(), df["shared_kwh"].sum())
@@ -0,0 +1,52 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pytest
+
+from ec_balance.utils import battery_kernel as bk
+
+BACKENDS = ["numpy"] + (["numba"] if bk.numba is not None else [])
+
+def _data(n_hours=200, n_sites=7, seed=1):
+    rng = np.random.default_rng(seed)
+    imp = rng.random((n_hours, n_sites)) * (rng.random((n_hours, n_sites)) < 0.6) * 3
+    exp = rng.random((n_hours, n_sites)) * (rng.random((n_hours, n_sites)) < 0.4) * 5
+    cap = np.array([0.0, 2.0, 5.0, 5.0, 10.0, 0.5, 40.0])[:n_sites]
+    return imp, exp, cap
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_kernels_match_python_loops(monkeypatch, backend):
+    imp, exp, cap = _data()
+    monkeypatch.setenv("ECB_BATT_BACKEND", backend)
+    n = imp.shape[1]
+    for name, loop in [("greedy_local", bk._greedy_local_loop), ("greedy_central", bk._greedy_central_loop)]:
+        ref = [np.empty_like(imp), np.empty_like(imp)]
+        loop(imp, exp, cap, 0.9, 0.92, np.zeros(n), *ref, np.zeros(n), True)
+        got = getattr(bk, name)(imp, exp, cap, eta_c=0.9, eta_d=0.92)
+        assert all(np.array_equal(a, b) for a, b in zip(ref, got)), name
+
+    ref = [np.empty_like(imp) for _ in range(3)]
+    bk._own_community_local_loop(imp, exp, cap, 0.9, 0.92, np.zeros(n), *ref)
+    got = bk.own_community_local(imp, exp, cap, eta_c=0.9, eta_d=0.92)
+    assert all(np.array_equal(a, b) for a, b in zip(ref, got))
+
+    got = bk.own_community_central(imp[:, 0], exp[:, 0], imp[:, 1:].sum(axis=1), exp[:, 1:].sum(axis=1), 20.0)
+    assert all(g.shape == (len(imp),) for g in got)
+    assert (got[0] >= 0).all() and (got[0] <= 20.0 + 1e-9).all()
+
+def test_seq_row_sums_matches_python_sum():
+    a = np.random.default_rng(3).random((5, 40)) * 1e3
+    assert [sum(row) for row in a.tolist()] == bk.seq_row_sums(a).tolist()
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("kind", ["local", "central"])
+def test_sweep_matches_single_capacity_runs(monkeypatch, backend, kind):
+    imp, exp, _ = _data()
+    monkeypatch.setenv("ECB_BATT_BACKEND", backend)
+    kernel = bk.greedy_local if kind == "local" else bk.greedy_central
+    caps = [0.0, 1.5, 5.0, 12.0, 50.0]
+    got = bk.sweep_discharge(kind, imp, exp, caps)
+    for k, cap in enumerate(caps):
+        _, dis = kernel(imp, exp, np.full(imp.shape[1], cap))
+        assert got[k].tolist() == (0.0 + np.cumsum(dis, axis=0)[-1]).tolist()
@@ -0,0 +1,57 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ec_balance.utils.battery_kernel import own_community_local, run_windows, window_bounds
+from ec_balance.pipeline.step4_batt_local import simulate_local_battery_sweep
+
+def _flows(T=24 * 90, N=5, seed=3):
+    rng = np.random.default_rng(seed)
+    return rng.random((T, N)) * 3, rng.random((T, N)) * 6 * (rng.random((T, N)) > 0.3)
+
+def test_window_bounds():
+    times = pd.date_range("2023-12-31 22:00", periods=24 * 40, freq="h")
+    assert window_bounds(times, "none") == [0, len(times)]
+    assert window_bounds(times, "year") == [0, 2, len(times)]
+    assert window_bounds(times, "month") == [0, 2, 2 + 31 * 24, len(times)]
+    assert window_bounds(times, "100")[:3] == [0, 100, 200]
+    with pytest.raises(ValueError):
+        window_bounds(times, "week")
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_windows_matches_single_pass(workers):
+    imp, exp = _flows()
+    cap = np.array([5.0, 10.0, 0.0, 20.0, 50.0])
+    soc0 = np.array([1.0, 0.0, 0.0, 7.0, 0.0])
+    ref = own_community_local(imp, exp, cap, soc0=soc0)
+
+    def run(a, b, s):
+        return own_community_local(imp[a:b], exp[a:b], cap, soc0=s)
+
+    got, redone = run_windows(run, window_bounds(np.arange(len(imp)), "500"), soc0, workers=workers)
+    for r, g in zip(ref, got):
+        np.testing.assert_array_equal(r, g)
+    assert 0 < redone < len(imp)
+
+def test_sweep_state_resumes_exactly(tmp_path):
+    imp, exp = _flows(T=24 * 20, N=3)
+    times = pd.date_range("2024-01-01", periods=len(imp), freq="h")
+    def frames(sl):
+        def long(a, col):
+            return pd.DataFrame({"datetime": np.repeat(times[sl], 3), "site": ["A", "B", "C"] * len(times[sl]),
+                                 col: a[sl].ravel()})
+        return long(imp, "import_after_kwh"), long(exp, "export_after_kwh")
+
+    caps = [0.0, 4.0, 12.0]
+    ref, _ = simulate_local_battery_sweep(*frames(slice(None)), caps=caps, return_state=True)
+    _, state = simulate_local_battery_sweep(*frames(slice(0, 200)), caps=caps, return_state=True)
+    state.to_csv(tmp_path / "state.csv", index=False)
+    state = pd.read_csv(tmp_path / "state.csv", parse_dates=["datetime"], float_precision="round_trip")
+    got, end = simulate_local_battery_sweep(*frames(slice(200, None)), caps=caps, init_state=state, return_state=True)
+    pd.testing.assert_frame_equal(ref, got)
+    assert (end["datetime"] == times[-1]).all()
+    with pytest.raises(ValueError, match="Kapacity"):
+        simulate_local_battery_sweep(*frames(slice(200, None)), caps=[1.0], init_state=state)
@@ -0,0 +1,12 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+from ec_balance.bench.runner import STAGES, run_bench
+from ec_balance.bench.synth import SynthSpec
+
+def test_bench_runs_all_stages_on_tiny_community(tmp_path):
+    spec = SynthSpec(sites=5, freq="15min", days=2, pv_share=0.6, seed=1)
+    res = run_bench(spec, workdir=tmp_path, memory=False)
+    assert [s["stage"] for s in res["stages"]] == list(STAGES)
+    assert res["data"]["periods"] == 2 * 96
+    assert all(s["seconds"] >= 0 and s["rows"] > 0 for s in res["stages"])
@@ -0,0 +1,48 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+
+from ec_balance.pipeline.run_all import run_all
+from ec_balance.utils import cache
+from ec_balance.utils.store import write_table
+
+def test_key_ignores_prices_but_not_inputs(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text("a\n1\n", encoding="utf-8")
+    argv = ["--eano_after_pv_csv", str(src), "--outdir", str(tmp_path), "--price_feed_in_mwh", "1200"]
+    k = cache.step_key("step3", cache.parse_argv(argv))
+    assert k == cache.step_key("step3", cache.parse_argv(argv[:-1] + ["900"]))
+    src.write_text("a\n2\n", encoding="utf-8")
+    assert k != cache.step_key("step3", cache.parse_argv(argv))
+
+def test_run_cached_restores_outputs(tmp_path, monkeypatch):
+    monkeypatch.setenv("ECB_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    out = tmp_path / "out.csv"
+    calls = []
+
+    def step():
+        calls.append(1)
+        write_table(pd.DataFrame({"x": [1, 2]}), out)
+
+    argv = ["--outdir", str(tmp_path)]
+    cache.run_cached("step5", argv, step)
+    out.unlink()
+    cache.run_cached("step5", argv, step)
+    assert len(calls) == 1 and pd.read_csv(out)["x"].tolist() == [1, 2]
+
+    monkeypatch.setenv("ECB_CACHE_MAX_MB", "0")
+    cache.run_cached("step4", argv, step)  # nový záznam nad limit → LRU vyklidí vše
+    assert cache.StepCache.from_env().entries() == []
+
+def test_run_all_reuses_step2_across_outdirs(tmp_path, monkeypatch, capsys, write_wide):
+    monkeypatch.setenv("ECB_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    wide = write_wide(tmp_path / "wide.csv", [[h + 0.25, h % 3, 1.5] for h in range(30)])
+    cfg = {"step1": {"eano_wide": wide, "eand_wide": wide, "site_row_file": 2, "kwp_row_file": 3}}
+    run_all(cfg, steps=["step1", "step2"], outdir=str(tmp_path / "a"))
+    capsys.readouterr()
+    run_all(cfg, steps=["step1", "step2"], outdir=str(tmp_path / "b"))
+    out = capsys.readouterr().out
+    assert "cache: step1 přeskočen" in out and "cache: step2 přeskočen" in out
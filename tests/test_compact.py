@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline.step1_wide_to_long import _wide_to_long
+from ec_balance.utils.compact import compact_long
+from ec_balance.utils.sharing_lib import apply_site_key, local_pairing, read_wide_to_long
+
+def _wide(seed=0):
+    rng = np.random.default_rng(seed)
+    dt = pd.date_range("2024-03-01", periods=96, freq="15min")
+    cols = ["859182400000000003", "859182400000000001", "Škola (O)", "859182400000000002"]
+    vals = rng.random((len(dt), len(cols))).round(3).astype(str)
+    vals[5, 1] = "1,25"
+    vals[7, 2] = "x"
+    return pd.DataFrame({"datetime": dt, **{c: vals[:, i] for i, c in enumerate(cols)}})
+
+def _plain(df):
+    out = df.copy()
+    for c in out.columns:
+        if isinstance(out[c].dtype, pd.CategoricalDtype):
+            out[c] = out[c].astype(object)
+    return out
+
+@pytest.fixture
+def long_pair(monkeypatch):
+    wide = _wide()
+    sm = {"859182400000000003": "B", "859182400000000001": "A", "859182400000000002": "B"}
+    ref = _wide_to_long(wide, sm, units="mwh")
+    monkeypatch.setenv("ECB_COMPACT", "1")
+    return ref, _wide_to_long(wide, sm, units="mwh")
+
+def test_wide_to_long_compact_same_rows(long_pair):
+    ref, got = long_pair
+    assert isinstance(got["site"].dtype, pd.CategoricalDtype) and isinstance(got["ean"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(ref, _plain(got))
+    assert got.memory_usage(deep=True).sum() < ref.memory_usage(deep=True).sum() / 3
+
+def test_local_pairing_compact_bit_identical(long_pair, monkeypatch):
+    ref, got = long_pair
+    d_ref, d_got = ref.copy(), got.copy()
+    d_ref["value_kwh"] = d_got["value_kwh"] = ref["value_kwh"].to_numpy()[::-1]
+    monkeypatch.setenv("ECB_COMPACT", "0")
+    exp = local_pairing(ref, d_ref.iloc[:-24])
+    monkeypatch.setenv("ECB_COMPACT", "1")
+    res = local_pairing(got, d_got.iloc[:-24])
+    for e, r in zip(exp, res):
+        assert isinstance(r["site"].dtype, pd.CategoricalDtype)
+        pd.testing.assert_frame_equal(e, _plain(r))
+
+def test_float32_and_site_key(monkeypatch):
+    df = pd.DataFrame({"site": ["EAN 8591824-00000001", "Škola (odběr)", "škola"], "value_kwh": [1.0, 2.0, 3.0]})
+    ref = apply_site_key(df)
+    monkeypatch.setenv("ECB_COMPACT", "float32")
+    got = compact_long(df)
+    assert got["value_kwh"].dtype == np.float32
+    assert list(apply_site_key(got)["site"].astype(object)) == list(ref["site"])
+    monkeypatch.setenv("ECB_COMPACT", "yes")
+    with pytest.raises(ValueError, match="ECB_COMPACT"):
+        compact_long(df)
+
+def test_read_wide_to_long_compact(tmp_path, monkeypatch):
+    wide = _wide().drop(columns=["Škola (O)"])
+    wide.iloc[:, 1:] = wide.iloc[:, 1:].replace({"1,25": "1.25"})
+    wide.to_csv(tmp_path / "w.csv", index=False)
+    ref = read_wide_to_long(tmp_path / "w.csv")
+    monkeypatch.setenv("ECB_COMPACT", "1")
+    pd.testing.assert_frame_equal(ref[["datetime", "site", "ean", "value_kwh"]],
+                                  _plain(read_wide_to_long(tmp_path / "w.csv")))
@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline.step1_wide_to_long import _read_wide
+from ec_balance.utils import dialect
+from ec_balance.utils.dialect import SIDECAR, Dialect
+
+ROWS = [
+    "datetime;E1;E2;E3",
+    "site;A;B;B",
+    "kwp;1,5;2;",
+    "2024-03-01 00:00:00;1.234,5;0,25;x",
+    "2024-03-01 00:15:00;2,5;;1,5",
+    "01.03.2024 00:30;3;-0,125;2",
+]
+
+@pytest.fixture
+def wide_csv(tmp_path):
+    p = tmp_path / "o_wide.csv"
+    p.write_text("\n".join(ROWS) + "\n", encoding="utf-8")
+    return p
+
+def test_detect(wide_csv):
+    assert dialect.detect(wide_csv, ";") == Dialect(";", ",", ".", "%Y-%m-%d %H:%M:%S")
+
+@pytest.mark.parametrize("engine", ["c", "pyarrow"])
+def test_read_wide_typed_and_sidecar(wide_csv, tmp_path, monkeypatch, engine):
+    csvdir = tmp_path / "csv"
+    body, sites, kwp, row = _read_wide(str(wide_csv), ";", 2, 3, csvdir=csvdir, engine=engine)
+    assert (csvdir / SIDECAR).exists() and row == 3
+    assert sites == {"E1": "A", "E2": "B", "E3": "B"} and (kwp["E1"], kwp["E2"]) == (1.5, 2.0)
+    assert list(body["datetime"]) == list(pd.date_range("2024-03-01", periods=3, freq="15min"))
+    assert body[["E1", "E2", "E3"]].fillna(0.0).values.tolist() == [[1234.5, 0.25, 0.0], [2.5, 0.0, 1.5],
+                                                                     [3.0, -0.125, 2.0]]
+    monkeypatch.setattr(dialect, "detect", lambda *a: pytest.fail("dialekt měl být ze sidecaru"))
+    again, *_ = _read_wide(str(wide_csv), ";", 2, 3, csvdir=csvdir, engine=engine)
+    pd.testing.assert_frame_equal(body, again)
+
+def test_sidecar_dialect_checked_against_data(wide_csv, tmp_path):
+    csvdir = tmp_path / "csv"
+    assert dialect.resolve(wide_csv, ";", csvdir).thousands == "."
+    # nová dodávka se stejnou hlavičkou, ale s desetinnou tečkou
+    wide_csv.write_text("\n".join(ROWS[:3] + ["2024-03-01 00:00:00;1.5;0.25;2", "2024-03-01 00:15:00;2;3.75;1"])
+                        + "\n", encoding="utf-8")
+    assert not dialect.fits(wide_csv, Dialect(";", ",", ".", "%Y-%m-%d %H:%M:%S"))
+    body, *_ = _read_wide(str(wide_csv), ";", 2, 3, csvdir=csvdir)
+    assert body[["E1", "E2", "E3"]].values.tolist() == [[1.5, 0.25, 2.0], [2.0, 3.75, 1.0]]
+
+def test_three_digit_decimals_keep_thousands(tmp_path):
+    assert dialect._num_sep(["3.627,538", "1.234,567", "12,5"]) == (",", ".")
+    p = tmp_path / "w.csv"
+    p.write_text("\n".join(ROWS[:3] + ["2024-03-01 00:00:00;3.627,538;1.234,567;12,5"]) + "\n", encoding="utf-8")
+    assert not dialect.fits(p, Dialect(";", ",", "", "%Y-%m-%d %H:%M:%S"))
+    body, *_ = _read_wide(str(p), ";", 2, 3, csvdir=tmp_path / "csv")
+    assert body[["E1", "E2", "E3"]].values.tolist() == [[3627.538, 1234.567, 12.5]]
+
+def test_parse_numbers_uses_dialect_and_reports(capsys):
+    s = pd.Series(["1,234.5", "2.5", "x", None, ""], name="E1")
+    out = dialect.parse_numbers(s, Dialect(decimal="."))
+    assert out.iloc[:2].tolist() == [1234.5, 2.5] and pd.isna(out.iloc[2]) and out.iloc[3:].tolist() == [0.0, 0.0]
+    assert "[WARN] E1: 1 hodnot není číslo" in capsys.readouterr().out
+    assert dialect.parse_numbers(pd.Series(["1.234,5", "0,5"]), Dialect(decimal=",")).tolist() == [1234.5, 0.5]
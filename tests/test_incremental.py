@@ -0,0 +1,53 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline.run_all import run_all
+
+STEPS = ["step1", "step2", "step3", "step4", "step4a", "step5a", "step5"]
+
+@pytest.fixture
+def run(tmp_path, community_wide):
+    def _run(out, hours, tag, **kw):
+        o = community_wide(tmp_path / f"o_{tag}.csv", hours, prod=False)
+        d = community_wide(tmp_path / f"d_{tag}.csv", hours, prod=True)
+        cfg = {"global": {"outdir": str(out), "price_commodity_mwh": 2000, "price_distribution_mwh": 1500,
+                          "price_feed_in_mwh": 1000},
+               "step1": {"eano_wide": o, "eand_wide": d, "site_row_file": 2, "kwp_row_file": 3},
+               "step4": {"cap_kwh_list": "0,5,20"}, "step5a": {"central_site": "Úřad", "cap_kwh": 15},
+               "step5": {"cap_kwh_list": "10,30"}, **kw.pop("cfg", {})}
+        run_all(cfg, steps=kw.pop("steps", STEPS), **kw)
+    return _run
+
+def test_incremental_matches_full_run(tmp_path, monkeypatch, run):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    full, inc = tmp_path / "full", tmp_path / "inc"
+    run(full, range(72), "all")
+    run(inc, range(40), "a")
+    run(inc, range(36, 72), "b", incremental=True)  # 4 h překryv → zahodí se
+
+    for name in ("ean_o_long", "eano_after_pv", "allocations", "by_hour_after", "bat_local_by_site_hour",
+                 "by_hour_after_bat_central", "local_sensitivity", "central_sensitivity"):
+        a = pd.read_csv(full / "csv" / f"{name}.csv")
+        b = pd.read_csv(inc / "csv" / f"{name}.csv")
+        pd.testing.assert_frame_equal(a, b, obj=name)
+    soc = pd.read_csv(inc / "csv" / "by_hour_after_bat_central.csv")["soc_kwh"]
+    assert soc.iloc[39] > 0  # dávka b opravdu navazovala na nenulový SoC
+
+def test_incremental_detects_skipped_batch(tmp_path, monkeypatch, run):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    out = tmp_path / "out"
+    run(out, range(24), "a")
+    run(out, range(24, 48), "b", steps=["step1"], incremental=True)
+    run(out, range(48, 72), "c", steps=["step1"], incremental=True)
+    with pytest.raises(SystemExit, match="vynechané dávky"):
+        run(out, range(48, 72), "c", steps=["step2"], incremental=True)
+
+def test_incremental_rejects_changed_local_capacity(tmp_path, monkeypatch, run):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    out, steps = tmp_path / "out", ["step1", "step2", "step4a"]
+    run(out, range(24), "a", steps=steps)
+    with pytest.raises(SystemExit, match="step4a: kapacity baterií se liší"):
+        run(out, range(24, 48), "b", steps=steps, incremental=True, cfg={"step4a": {"fixed_cap_kwh": 3}})
@@ -0,0 +1,55 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import sys
+
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline import step1_wide_to_long as step1
+from ec_balance.pipeline.step1_wide_to_long import _read_many
+from ec_balance.utils.cache import _input_files
+from ec_balance.utils.ingest import expand_inputs, is_pattern
+
+Q = pd.date_range("2024-03-01", periods=4, freq="15min")
+
+@pytest.fixture
+def deliveries(tmp_path, write_wide):
+    a = write_wide(tmp_path / "2024-03.csv", [[1, 2], [3, 4], [5, 6]], Q[:3], head=("datetime;E1;E2", "site;A;B"))
+    b = write_wide(tmp_path / "2024-04.csv", [[7, 30], [8, 50], [9, 70]], Q[1:], head=("datetime;E3;E1", "site;C;A2"))
+    return tmp_path, a, b
+
+def test_expand_inputs(deliveries):
+    tmp, a, b = deliveries
+    assert expand_inputs(str(tmp / "2024-*.csv")) == [a, b]
+    assert expand_inputs(f"{b}, {a}") == [b, a]
+    with pytest.raises(ValueError, match="neodpovídá"):
+        expand_inputs(str(tmp / "2025-*.csv"))
+    with pytest.raises(ValueError, match="2025-01.csv' neexistuje"):
+        expand_inputs(f"{a},{tmp / '2025-01.csv'}")
+
+def test_comma_in_filename(deliveries, write_wide):
+    tmp, a, _ = deliveries
+    odd = write_wide(tmp / "EK Škola, Úřad.csv", [[1]], Q[:1], head=("datetime;E1", "site;A"))
+    assert not is_pattern(odd) and _input_files(odd) == []
+    assert expand_inputs(odd) == [odd]
+    assert expand_inputs(str(tmp / "EK*.csv")) == [odd]
+
+def test_step1_missing_file_exits(deliveries, monkeypatch):
+    tmp, a, _ = deliveries
+    monkeypatch.setattr(sys, "argv", ["step1", "--eano_wide", f"{a},{tmp / 'chybi.csv'}", "--eand_wide", a,
+                                      "--outdir", str(tmp / "out")])
+    with pytest.raises(SystemExit, match="chybi.csv' neexistuje"):
+        step1.main()
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_last_delivery_wins(deliveries, workers):
+    tmp, a, b = deliveries
+    long, sites, _ = _read_many([a, b], "ean_o_long", units="kwh", workers=workers, csvdir=tmp / "csv",
+                                redetect=False, sep=";", engine="c", site_row_file=2, kwp_row_file=None)
+    assert sites == {"E1": "A2", "E2": "B", "E3": "C"}
+    got = {(t.strftime("%H:%M"), e): v for t, e, v in long[["datetime", "ean", "value_kwh"]].itertuples(index=False)}
+    assert got[("00:00", "E1")] == 1.0 and got[("00:15", "E1")] == 30.0 and got[("00:45", "E1")] == 70.0
+    assert got[("00:30", "E2")] == 6.0 and len(long) == 10
+    assert set(long.loc[long["ean"] == "E1", "site"]) == {"A2"}
+    assert long["datetime"].is_monotonic_increasing
@@ -0,0 +1,29 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import time
+
+from ec_balance_service.jobs import JobManager
+
+def _wait(job, timeout=60):
+    t0 = time.time()
+    while not job.finished and time.time() - t0 < timeout:
+        time.sleep(0.1)
+    return job.status()
+
+def test_jobs_run_isolated(tmp_path):
+    wide = tmp_path / "wide.csv"
+    wide.write_text("cas;EAN1\n;Škola\n;5\n01.03.2024 00:00;1,5\n01.03.2024 01:00;2\n", encoding="utf-8")
+    m = JobManager(tmp_path / "jobs", max_workers=2)
+    try:
+        args = {"eano_wide": str(wide), "eand_wide": str(wide), "site_row_file": 2, "kwp_row_file": 3}
+        a, b = m.submit("step1", args), m.submit("step1", args)
+        bad = m.submit("step3", {})
+        for job in (a, b):
+            st = _wait(job)
+            assert st["state"] == "done" and "out/csv/ean_o_long.csv" in st["outputs"]
+        assert a.workdir != b.workdir
+        assert _wait(bad)["state"] == "failed"
+        assert "required" in bad.read_log()[0]
+    finally:
+        m.shutdown()
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+
+from ec_balance.pipeline.run_all import run_all
+
+def test_partitioned_run_matches_full(tmp_path, monkeypatch, community_wide):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    times = pd.date_range("2024-02-27", periods=24 * 6, freq="h")  # přes hranici měsíce
+    community_wide(tmp_path / "o.csv", range(len(times)), prod=False, times=times)
+    community_wide(tmp_path / "d.csv", range(len(times)), prod=True, times=times)
+    cfg = {"global": {"price_commodity_mwh": 2000, "price_distribution_mwh": 1500, "price_feed_in_mwh": 1000},
+           "step1": {"eano_wide": str(tmp_path / "o.csv"), "eand_wide": str(tmp_path / "d.csv"),
+                     "site_row_file": 2, "kwp_row_file": 3},
+           "step4": {"cap_kwh_list": "0,5,20"}, "step5a": {"central_site": "Úřad", "cap_kwh": 15},
+           "step5": {"cap_kwh_list": "10,30"}}
+    steps = ["step1", "step2", "step3", "step4", "step4a", "step5a", "step5"]
+    full, part = tmp_path / "full", tmp_path / "part"
+    run_all(cfg, steps=steps, outdir=str(full))
+    run_all(cfg, steps=steps, outdir=str(part), partition="month", workers=2)
+
+    assert sorted(p.name for p in (part / "partitions").iterdir()) == ["2024-02", "2024-03"]
+    for name in ("eano_after_pv", "local_selfcons", "allocations", "by_hour_after", "imp_wide",
+                 "bat_local_by_site_hour", "by_hour_after_bat_central", "local_sensitivity", "central_sensitivity"):
+        a = pd.read_csv(full / "csv" / f"{name}.csv")
+        b = pd.read_csv(part / "csv" / f"{name}.csv")
+        pd.testing.assert_frame_equal(a, b, obj=name)
+    pd.testing.assert_frame_equal(pd.read_csv(full / "csv" / "by_site_after.csv"),
+                                  pd.read_csv(part / "csv" / "by_site_after.csv"), rtol=1e-12)
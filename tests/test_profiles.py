@@ -0,0 +1,33 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+
+from ec_balance.utils.profiles import typical_profiles
+
+def _loop_profiles(df, cols):
+    # původní algoritmus (smyčka přes měsíce) jako reference
+    x = df.copy()
+    x["month"] = x["datetime"].dt.month
+    x["hour"] = x["datetime"].dt.hour
+    x["hweek"] = x["datetime"].dt.dayofweek * 24 + x["hour"]
+    day, week, month = [], [], []
+    for m in sorted(x["month"].unique()):
+        xm = x[x["month"] == m]
+        day.append(xm.groupby("hour", as_index=False)[cols].mean().assign(month=m))
+        week.append(xm.groupby("hweek", as_index=False)[cols].mean().assign(month=m))
+        month.append(xm.groupby("month", as_index=False)[cols].sum())
+    return (pd.concat(day, ignore_index=True)[["month", "hour"] + cols],
+            pd.concat(week, ignore_index=True)[["month", "hweek"] + cols],
+            pd.concat(month, ignore_index=True))
+
+def test_matches_month_loop():
+    rng = np.random.default_rng(3)
+    idx = pd.date_range("2023-11-20", periods=24 * 60, freq="h")
+    df = pd.DataFrame({"datetime": idx, "a": rng.random(len(idx)), "b": rng.random(len(idx))})
+    df.loc[::7, "b"] = np.nan
+    for got, ref in zip(typical_profiles(df, ["a", "b"]), _loop_profiles(df, ["a", "b"])):
+        pd.testing.assert_frame_equal(got, ref, check_dtype=False)
+    day, _, month = typical_profiles(df)  # default = všechny číselné sloupce
+    assert list(day.columns) == ["month", "hour", "a", "b"] and month["month"].tolist() == [1, 11, 12]
@@ -0,0 +1,32 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import json
+
+import pandas as pd
+
+from ec_balance.utils import profiling
+from ec_balance.utils.store import read_table, write_table
+
+@profiling.profiled
+def _hot(df):
+    return df["x"].sum()
+
+def test_profile_step_writes_phases_and_functions(tmp_path, monkeypatch):
+    monkeypatch.setenv("ECB_PROFILE", "1")
+    monkeypatch.setenv("ECB_PROFILE_FUNCS", "_hot")
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    with profiling.profile_step("stepX", tmp_path):
+        write_table(pd.DataFrame({"x": [1, 2, 3]}), tmp_path / "a.csv")
+        assert _hot(read_table(tmp_path / "a.csv")) == 6
+
+    rec = json.loads((tmp_path / "profile.json").read_text(encoding="utf-8"))["steps"]["stepX"]
+    assert rec["phases"]["load"]["calls"] == 1 and rec["phases"]["write"]["calls"] == 1
+    assert rec["functions"]["_hot"]["calls"] == 1
+    assert (tmp_path / rec["cprofile"]["_hot"]["file"]).exists()
+
+def test_disabled_is_passthrough(tmp_path, monkeypatch):
+    monkeypatch.delenv("ECB_PROFILE", raising=False)
+    with profiling.profile_step("stepX", tmp_path) as prof:
+        assert prof is None and _hot(pd.DataFrame({"x": [1]})) == 1
+    assert not (tmp_path / "profile.json").exists()
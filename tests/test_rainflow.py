@@ -0,0 +1,27 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+
+from ec_balance.pipeline.step6_excel_scenarios import battery_metrics
+from ec_balance.utils.rainflow import dod_summary, rainflow
+
+def test_rainflow_astm_example():
+    # ASTM E1049-85, příklad 5.4.4: rozkmity 3 (0.5), 4 (1.5), 6 (0.5), 8 (1.0), 9 (0.5)
+    r, n = rainflow([-2, 1, -3, 5, -1, 3, -4, 4, -2])
+    got = {}
+    for rr, nn in zip(r, n):
+        got[rr] = got.get(rr, 0.0) + nn
+    assert got == {3.0: 0.5, 4.0: 1.5, 6.0: 0.5, 8.0: 1.0, 9.0: 0.5}
+
+def test_dod_summary_columns_and_metrics():
+    soc = np.tile([0.0, 10.0, 0.0, 5.0], 50)  # cykly DoD 100 % a 50 % při kapacitě 10
+    d = dod_summary(np.c_[soc, soc], 10.0)
+    assert d["dod_hist"]["90_100"] > 0 and d["dod_hist"]["40_50"] + d["dod_hist"]["50_60"] > 0
+    assert d["efc_weighted"] < d["cycles"]
+
+    bh = pd.DataFrame({"soc_kwh": soc, "consumption_from_storage_kwh": 1.0})
+    m = battery_metrics(bh, 10.0, cycles="rainflow")
+    assert m["median_cycle_h"] == 2.0 and m["rainflow_cycles"] > 0
+    assert sum(v for k, v in m.items() if k.startswith("cycles_dod_")) == m["rainflow_cycles"]
@@ -0,0 +1,39 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+
+from ec_balance.pipeline.run_all import run_all
+
+ROWS = [[h + 0.25, h % 3, 1.5] for h in range(30)]
+
+def test_run_all_in_memory(tmp_path, monkeypatch, write_wide):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    wide = tmp_path / "wide.csv"
+    write_wide(wide, ROWS)
+    out = tmp_path / "out"
+    cfg = {"global": {"outdir": str(out)},
+           "step1": {"eano_wide": str(wide), "eand_wide": str(wide), "site_row_file": 2, "kwp_row_file": 3}}
+    reg = run_all(cfg, steps=["step1", "step2"], persist=False)
+
+    names = {a.name: a for a in reg}
+    assert {"ean_o_long", "eano_after_pv", "local_selfcons"} <= set(names)
+    assert names["eano_after_pv"].producer == "step2"
+    assert not list(out.rglob("*.csv"))
+    after = reg.get(out / "csv" / "eano_after_pv.csv")
+    assert set(after["site"]) == {"Škola", "Úřad"}
+
+def test_run_all_in_memory_chunked(tmp_path, monkeypatch, write_wide):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    wide = tmp_path / "wide.csv"
+    write_wide(wide, ROWS)
+    out = tmp_path / "out"
+    step1 = {"eano_wide": str(wide), "eand_wide": str(wide), "site_row_file": 2, "kwp_row_file": 3}
+    full = run_all({"global": {"outdir": str(out)}, "step1": step1}, steps=["step1", "step2"], persist=False)
+    reg = run_all({"global": {"outdir": str(out)}, "step1": {**step1, "chunksize": 7}},
+                  steps=["step1", "step2"], persist=False)
+
+    assert not list(out.rglob("*.csv"))
+    assert {a.name for a in reg} >= {"ean_o_long", "ean_d_long", "eano_after_pv"}
+    for name in ("ean_o_long", "ean_d_long", "eano_after_pv"):
+        pd.testing.assert_frame_equal(reg.get(out / "csv" / f"{name}.csv"), full.get(out / "csv" / f"{name}.csv"))
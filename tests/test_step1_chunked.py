@@ -0,0 +1,26 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import sys
+from pathlib import Path
+
+from ec_balance.pipeline import step1_wide_to_long as step1
+
+ROWS = [[h + 0.25, h % 3, h / 10] for h in range(30)]
+
+def _run(monkeypatch, outdir: Path, wide: Path, *extra):
+    argv = ["step1", "--eano_wide", str(wide), "--eand_wide", str(wide), "--outdir", str(outdir),
+            "--site_row_file", "2", "--kwp_row_file", "3", *extra]
+    monkeypatch.setattr(sys, "argv", argv)
+    step1.main()
+
+def test_chunked_matches_full_read(tmp_path, monkeypatch, write_wide):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    wide = tmp_path / "wide.csv"
+    write_wide(wide, ROWS)
+    _run(monkeypatch, tmp_path / "full", wide)
+    _run(monkeypatch, tmp_path / "chunk", wide, "--chunksize", "7")
+    for name in ("ean_o_long", "ean_d_long", "site_map", "kwp_by_site"):
+        a = (tmp_path / "full" / "csv" / f"{name}.csv").read_text(encoding="utf-8")
+        b = (tmp_path / "chunk" / "csv" / f"{name}.csv").read_text(encoding="utf-8")
+        assert a == b, name
@@ -0,0 +1,33 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline.step3_sharing import share_pool_degree_limited
+
+def _community(n_sites=24, n_hours=48, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2024-06-01", periods=n_hours, freq="h")
+    sites = [f"S{i:02d}" for i in range(n_sites)]
+    # celočíselné hodnoty => hodně shod (testuje tie-break stejný jako v pandas enginu)
+    imp = pd.DataFrame(
+        [(t, s, float(rng.integers(0, 4))) for t in times for s in sites],
+        columns=["datetime", "site", "import_after_kwh"],
+    )
+    exp = pd.DataFrame(
+        [(t, s, float(rng.integers(1, 3)) * (rng.random() < 0.4)) for t in times for s in sites],
+        columns=["datetime", "site", "export_after_kwh"],
+    )
+    return imp, exp
+
+@pytest.mark.parametrize("max_rec", [1, 3, 50])
+@pytest.mark.parametrize("exclude_self", [True, False])
+def test_numpy_engine_matches_pandas(max_rec, exclude_self):
+    imp, exp = _community()
+    ref = share_pool_degree_limited(imp, exp, max_recipients_per_from=max_rec, exclude_self=exclude_self)
+    got = share_pool_degree_limited(imp, exp, max_recipients_per_from=max_rec, exclude_self=exclude_self,
+                                    engine="numpy")
+    for a, b in zip(ref, got):
+        assert a.to_csv(index=False) == b.to_csv(index=False)
@@ -0,0 +1,14 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+
+from ec_balance.pipeline.step4_batt_local import simulate_local_battery_sweep
+
+def test_sites_sharing_hours_counted_once():
+    # dvě site ve stejných hodinách: osa času nesmí hodiny opakovat po site (výboj by se násobil)
+    t = pd.to_datetime(["2024-03-01 10:00", "2024-03-01 10:00", "2024-03-01 19:00", "2024-03-01 19:00"])
+    imp = pd.DataFrame({"datetime": t, "site": ["A", "B"] * 2, "import_after_kwh": [0.0, 0.0, 10.0, 10.0]})
+    exp = pd.DataFrame({"datetime": t, "site": ["A", "B"] * 2, "export_after_kwh": [10.0, 10.0, 0.0, 0.0]})
+    sens = simulate_local_battery_sweep(imp, exp, caps=[100.0], eta_c=1.0, eta_d=1.0)
+    assert sens["discharge_mwh"].tolist() == [0.01, 0.01]
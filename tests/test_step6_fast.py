@@ -0,0 +1,40 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import operator
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline.step6_excel_scenarios import REQ_SCHEMA, _run_dag, _write_workbook
+
+pytest.importorskip("openpyxl")  # čtení xlsx zpět
+
+def _scenario(hours=72):
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({c: rng.random(hours) for c in REQ_SCHEMA if c != "datetime"})
+    df.insert(0, "datetime", pd.date_range("2024-06-01", periods=hours, freq="h"))
+    bat = df[["datetime"]].assign(own_pv_stored_kwh=0.5, shared_pv_stored_kwh=0.0,
+                                  soc_kwh=np.linspace(0, 5, hours), consumption_from_storage_kwh=0.2)
+    return df, {"bat_df": bat, "bat_metrics": {"efc": 3.0, "lifetime_years_at_5000": np.inf}}
+
+def test_fast_mode_matches_standard_sheets(tmp_path):
+    df, kw = _scenario()
+    std, fast = tmp_path / "std.xlsx", tmp_path / "fast.xlsx"
+    _write_workbook(std, "S", df, False, kw)
+    _write_workbook(fast, "S", df, True, kw)
+    a = pd.read_excel(std, sheet_name=None)
+    b = pd.read_excel(fast, sheet_name=None)
+    assert set(b) - set(a) == {"by_day"} and len(b["by_day"]) == 3
+    for sheet in a:
+        pd.testing.assert_frame_equal(a[sheet], b[sheet], check_dtype=False)
+
+def test_run_dag_shares_dependency_results():
+    nodes = {"s3": (operator.add, (), (1, 2)),
+             "s4a": (operator.mul, ("s3",), (10,)),
+             "s4b": (operator.neg, ("s3",), ())}
+    for workers in (1, 2):
+        assert _run_dag(nodes, workers) == {"s3": 3, "s4a": 30, "s4b": -3}
+    with pytest.raises(ValueError):
+        _run_dag({"x": (operator.neg, ("missing",), ())}, 2)
@@ -0,0 +1,37 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import pandas as pd
+import pytest
+
+from ec_balance.utils import store
+from ec_balance.utils.sharing_lib import safe_to_csv
+
+pytest.importorskip("pyarrow")
+
+def _frame():
+    return pd.DataFrame({
+        "datetime": pd.date_range("2024-01-01", periods=4, freq="h"),
+        "site": ["A", "B", "A", "B"],
+        "import_after_kwh": [0.1 + 0.2, 1.0, 2.5, 1e-17],
+    })
+
+def test_parquet_roundtrip_via_csv_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("ECB_STORE_FORMAT", "parquet")
+    df = _frame()
+    out = safe_to_csv(df, tmp_path, name="eano_after_pv")
+    assert out.suffix == ".parquet" and not out.with_suffix(".csv").exists()
+
+    # kroky dál předávají cestu *.csv
+    got = store.read_table(tmp_path / "csv" / "eano_after_pv.csv", parse_dates=["datetime"])
+    pd.testing.assert_frame_equal(got, df)
+    assert got["site"].dtype == object
+
+    csv = store.ensure_csv(out)
+    assert pd.read_csv(csv, parse_dates=["datetime"])["site"].tolist() == df["site"].tolist()
+    assert store.resolve(out.with_suffix(".csv")) == out  # CSV export nepřebije Parquet
+
+def test_csv_is_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("ECB_STORE_FORMAT", raising=False)
+    out = store.write_table(_frame(), tmp_path / "x.csv")
+    assert out.suffix == ".csv" and store.resolve(tmp_path / "x.parquet") == out
@@ -0,0 +1,40 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+
+from ec_balance.pipeline.step3_sharing import _pivot_hour_site
+from ec_balance.utils.timegrid import GRID, dense, grid_meta, merge_meta, step_axis
+
+def _times():
+    t = pd.date_range("2024-03-30 00:00", "2024-03-31 23:45", freq="15min")
+    return t.delete(range(8, 16))  # 2 h bez dat
+
+def test_grid_meta_gaps_and_dst():
+    m = grid_meta(_times()).iloc[0]
+    assert (m["freq"], m["slots"], m["missing"]) == ("15min", 192, 8)
+    m = grid_meta(_times(), tz="Europe/Prague").iloc[0]
+    assert (m["slots"], m["missing"]) == (188, 8)  # 31.3. 02:00–02:45 neexistuje
+    nxt = grid_meta(pd.date_range("2024-04-01", periods=96, freq="15min"))
+    m = merge_meta(grid_meta(_times()), nxt).iloc[0]
+    assert (m["slots"], m["missing"]) == (288, 8)
+
+def test_step_axis_fills_gaps(tmp_path):
+    (tmp_path / "csv").mkdir()
+    grid_meta(_times()).to_csv(tmp_path / "csv" / f"{GRID}.csv", index=False)
+    hours = pd.Series(_times().floor("h").unique())
+    assert len(step_axis(None, hours)) == 46
+    ax = step_axis(tmp_path / "csv", hours, label="t")
+    assert len(ax) == 48 and ax.name == "datetime"
+    assert len(step_axis(tmp_path / "csv", hours.iloc[5:20], freq="h")) == 15
+
+def test_pivot_on_axis_matches_dense():
+    ax = pd.date_range("2024-03-01", periods=4, freq="h", name="datetime")
+    imp = pd.DataFrame({"datetime": ax[[0, 0, 3]], "site": ["A", "A", "B"], "import_after_kwh": [1.0, 2.0, 4.0]})
+    exp = pd.DataFrame({"datetime": ax[[3]], "site": ["C"], "export_after_kwh": [5.0]})
+    I, E = _pivot_hour_site(imp, exp, ax)
+    assert list(I.index) == list(ax) and list(I.columns) == ["A", "B", "C"]
+    np.testing.assert_array_equal(I.to_numpy(), [[3, 0, 0], [0, 0, 0], [0, 0, 0], [0, 4, 0]])
+    np.testing.assert_array_equal(E["C"].to_numpy(), [0, 0, 0, 5])
+    assert dense(exp, "export_after_kwh", ax[:3], ["C"]).sum() == 0.0
@@ -0,0 +1,37 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ec_balance.pipeline.step1_wide_to_long import _typed_wide, _wide_to_long
+from ec_balance.pipeline.step2_local_pv import _apply_site_map, _wide_maps
+from ec_balance.utils.sharing_lib import local_pairing, local_pairing_wide
+
+def _wide(cols, seed):
+    rng = np.random.default_rng(seed)
+    dt = pd.date_range("2024-03-30 20:00", periods=40, freq="15min").delete([5, 6, 17]).append(
+        pd.DatetimeIndex(["2024-03-30 21:15", "2024-03-30 20:30"]))  # mezery, duplicita, neseřazené
+    vals = (rng.random((len(dt), len(cols))) * 10.0 ** rng.integers(-3, 4, len(cols))).astype(str)
+    return pd.DataFrame({"datetime": dt, **{c: vals[:, i] for i, c in enumerate(cols)}})
+
+@pytest.mark.parametrize("compact", ["0", "float32"])
+@pytest.mark.parametrize("canonical", [False, True])
+def test_wide_pairing_matches_long(monkeypatch, compact, canonical):
+    monkeypatch.setenv("ECB_COMPACT", compact)
+    o_cols = ["E05", "E01", "E03", "E02", "E04", "E10"]
+    d_cols = ["P2", "P1", "P3"]
+    site_map = pd.DataFrame({"ean": o_cols + d_cols,  # site z hlaviček kroku 1 (bez site_group)
+                             "site": ["B", "A", "Škola odběr", "A", "B", "Škola (O)", "B", "A", "D"]})
+    sm = dict(zip(site_map["ean"], site_map["site"]))
+    o, d = _wide(o_cols, 1), _wide(d_cols, 2).iloc[:-7]
+    ref = local_pairing(_apply_site_map(_wide_to_long(o, sm), site_map),
+                        _apply_site_map(_wide_to_long(d, sm), site_map), freq="h", use_canonical=canonical)
+    site_of, group_of = _wide_maps(site_map)
+    got = local_pairing_wide(_typed_wide(o), _typed_wide(d), site_of, group_of=group_of, freq="h",
+                             use_canonical=canonical)
+    for r, g in zip(ref, got):
+        r = r.assign(site=r["site"].astype(object))
+        g = g.assign(site=g["site"].astype(object))
+        pd.testing.assert_frame_equal(r, g, check_exact=True)
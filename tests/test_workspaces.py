@@ -0,0 +1,19 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+# Copyright (c) 2025 Kuba
+
+import os
+import time
+
+from ec_balance_service.workspaces import WorkspaceStore
+
+def test_gc_by_ttl_keeps_busy_and_fresh(tmp_path):
+    store = WorkspaceStore(tmp_path, ttl_hours=1)
+    old, busy, fresh = store.create(), store.create(), store.create()
+    assert old.uploads.is_dir() and old.csv_dir.is_dir()
+    stale = time.time() - 2 * 3600
+    for ws in (old, busy):
+        os.utime(ws.root / "workspace.json", (stale, stale))
+    removed = store.gc(lambda root: root == busy.root)
+    assert removed == [old.id]
+    assert store.get(busy.id) is not None and store.get(fresh.id) is not None
+    assert store.get("../" + busy.id) is None